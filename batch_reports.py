@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+from database_manager import DatabaseManager, DB_NAME
+from session_summary import session_fingerprint
+
+MANIFEST_NAME = "manifest.json"
+
+
+def select_sessions(db: DatabaseManager, date_from: Optional[datetime.date], date_to: Optional[datetime.date],
+                    session_ids: Optional[List[int]] = None) -> List[int]:
+    """Sessions terminées dans la période (ou liste explicite, même en cours ou seulement archivée)"""
+    if session_ids:
+        return session_ids
+    query = "SELECT id FROM sessions WHERE end_time IS NOT NULL"
+    params = []
+    if date_from:
+        query += " AND start_time >= ?"
+        params.append(datetime.datetime.combine(date_from, datetime.time.min))
+    if date_to:
+        query += " AND start_time < ?"
+        params.append(datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time.min))
+    conn = db.get_readonly_connection()
+    rows = conn.execute(query + " ORDER BY start_time", params).fetchall()
+    conn.close()
+    return [r[0] for r in rows]
+
+
+def load_manifest(out_dir: str) -> dict:
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(out_dir: str, manifest: dict):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def _render(summary: dict, file_name: str) -> str:
+    # Import dans le worker : fpdf n'est chargé que par les process qui dessinent
+    from report_generator import generate_pdf_report_from_summary
+    return generate_pdf_report_from_summary(summary, file_name)
+
+
+def generate_reports(db: DatabaseManager, session_ids: List[int], out_dir: str, workers: Optional[int] = None) -> int:
+    """
+    Rend les rapports en parallèle. Un rapport dont l'empreinte de contenu et la version du rendu
+    n'ont pas changé depuis le dernier passage (manifest.json) est sauté.
+    Session absente de la base (purgée) : résumé depuis l'archive Parquet, rendu une seule fois.
+    """
+    from report_generator import REPORT_VERSION, report_summary
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+
+    jobs = []
+    conn = db.get_readonly_connection()
+    try:
+        fingerprints = {sid: session_fingerprint(conn, sid) for sid in session_ids}
+    finally:
+        conn.close()
+
+    for sid in session_ids:
+        file_name = os.path.join(out_dir, f"report_session_{sid}.pdf")
+        fp = f"r{REPORT_VERSION}|{fingerprints[sid] or 'archive'}"
+        if manifest.get(os.path.basename(file_name)) == fp and os.path.exists(file_name):
+            continue
+        summary = report_summary(sid, db)
+        if summary:
+            jobs.append((summary, file_name, fp))
+
+    print(f"📄 {len(jobs)} rapport(s) à générer, {len(session_ids) - len(jobs)} à jour ({out_dir})")
+    if not jobs:
+        return 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_render, summary, file_name): (summary, fp) for summary, file_name, fp in jobs}
+        for future, (summary, fp) in futures.items():
+            try:
+                file_name = future.result()
+                manifest[os.path.basename(file_name)] = fp
+            except Exception as e:
+                print(f"❌ Session #{summary['session_id']} : {e}")
+
+    save_manifest(out_dir, manifest)
+    return len(jobs)
+
+
+def parse_date(value: str) -> datetime.date:
+    return datetime.date.fromisoformat(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génération des rapports PDF en lot")
+    parser.add_argument("--from", dest="date_from", type=parse_date, help="Début de période (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=parse_date, help="Fin de période incluse (YYYY-MM-DD)")
+    parser.add_argument("--sessions", type=lambda v: [int(x) for x in v.split(',')], help="IDs de sessions (1,2,3)")
+    parser.add_argument("--db", action="append", help="Base(s) SQLite, une par utilisateur (défaut: whoop.db)")
+    parser.add_argument("--out", default="reports", help="Dossier de sortie")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    db_paths = args.db or [DB_NAME]
+    t0 = time.perf_counter()
+    total = 0
+    for path in db_paths:
+        db = DatabaseManager(path)
+        out_dir = args.out if len(db_paths) == 1 else os.path.join(args.out, os.path.splitext(os.path.basename(path))[0])
+        sessions = select_sessions(db, args.date_from, args.date_to, args.sessions)
+        total += generate_reports(db, sessions, out_dir, args.workers)
+    print(f"✅ {total} rapport(s) en {time.perf_counter() - t0:.1f}s")
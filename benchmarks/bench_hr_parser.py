@@ -0,0 +1,101 @@
+"""
+Micro-benchmark du décodage Heart Rate Measurement (paquets/s).
+Chaque mesure est précédée d'un appel à blanc (import NumPy, caches de struct) et garde
+le meilleur de REPEAT passes. parse_hr_batch est mesuré par lots de plusieurs tailles.
+Usage : python benchmarks/bench_hr_parser.py [nb_paquets]
+"""
+import os
+import sys
+import time
+import random
+import struct
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from hr_parser import parse_hr_measurement, parse_hr_batch
+
+
+def legacy_decode(data):
+    """Ancien décodage copié dans chaque logger (référence)"""
+    flags = data[0]
+    hr_fmt_16 = (flags & 0x01) > 0
+    rr_present = (flags & 0x10) > 0
+    offset = 1
+    if hr_fmt_16:
+        hr_val = int.from_bytes(data[offset:offset+2], byteorder='little')
+        offset += 2
+    else:
+        hr_val = data[offset]
+        offset += 1
+    if (flags & 0x08) > 0: offset += 2
+    rr_intervals = []
+    if rr_present:
+        while offset + 1 < len(data):
+            val = int.from_bytes(data[offset:offset+2], byteorder='little')
+            ms = int(val * 1000 / 1024)
+            if ms > 0: rr_intervals.append(ms)
+            offset += 2
+    return hr_val, rr_intervals
+
+
+def make_packets(n, seed=42):
+    """Mélange réaliste : uint8/uint16, contact, énergie de temps en temps, 0 à 3 RR"""
+    rng = random.Random(seed)
+    packets = []
+    for _ in range(n):
+        flags = 0x10 | 0x04 | 0x02
+        hr16 = rng.random() < 0.1
+        energy = rng.random() < 0.05
+        if hr16: flags |= 0x01
+        if energy: flags |= 0x08
+        body = struct.pack('<H', rng.randint(45, 190)) if hr16 else bytes([rng.randint(45, 190)])
+        if energy: body += struct.pack('<H', rng.randint(0, 5000))
+        rr = [rng.randint(300, 1400) * 1024 // 1000 for _ in range(rng.choice((0, 1, 1, 2, 3)))]
+        packets.append(bytearray([flags]) + body + struct.pack(f'<{len(rr)}H', *rr))
+    return packets
+
+
+REPEAT = 5
+BATCH_SIZES = (64, 1000, 10_000)
+
+
+def bench(label, fn, n):
+    fn()  # À blanc : imports et caches hors mesure
+    dt = float("inf")
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        fn()
+        dt = min(dt, time.perf_counter() - t0)
+    print(f"{label:<28} {n / dt:>14,.0f} paquets/s")
+    return n / dt
+
+
+def batched(packets, size):
+    return [packets[i:i + size] for i in range(0, len(packets), size)]
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    packets = make_packets(n)
+
+    # Vérification de cohérence avant de mesurer. Paquet de non-régression : RR bruts (1, 0, 820),
+    # 1/1024 s donne 0 ms et doit être filtré comme le 0 -> [800]
+    zero_rr = bytearray([0x10, 60]) + struct.pack('<3H', 1, 0, 820)
+    assert list(parse_hr_measurement(zero_rr).rr_ms) == [800]
+    assert parse_hr_batch([zero_rr]).rr_ms.tolist() == [800]
+    checked = packets[:2000] + [zero_rr]
+    for p in checked:
+        m = parse_hr_measurement(p)
+        assert (m.bpm, list(m.rr_ms)) == legacy_decode(p)
+    batch = parse_hr_batch(checked)
+    for i, p in enumerate(checked):
+        m = parse_hr_measurement(p)
+        rr = batch.rr_ms[batch.rr_offsets[i]:batch.rr_offsets[i + 1]].tolist()
+        assert (int(batch.bpm[i]), rr) == (m.bpm, list(m.rr_ms))
+
+    print(f"📦 {n} paquets")
+    bench("legacy (int.from_bytes)", lambda: [legacy_decode(p) for p in packets], n)
+    bench("parse_hr_measurement", lambda: [parse_hr_measurement(p) for p in packets], n)
+    for size in BATCH_SIZES:
+        batches = batched(packets, size)
+        bench(f"parse_hr_batch (lots de {size})", lambda: [parse_hr_batch(b) for b in batches], n)
+    bench(f"parse_hr_batch (lot de {n})", lambda: parse_hr_batch(packets), n)
@@ -0,0 +1,203 @@
+"""
+Benchmark bout en bout de l'ingestion : notification BLE -> hr_handler (décodage, GPS, pas)
+-> MeasurementWriter -> ligne commitée, sans Bluetooth (client Bleak simulé).
+
+Mesures : débit soutenu (notifications/s), CPU par battement, latence notification -> commit (p50/p95/p99).
+
+Usage :
+    python benchmarks/bench_ingest.py                                   # grille par défaut
+    python benchmarks/bench_ingest.py --backend sqlite-wal --batch 1,50,500 --count 20000
+    python benchmarks/bench_ingest.py --rate 10 --count 2000 --flush-interval 0.5 --json ingest.json
+
+Back ends :
+    legacy      DatabaseManager.insert_measurement (une connexion + un commit par battement)
+    sqlite      fichier, journal rollback, synchronous FULL (défaut SQLite)
+    sqlite-wal  fichier, WAL + synchronous NORMAL
+    null        aucun stockage (coût pur du handler : décodage + GPS + pas)
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import shutil
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database_manager import DatabaseManager, MeasurementWriter
+from whoop_logger_v4 import WhoopLoggerV4, HEART_RATE_UUID
+from bench_hr_parser import make_packets
+
+BACKENDS = ("legacy", "sqlite", "sqlite-wal", "null")
+
+
+class NullWriter:
+    """Même interface que MeasurementWriter, sans stockage (les lignes sont 'commitées' immédiatement)"""
+    def __init__(self, on_commit=None):
+        self.on_commit = on_commit
+        self.rows_written = 0
+
+    def add(self, *args, **kwargs):
+        self.rows_written += 1
+        if self.on_commit:
+            self.on_commit(1, time.perf_counter())
+
+    def flush(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+class LegacyWriter(NullWriter):
+    """Ancien chemin du logger : insert_measurement ouvre, écrit, commite et ferme à chaque battement"""
+    def __init__(self, db: DatabaseManager, on_commit=None):
+        super().__init__(on_commit)
+        self.db = db
+
+    def add(self, session_id, bpm, rr_str, battery, steps=0, **kwargs):
+        self.db.insert_measurement(session_id, bpm, rr_str, battery, steps)
+        super().add()
+
+
+class FakeBleakClient:
+    """Rejoue des paquets Heart Rate dans le callback de start_notify, au rythme demandé (0 = max)"""
+    def __init__(self, packets, rate: float = 0.0, on_notify=None):
+        self.packets = packets
+        self.rate = rate
+        self.on_notify = on_notify
+        self.callbacks = {}
+        self.is_connected = True
+
+    async def start_notify(self, char_uuid, callback):
+        self.callbacks[char_uuid] = callback
+
+    async def run(self):
+        callback = self.callbacks[HEART_RATE_UUID]
+        t0 = time.perf_counter()
+        for i, packet in enumerate(self.packets):
+            if self.rate:
+                delay = t0 + i / self.rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif i % 1000 == 0:
+                await asyncio.sleep(0)
+            self.on_notify(time.perf_counter())
+            callback(HEART_RATE_UUID, bytearray(packet))
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+async def run_case(packets, backend: str, batch_size: int, flush_interval: float, rate: float, workdir: str) -> dict:
+    notify_times = []
+    latencies = []
+    committed = [0]
+
+    def on_commit(n_rows, t_commit):
+        # Les lignes sont commitées dans l'ordre d'arrivée
+        start = committed[0]
+        latencies.extend(t_commit - t for t in notify_times[start:start + n_rows])
+        committed[0] += n_rows
+
+    path = os.path.join(workdir, f"ingest_{backend}_{batch_size}.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    db = DatabaseManager(path)
+    if backend == "null":
+        writer = NullWriter(on_commit)
+    elif backend == "legacy":
+        writer = LegacyWriter(db, on_commit)
+    else:
+        synchronous = None
+        if backend == "sqlite-wal":
+            conn = db.get_connection()
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.close()
+            synchronous = "NORMAL"
+        writer = MeasurementWriter(db, batch_size=batch_size, flush_interval=flush_interval,
+                                   synchronous=synchronous, on_commit=on_commit)
+
+    logger = WhoopLoggerV4(db=db, writer=writer)
+    logger.session_id = db.create_session(device_name="Bench")
+    logger.current_battery = 80
+    client = FakeBleakClient(packets, rate, notify_times.append)
+    await client.start_notify(HEART_RATE_UUID, logger.hr_handler)
+
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    await client.run()
+    writer.close()
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - wall0
+
+    n = len(packets)
+    if backend != "null":
+        conn = db.get_connection()
+        stored = conn.execute("SELECT COUNT(*) FROM measurements WHERE session_id = ?", (logger.session_id,)).fetchone()[0]
+        conn.close()
+        assert stored == n, f"{stored} lignes en base pour {n} notifications"
+    return {
+        "backend": backend,
+        "batch_size": batch_size,
+        "flush_interval_s": flush_interval,
+        "rate_hz": rate,
+        "count": n,
+        "throughput_per_s": n / wall,
+        "cpu_us_per_beat": cpu / n * 1e6,
+        "latency_ms": {
+            "p50": percentile(latencies, 50) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": max(latencies) * 1000,
+            "mean": statistics.fmean(latencies) * 1000,
+        },
+    }
+
+
+async def main(args):
+    packets = make_packets(args.count, args.seed)
+    backends = [b.strip() for b in args.backend.split(",")]
+    batches = [int(b) for b in args.batch.split(",")]
+    workdir = args.workdir or tempfile.mkdtemp(prefix="whoop_ingest_")
+    results = []
+
+    print(f"📦 {args.count} notifications, rythme {'max' if not args.rate else f'{args.rate:g} Hz'} ({workdir})")
+    print(f"{'backend':<11} {'batch':>6} {'notif/s':>11} {'CPU µs/bat':>11} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for backend in backends:
+        for batch in ([1] if backend in ("null", "legacy") else batches):
+            r = await run_case(packets, backend, batch, args.flush_interval, args.rate, workdir)
+            results.append(r)
+            lat = r["latency_ms"]
+            print(f"{backend:<11} {batch:>6} {r['throughput_per_s']:>11,.0f} {r['cpu_us_per_beat']:>11.1f} "
+                  f"{lat['p50']:>9.2f} {lat['p95']:>9.2f} {lat['p99']:>9.2f}")
+
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"count": args.count, "rate_hz": args.rate, "results": results}, f, indent=1)
+        print(f"💾 {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingestion notification -> commit")
+    parser.add_argument("--count", type=int, default=5000, help="Nombre de notifications")
+    parser.add_argument("--rate", type=float, default=0.0, help="Notifications/s (0 = aussi vite que possible)")
+    parser.add_argument("--backend", default=",".join(BACKENDS), help=f"Parmi {','.join(BACKENDS)}")
+    parser.add_argument("--batch", default="1,10,100,1000", help="Tailles de lot MeasurementWriter")
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="Flush forcé après N secondes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", help="Dossier des bases temporaires")
+    parser.add_argument("--json", help="Écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+    unknown = [b for b in args.backend.split(",") if b.strip() not in BACKENDS]
+    if unknown:
+        parser.error(f"Back end(s) inconnu(s) : {', '.join(unknown)}")
+    asyncio.run(main(args))
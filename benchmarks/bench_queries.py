@@ -0,0 +1,205 @@
+"""
+Benchmarks des requêtes DatabaseManager, du chargement de session du dashboard et des
+fonctions data_science, sur des bases synthétiques de 1 jour / 1 mois / 1 an.
+
+Usage :
+    python benchmarks/bench_queries.py                       # toutes les échelles
+    python benchmarks/bench_queries.py --scales 1d,1m --json results.json
+    python benchmarks/bench_queries.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_queries.py --baseline benchmarks/baseline.json --threshold 0.2
+
+Les bases sont générées une fois (generate_synthetic_db.py) puis réutilisées depuis --data-dir.
+Avec --baseline, le code de sortie vaut 1 si un cas est plus lent que la référence au-delà du seuil.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import datetime
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+import data_science
+from database_manager import DatabaseManager
+from generate_synthetic_db import generate_user_db
+from session_views import parse_rr, load_session_frame
+
+SCALES = {"1d": 1, "1m": 30, "1y": 365}
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+MAX_HR = 190
+
+
+def prepare_db(scale: str, data_dir: str, rate: float, seed: int, regen: bool = False) -> str:
+    """Base synthétique de l'échelle demandée (générée au premier appel seulement)"""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"bench_{scale}_{rate:g}hz_s{seed}.db")
+    if regen or not os.path.exists(path):
+        t0 = time.perf_counter()
+        n = generate_user_db(path, SCALES[scale], rate, seed, force=True)
+        print(f"🧪 {path} : {n:,} mesures générées en {time.perf_counter() - t0:.1f}s")
+    return path
+
+
+def pick_sessions(db: DatabaseManager):
+    """Dernière journée et dernière nuit terminées (cas du dashboard et de l'hypnogramme)"""
+    conn = db.get_readonly_connection()
+    rows = conn.execute(
+        "SELECT id, notes FROM sessions WHERE end_time IS NOT NULL ORDER BY start_time DESC"
+    ).fetchall()
+    conn.close()
+    day = next((r[0] for r in rows if 'day' in (r[1] or '')), rows[0][0])
+    night = next((r[0] for r in rows if 'night' in (r[1] or '')), rows[0][0])
+    return day, night
+
+
+def dashboard_session_load(db: DatabaseManager, session_id: int):
+    """Chemin complet d'un rerun du dashboard v4 sans cache de vue (session live), hors graphiques Altair"""
+    df = load_session_frame(db, session_id)
+    total_steps = df['steps'].fillna(0).sum()
+    all_rr = []
+    for r in df['rr_intervals'].apply(parse_rr): all_rr.extend(r)
+    hrv_rmssd = np.sqrt(np.mean(np.diff(all_rr) ** 2)) if len(all_rr) > 1 else 0
+    avg_hrv_7d = db.get_avg_rmssd_7_days()
+    data_science.calculate_recovery_score(hrv_rmssd, avg_hrv_7d)
+    data_science.calculate_body_battery(df['bpm'].tolist(), [hrv_rmssd] * len(df))
+    db.get_sleep_duration_last_24h()
+    data_science.calculate_respiratory_rate(all_rr)
+    if data_science.analyze_sleep_architecture(df['bpm'].tolist(), total_steps) == "SOMMEIL (Détecté)":
+        data_science.classify_sleep_phases(df['bpm'].tolist())
+    df['strain_pts'] = pd.cut(df['bpm'],
+        bins=[0, MAX_HR*0.5, MAX_HR*0.6, MAX_HR*0.7, MAX_HR*0.8, MAX_HR*0.9, 300],
+        labels=[0, 1, 2, 4, 8, 12], include_lowest=True).astype(float)
+    return df
+
+
+def build_cases(db: DatabaseManager):
+    """Cas mesurés : nom -> fonction sans argument. Les entrées des noyaux sont préparées hors chrono."""
+    day_id, night_id = pick_sessions(db)
+    day_df = load_session_frame(db, day_id)
+    night_bpm = load_session_frame(db, night_id)['bpm'].tolist()
+    day_bpm = day_df['bpm'].tolist()
+    day_steps = int(day_df['steps'].sum())
+    all_rr = [x for r in day_df['rr_intervals'] for x in parse_rr(r)]
+    rmssd = float(np.sqrt(np.mean(np.diff(all_rr) ** 2)))
+    trends_frame = day_df.assign(rr_intervals=day_df['rr_intervals'].map(parse_rr))
+
+    return {
+        "db.get_all_sessions": db.get_all_sessions,
+        "db.get_session_data": lambda: db.get_session_data(day_id),
+        "db.get_avg_rmssd_7_days": db.get_avg_rmssd_7_days,
+        "db.get_sleep_duration_last_24h": db.get_sleep_duration_last_24h,
+        "dashboard.session_load": lambda: dashboard_session_load(db, day_id),
+        "ds.calculate_respiratory_rate": lambda: data_science.calculate_respiratory_rate(all_rr),
+        "ds.analyze_sleep_architecture": lambda: data_science.analyze_sleep_architecture(night_bpm, 0),
+        "ds.calculate_recovery_score": lambda: data_science.calculate_recovery_score(rmssd, rmssd * 0.9),
+        "ds.detect_stress_event": lambda: data_science.detect_stress_event(rmssd, rmssd * 2, 80),
+        "ds.calculate_body_battery": lambda: data_science.calculate_body_battery(day_bpm, [rmssd] * len(day_bpm)),
+        "ds.classify_sleep_phases": lambda: data_science.classify_sleep_phases(night_bpm),
+        "ds.daily_trends": lambda: data_science.daily_trends(trends_frame),
+        "_meta": {"day_session": day_id, "night_session": night_id, "day_rows": len(day_df), "steps": day_steps},
+    }
+
+
+def time_case(fn, repeat: int, min_time: float = 0.05) -> dict:
+    """Médiane/min de `repeat` mesures ; les fonctions très rapides sont bouclées pour dépasser min_time"""
+    t0 = time.perf_counter()
+    fn()  # Échauffement (cache de pages SQLite, imports paresseux)
+    first = time.perf_counter() - t0
+    loops = 1 if first >= min_time else max(1, int(min_time / max(first, 1e-7)))
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        runs.append((time.perf_counter() - t0) / loops)
+    return {"median_s": statistics.median(runs), "min_s": min(runs), "repeat": repeat, "loops": loops}
+
+
+def run_suite(scales, data_dir: str, rate: float, seed: int, repeat: int, regen: bool = False) -> dict:
+    results = {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": __import__("sqlite3").sqlite_version,
+            "machine": platform.machine(),
+            "rate_hz": rate,
+            "seed": seed,
+        },
+        "scales": {},
+        "results": {},
+    }
+    for scale in scales:
+        path = prepare_db(scale, data_dir, rate, seed, regen)
+        db = DatabaseManager(path)
+        cases = build_cases(db)
+        results["scales"][scale] = dict(cases.pop("_meta"), days=SCALES[scale], db_bytes=os.path.getsize(path))
+        print(f"\n📏 Échelle {scale} ({os.path.getsize(path) / 1e6:,.0f} Mo)")
+        for name, fn in cases.items():
+            r = time_case(fn, repeat)
+            results["results"][f"{scale}/{name}"] = r
+            print(f"  {name:<34} {r['median_s'] * 1000:>10.2f} ms  (min {r['min_s'] * 1000:.2f})")
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_s: float = 0.001) -> list:
+    """
+    Cas plus lents que la référence de plus de `threshold` (0.2 = +20 %) : [(cas, base, actuel, ratio)].
+    Les écarts absolus sous min_delta_s sont ignorés (bruit des cas en microsecondes).
+    """
+    regressions = []
+    for key, r in results["results"].items():
+        ref = baseline.get("results", {}).get(key)
+        if not ref:
+            continue
+        ratio = r["median_s"] / ref["median_s"] if ref["median_s"] else float("inf")
+        r["baseline_s"] = ref["median_s"]
+        r["ratio"] = ratio
+        if ratio > 1 + threshold and r["median_s"] - ref["median_s"] > min_delta_s:
+            regressions.append((key, ref["median_s"], r["median_s"], ratio))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks requêtes DB / dashboard / data_science")
+    parser.add_argument("--scales", default=",".join(SCALES), help="Échelles parmi 1d,1m,1y")
+    parser.add_argument("--rate", type=float, default=1.0, help="Fréquence des mesures synthétiques (Hz)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Cache des bases générées")
+    parser.add_argument("--regen", action="store_true", help="Régénère les bases")
+    parser.add_argument("--json", help="Écrit les résultats dans ce fichier")
+    parser.add_argument("--save-baseline", help="Enregistre les résultats comme référence")
+    parser.add_argument("--baseline", help="Référence à comparer")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Tolérance avant régression (0.2 = +20 %%)")
+    args = parser.parse_args()
+
+    scales = [s.strip() for s in args.scales.split(",") if s.strip()]
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        parser.error(f"Échelle(s) inconnue(s) : {', '.join(unknown)}")
+
+    results = run_suite(scales, args.data_dir, args.rate, args.seed, args.repeat, args.regen)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        results["regressions"] = [k for k, *_ in regressions]
+        print()
+        if regressions:
+            for key, ref, cur, ratio in regressions:
+                print(f"🐢 RÉGRESSION {key} : {ref * 1000:.2f} ms -> {cur * 1000:.2f} ms (x{ratio:.2f})")
+        else:
+            print(f"✅ Aucune régression au-delà de +{args.threshold:.0%}")
+
+    for path in filter(None, (args.json, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print(f"💾 {path}")
+
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,193 @@
+"""
+Temps de démarrage des points d'entrée : import du module et première réponse utile,
+chacun dans un interpréteur neuf (rien en cache dans sys.modules), contre un budget.
+
+Première réponse :
+    logger     WhoopLoggerV4() + start() (session créée, prêt à se connecter au bracelet)
+    api        GET /current (appel direct de la route)
+    dashboard  premier rendu complet du script Streamlit (AppTest), jusqu'à l'attente du Mode Live
+    autres     import seul (outils en ligne de commande)
+
+Usage :
+    python benchmarks/bench_startup.py                       # tous les points d'entrée, budgets par défaut
+    python benchmarks/bench_startup.py --only logger,api --repeat 10
+    python benchmarks/bench_startup.py --budget-scale 3      # machine lente (Raspberry Pi...)
+    python benchmarks/bench_startup.py --importtime          # + modules les plus lents (python -X importtime)
+
+Code de sortie 1 si une médiane dépasse son budget. Un point d'entrée dont une dépendance
+n'est pas installée (streamlit, fastapi...) est signalé et ignoré.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+from generate_synthetic_db import generate_user_db
+
+MARKER = "@@STARTUP@@"
+
+# nom -> (module, code de première réponse ou None, budget import (s), budget première réponse (s))
+ENTRY_POINTS = {
+    "logger": ("whoop_logger_v4",
+               "logger = mod.WhoopLoggerV4()\nlogger.start()",
+               0.35, 0.5),
+    "api": ("whoop_api",
+            "mod.get_current_metrics()",
+            0.6, 0.7),
+    "dashboard": ("streamlit.testing.v1",
+                  "at = mod.AppTest.from_file(os.path.join(REPO, 'whoop_dashboard_v4.py'), default_timeout=60)\n"
+                  "time.sleep = first_render_done\n"
+                  "at.run()",
+                  1.5, 4.0),
+    "route_index": ("route_index", None, 0.3, None),
+    "retention_manager": ("retention_manager", None, 0.2, None),
+    "sync_manager": ("sync_manager", None, 0.2, None),
+    "csv_importer": ("csv_importer", None, 0.2, None),
+    "batch_reports": ("batch_reports", None, 0.3, None),
+    "replay_capture": ("replay_capture", None, 0.35, None),
+}
+
+# Exécuté dans le process enfant (cwd = dossier temporaire avec whoop.db)
+CHILD = r'''
+import os, sys, time, json
+t0 = time.perf_counter()
+REPO = {repo!r}
+sys.path.insert(0, REPO)
+result = {{}}
+first = []
+
+def first_render_done(seconds):
+    # Le dashboard attend 1 s avant st.rerun() en Mode Live : le premier rendu est terminé
+    if not first:
+        first.append(time.perf_counter())
+    raise SystemExit
+
+try:
+    import importlib
+    mod = importlib.import_module({module!r})
+    result["import_s"] = time.perf_counter() - t0
+    code = {code!r}
+    if code:
+        exec(code)
+        result["first_s"] = (first[0] if first else time.perf_counter()) - t0
+except ModuleNotFoundError as e:
+    result = {{"skipped": str(e)}}
+print({marker!r} + json.dumps(result))
+'''
+
+
+def run_child(module: str, code, workdir: str, importtime: bool = False) -> dict:
+    script = CHILD.format(repo=REPO, module=module, code=code, marker=MARKER)
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", script]
+    env = dict(os.environ, WHOOP_PROFILE="")
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=workdir, capture_output=True, text=True, env=env)
+    wall = time.perf_counter() - t0
+    line = next((l for l in proc.stdout.splitlines() if l.startswith(MARKER)), None)
+    if line is None:
+        raise RuntimeError(f"{module} : échec du process enfant\n{proc.stderr[-2000:]}")
+    result = json.loads(line[len(MARKER):])
+    result["process_s"] = wall
+    if importtime:
+        result["slowest"] = slowest_imports(proc.stderr)
+    return result
+
+
+def slowest_imports(stderr: str, top: int = 8) -> list:
+    """Modules de premier niveau les plus lents (temps cumulé, en ms) d'après -X importtime"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name[1:].startswith(" "):  # Import direct du point d'entrée (pas une sous-dépendance)
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def prepare_workdir() -> str:
+    """Dossier de travail des enfants : une journée synthétique, pour que les premières réponses lisent des données"""
+    workdir = tempfile.mkdtemp(prefix="whoop_startup_")
+    generate_user_db(os.path.join(workdir, "whoop.db"), 1, 1.0, 42)
+    return workdir
+
+
+def measure(name: str, repeat: int, workdir: str, importtime: bool = False) -> dict:
+    module, code, budget_import, budget_first = ENTRY_POINTS[name]
+    run_child(module, code, workdir)  # Échauffement : bytecode .pyc et cache disque
+    runs = [run_child(module, code, workdir) for _ in range(repeat)]
+    if "skipped" in runs[0]:
+        return {"skipped": runs[0]["skipped"]}
+    result = {
+        "import_s": statistics.median(r["import_s"] for r in runs),
+        "process_s": statistics.median(r["process_s"] for r in runs),
+        "budget_import_s": budget_import,
+    }
+    if code:
+        result["first_s"] = statistics.median(r["first_s"] for r in runs)
+        result["budget_first_s"] = budget_first
+    if importtime:
+        result["slowest"] = run_child(module, code, workdir, importtime=True)["slowest"]
+    return result
+
+
+def over_budget(name: str, r: dict, scale: float) -> list:
+    over = []
+    if r["import_s"] > r["budget_import_s"] * scale:
+        over.append(f"{name} import {r['import_s'] * 1000:.0f} ms > {r['budget_import_s'] * scale * 1000:.0f} ms")
+    if "first_s" in r and r["first_s"] > r["budget_first_s"] * scale:
+        over.append(f"{name} première réponse {r['first_s'] * 1000:.0f} ms > {r['budget_first_s'] * scale * 1000:.0f} ms")
+    return over
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Temps de démarrage des points d'entrée (budgets)")
+    parser.add_argument("--only", help=f"Parmi {','.join(ENTRY_POINTS)}")
+    parser.add_argument("--repeat", type=int, default=5, help="Process neufs par point d'entrée (médiane)")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="Multiplie tous les budgets")
+    parser.add_argument("--importtime", action="store_true", help="Affiche les imports les plus lents")
+    parser.add_argument("--json", help="Écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(ENTRY_POINTS)
+    unknown = [n for n in names if n not in ENTRY_POINTS]
+    if unknown:
+        parser.error(f"Point(s) d'entrée inconnu(s) : {', '.join(unknown)}")
+
+    workdir = prepare_workdir()
+    results, failures = {}, []
+    print(f"{'entrée':<18} {'import ms':>10} {'1re rép. ms':>12} {'process ms':>11}  budget")
+    try:
+        for name in names:
+            r = results[name] = measure(name, args.repeat, workdir, args.importtime)
+            if "skipped" in r:
+                print(f"{name:<18} ⏭️  ignoré ({r['skipped']})")
+                continue
+            over = over_budget(name, r, args.budget_scale)
+            failures += over
+            first = f"{r['first_s'] * 1000:>12.0f}" if "first_s" in r else f"{'-':>12}"
+            print(f"{name:<18} {r['import_s'] * 1000:>10.0f} {first} {r['process_s'] * 1000:>11.0f}  {'🐢' if over else '✅'}")
+            for ms, module in r.get("slowest", []):
+                print(f"{'':<20}{ms:>8.1f} ms  {module}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print()
+    for f in failures:
+        print(f"🐢 BUDGET DÉPASSÉ {f}")
+    if not failures:
+        print(f"✅ Tous les budgets respectés (x{args.budget_scale:g})")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"budget_scale": args.budget_scale, "repeat": args.repeat, "results": results}, f, indent=1)
+        print(f"💾 {args.json}")
+
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,111 @@
+import os
+import time
+import uuid
+import struct
+import datetime
+from typing import Callable, Iterator, Optional, Tuple
+
+# Un fichier de capture par exécution (les temps monotonic ne sont comparables que dans un même process) :
+#   en-tête  : MAGIC (8 octets) + version (1 octet)
+#   record   : temps monotonic (float64) + UUID caractéristique (16 octets) + longueur (uint16) + payload
+MAGIC = b"WHOOPCAP"
+VERSION = 1
+_HEADER = struct.Struct('<8sB')
+_RECORD = struct.Struct('<d16sH')
+
+FLUSH_INTERVAL = 1.0  # Secondes max de données perdues en cas de crash
+
+
+class CaptureWriter:
+    """Enregistre chaque notification BLE brute telle que reçue (pour rejouer une session sans bracelet)"""
+    def __init__(self, path: str):
+        self.path = path
+        # Création exclusive : jamais d'ajout à la capture d'une exécution précédente
+        self.file = open(path, 'xb')
+        self.file.write(_HEADER.pack(MAGIC, VERSION))
+        self._uuid_cache = {}
+        self._last_flush = time.monotonic()
+        self.count = 0
+
+    def record(self, char_uuid: str, data: bytes):
+        now = time.monotonic()
+        key = self._uuid_cache.get(char_uuid)
+        if key is None:
+            key = self._uuid_cache[char_uuid] = uuid.UUID(str(char_uuid)).bytes
+        self.file.write(_RECORD.pack(now, key, len(data)))
+        self.file.write(data)
+        self.count += 1
+        if now - self._last_flush > FLUSH_INTERVAL:
+            self.file.flush()
+            self._last_flush = now
+
+    def wrap(self, char_uuid: str, handler: Callable) -> Callable:
+        """Handler Bleak qui capture le paquet puis appelle le handler d'origine"""
+        def capturing_handler(sender, data: bytearray):
+            self.record(char_uuid, data)
+            return handler(sender, data)
+        return capturing_handler
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+            print(f"🎙️  Capture fermée : {self.count} notifications -> {self.path}")
+
+
+def run_capture_path(path: str, label: Optional[str] = None) -> str:
+    """
+    Fichier propre à cette exécution (et à ce bracelet si label) : chemin/fichier.bin tel quel s'il est libre,
+    sinon chemin/fichier_<horodatage>[_<label>].bin.
+    """
+    base, ext = os.path.splitext(path)
+    if label:
+        base += "_" + "".join(c if c.isalnum() else "-" for c in label)
+        path = base + ext
+    if os.path.exists(path):
+        path = f"{base}_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}{ext}"
+        n = 1
+        while os.path.exists(path):
+            n += 1
+            path = f"{base}_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_{n}{ext}"
+    return path
+
+
+def open_capture(config: Optional[dict] = None, label: Optional[str] = None) -> Optional[CaptureWriter]:
+    """
+    Capture optionnelle des loggers, un fichier par exécution (et par bracelet en mode multi via label) :
+    - variable d'environnement WHOOP_CAPTURE=chemin/fichier.bin
+    - ou config.yaml -> capture: {enabled: true, dir: captures}
+    """
+    path = os.getenv('WHOOP_CAPTURE')
+    cfg = (config or {}).get('capture', {}) or {}
+    if not path and cfg.get('enabled'):
+        directory = cfg.get('dir', 'captures')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"capture_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.bin")
+    if not path:
+        return None
+    path = run_capture_path(path, label)
+    print(f"🎙️  Capture BLE brute active : {path}")
+    return CaptureWriter(path)
+
+
+def read_capture(path: str) -> Iterator[Tuple[float, str, bytes]]:
+    """Relit une capture : (temps monotonic, UUID, payload). Un record tronqué en fin de fichier est ignoré."""
+    with open(path, 'rb') as f:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size or _HEADER.unpack(header)[0] != MAGIC:
+            raise ValueError(f"{path} n'est pas une capture Whoop")
+        uuid_names = {}
+        while True:
+            head = f.read(_RECORD.size)
+            if len(head) < _RECORD.size:
+                break
+            ts, raw_uuid, length = _RECORD.unpack(head)
+            payload = f.read(length)
+            if len(payload) < length:
+                break
+            name = uuid_names.get(raw_uuid)
+            if name is None:
+                name = uuid_names[raw_uuid] = str(uuid.UUID(bytes=raw_uuid))
+            yield ts, name, payload
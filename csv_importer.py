@@ -0,0 +1,233 @@
+import io
+import os
+import sys
+import csv
+import glob
+import time
+import hashlib
+import datetime
+from itertools import islice
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+from database_manager import DatabaseManager, get_db
+
+# Fichiers laissés par les anciens loggers CSV
+DEFAULT_PATTERNS = ['whoop_session_*.csv', 'data/session_*.csv']
+
+# Les trois formats historiques (en-tête -> nom)
+LAYOUTS = {
+    ('Timestamp', 'BPM'): 'v1',                                  # whoop_logger.py
+    ('Timestamp', 'BPM', 'RR_Intervals'): 'v2',                  # whoop_logger_v2.py
+    ('Timestamp', 'BPM', 'RR_Intervals', 'Battery'): 'v3',       # whoop_logger_v3.py
+}
+
+CHUNK_ROWS = 50_000          # Lignes lues/insérées par bloc
+COMMIT_EVERY_ROWS = 500_000  # Taille des transactions
+SCAN_BLOCK = 1 << 20         # Octets lus à la fois pour l'empreinte et le découpage
+
+
+def detect_layout(header: List[str]) -> Optional[str]:
+    return LAYOUTS.get(tuple(h.strip() for h in header))
+
+
+def normalize_rows(block: List[List[str]], layout: str) -> List[tuple]:
+    """Lignes CSV brutes -> (timestamp, bpm, rr, battery)"""
+    # Cas courant (bloc sans ligne abîmée) : une seule compréhension, sans test par ligne
+    try:
+        if layout == 'v1':
+            return [(rec[0], int(rec[1]), '', 0) for rec in block]
+        if layout == 'v2':
+            return [(rec[0], int(rec[1]), rec[2], 0) for rec in block]
+        return [(rec[0], int(rec[1]), rec[2], int(rec[3])) for rec in block]
+    except (IndexError, ValueError):
+        pass
+
+    rows = []
+    for rec in block:
+        try:
+            bpm = int(rec[1])
+        except (IndexError, ValueError):
+            continue  # Ligne tronquée (logger coupé en pleine écriture)
+        if layout == 'v1':
+            rows.append((rec[0], bpm, '', 0))
+        elif layout == 'v2':
+            rows.append((rec[0], bpm, rec[2] if len(rec) > 2 else '', 0))
+        else:
+            battery = int(rec[3]) if len(rec) > 3 and rec[3].strip().isdigit() else 0
+            rows.append((rec[0], bpm, rec[2] if len(rec) > 2 else '', battery))
+    return rows
+
+
+def scan_file(path: str):
+    """
+    Travail d'un process, en une passe et sans garder les lignes : format, empreinte du contenu
+    (un fichier renommé ou copié n'est pas réimporté) et position du début de chaque bloc de CHUNK_ROWS lignes.
+    Lecture par blocs de SCAN_BLOCK octets : les fins de ligne sont comptées, pas itérées.
+    """
+    with open(path, 'rb') as f:
+        header = f.readline()
+        layout = detect_layout(next(csv.reader([header.decode('utf-8')], skipinitialspace=True), []))
+        if not layout:
+            return path, None, None, []
+        h = hashlib.sha1(header)
+        offsets, pos = [], len(header)
+        lines_left = 0  # Lignes restantes avant le début du prochain bloc
+        while True:
+            buf = f.read(SCAN_BLOCK)
+            if not buf:
+                break
+            h.update(buf)
+            start = 0
+            while True:
+                if lines_left == 0:
+                    if start >= len(buf):
+                        break
+                    offsets.append(pos + start)
+                    lines_left = CHUNK_ROWS
+                n = buf.count(b'\n', start)
+                if n < lines_left:
+                    lines_left -= n
+                    break
+                # Fin de la dernière ligne du bloc courant, dans ce buffer
+                for _ in range(lines_left):
+                    start = buf.index(b'\n', start) + 1
+                lines_left = 0
+            pos += len(buf)
+    return path, layout, h.hexdigest(), offsets
+
+
+def parse_chunk(path: str, layout: str, offset: int) -> List[tuple]:
+    """Travail d'un process : un bloc de CHUNK_ROWS lignes à partir de `offset` (octets)"""
+    with open(path, 'rb') as raw:
+        raw.seek(offset)
+        f = io.TextIOWrapper(raw, newline='', encoding='utf-8')
+        return normalize_rows(list(islice(csv.reader(f, skipinitialspace=True), CHUNK_ROWS)), layout)
+
+
+def parse_ahead(pool, path: str, layout: str, offsets: List[int], depth: int):
+    """
+    Blocs d'un fichier dans l'ordre, parsés en parallèle avec au plus `depth` blocs en vol :
+    la mémoire reste en O(bloc), quelle que soit la taille du fichier. Sans pool : parsing dans ce process.
+    """
+    if pool is None:
+        for offset in offsets:
+            yield parse_chunk(path, layout, offset)
+        return
+    in_flight = deque()
+    for offset in offsets:
+        in_flight.append(pool.submit(parse_chunk, path, layout, offset))
+        if len(in_flight) >= depth:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+class CSVImporter:
+    """
+    Importe les sessions CSV historiques dans whoop.db.
+    Le parsing tourne en parallèle (blocs de CHUNK_ROWS lignes répartis sur les process), l'écriture reste dans un seul
+    process : SQLite n'a qu'un écrivain, on lui donne de gros executemany en transactions longues.
+    Avec un seul cœur, pas de pool : les process ne feraient qu'ajouter la sérialisation des blocs (pickle)
+    sur le même CPU que l'écrivain.
+    """
+    def __init__(self, db: Optional[DatabaseManager] = None, workers: Optional[int] = None):
+        self.db = db or get_db()
+        self.workers = workers
+
+    def already_imported(self, conn, path: str) -> bool:
+        """Filtre rapide (chemin + taille + date) avant de lancer le parsing"""
+        st = os.stat(path)
+        row = conn.execute(
+            "SELECT 1 FROM imported_files WHERE path = ? AND size = ? AND mtime = ?",
+            (os.path.abspath(path), st.st_size, st.st_mtime)
+        ).fetchone()
+        return row is not None
+
+    def insert_file(self, conn, path: str, layout: str, digest: str, chunks) -> int:
+        """chunks : itérable de blocs consommé au fil de l'eau (0 si aucune ligne valide)"""
+        session_id, count, last_ts = None, 0, None
+        for rows in chunks:
+            if not rows:
+                continue
+            if session_id is None:
+                session_id = conn.execute(
+                    "INSERT INTO sessions (start_time, device_name, notes) VALUES (?, ?, ?)",
+                    (rows[0][0], "Whoop 4.0", f"Import CSV ({layout}) : {os.path.basename(path)}")
+                ).lastrowid
+                # ID (entier SQLite) en dur dans la requête : les lignes du parseur sont insérées telles quelles,
+                # sans reconstruire un tuple par ligne
+                insert_sql = ("INSERT INTO measurements (session_id, timestamp, bpm, rr_intervals, battery, steps) "
+                              f"VALUES ({int(session_id)}, ?, ?, ?, ?, 0)")
+            conn.executemany(insert_sql, rows)
+            count += len(rows)
+            last_ts = rows[-1][0]
+        if session_id is None:
+            return 0
+        conn.execute("UPDATE sessions SET end_time = ? WHERE id = ?", (last_ts, session_id))
+        st = os.stat(path)
+        conn.execute(
+            "INSERT INTO imported_files (path, size, mtime, sha1, session_id, rows, imported_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (os.path.abspath(path), st.st_size, st.st_mtime, digest, session_id, count, datetime.datetime.now())
+        )
+        return count
+
+    def run(self, paths: List[str]) -> int:
+        conn = self.db.get_connection()
+        conn.isolation_level = None  # Transactions gérées à la main (BEGIN/COMMIT par gros blocs)
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA cache_size = -200000")  # ~200 Mo de cache pages pendant l'import
+        todo = [p for p in dict.fromkeys(paths) if not self.already_imported(conn, p)]
+        print(f"📥 {len(todo)} fichier(s) à importer ({len(paths) - len(todo)} déjà en base)")
+
+        t0 = time.perf_counter()
+        total, pending = 0, 0
+        workers = self.workers or os.cpu_count() or 1
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            conn.execute("BEGIN")
+            if pool is not None:
+                depth = 2 * workers
+                scans = pool.map(scan_file, todo)
+            else:
+                depth, scans = 1, map(scan_file, todo)
+            for path, layout, digest, offsets in scans:
+                if not layout:
+                    print(f"⚠️ Format inconnu, ignoré : {path}")
+                    continue
+                if not offsets:
+                    continue
+                dup = conn.execute("SELECT session_id FROM imported_files WHERE sha1 = ?", (digest,)).fetchone()
+                if dup:
+                    print(f"↪️  Doublon de la session #{dup[0]}, ignoré : {path}")
+                    continue
+                n = self.insert_file(conn, path, layout, digest, parse_ahead(pool, path, layout, offsets, depth))
+                total += n
+                pending += n
+                if pending >= COMMIT_EVERY_ROWS:
+                    conn.execute("COMMIT")
+                    conn.execute("BEGIN")
+                    pending = 0
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            conn.close()
+
+        elapsed = time.perf_counter() - t0
+        rate = total / elapsed if elapsed > 0 else 0
+        print(f"✅ {total} mesures importées en {elapsed:.1f}s ({rate:,.0f} lignes/s)")
+        return total
+
+
+if __name__ == "__main__":
+    patterns = sys.argv[1:] or DEFAULT_PATTERNS
+    files = sorted(f for p in patterns for f in glob.glob(p))
+    if not files:
+        print("⚠️  Aucun fichier CSV trouvé.")
+    else:
+        CSVImporter().run(files)
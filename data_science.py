@@ -1,6 +1,10 @@
 
 import numpy as np
 
+# Version des algorithmes ci-dessous : à incrémenter dès qu'un calcul change de résultat.
+# Les indicateurs persistés par session (session_features) plus anciens sont alors recalculés.
+ALGORITHM_VERSION = 1
+
 def calculate_respiratory_rate(rr_intervals_ms):
     """
     Estime le Taux Respiratoire (RPM) basé sur le Phénomène RSA (Respiratory Sinus Arrhythmia).
@@ -52,18 +56,19 @@ def calculate_respiratory_rate(rr_intervals_ms):
     return round(rpm, 1)
 
 
-def analyze_sleep_architecture(bpm_series, steps_total):
+def analyze_sleep_architecture(bpm_series, steps_total, sample_period_s=1.0):
     """
     Détecte si une session est du sommeil et tente de classifier les phases.
     Critères simples :
     - Pas de mouvement (Steps < 10)
     - BPM bas (< 55 ou < Repos+5)
     - Durée > 30 min
+    sample_period_s : écart entre deux points (1s en brut, 60s pour une série à la minute)
     """
-    if not bpm_series or len(bpm_series) < 60: return None
+    if not bpm_series or len(bpm_series) * sample_period_s < 60: return None
     
     avg_bpm = np.mean(bpm_series)
-    duration_min = len(bpm_series) / 60 # Approx 1pt/sec
+    duration_min = len(bpm_series) * sample_period_s / 60 # Approx 1pt/sec par défaut
     
     # Heuristique Sommeil
     if steps_total < 50 and avg_bpm < 65 and duration_min > 20:
@@ -160,3 +165,24 @@ def classify_sleep_phases(bpm_series):
         
     return phases
 
+def daily_trends(frame):
+    """
+    Tendances journalières sur un historique long (ex: parquet_archive.read_archive).
+    Colonnes attendues : timestamp, bpm, rr_intervals (listes de ms), steps.
+    Retourne une liste de dicts {date, avg_bpm, min_bpm, rmssd, steps}.
+    """
+    trends = []
+    if frame is None or len(frame) == 0: return trends
+
+    for day, chunk in frame.groupby(frame['timestamp'].dt.date):
+        rr = np.concatenate([np.asarray(r, dtype=float) for r in chunk['rr_intervals'] if r is not None and len(r)] or [np.empty(0)])
+        rr = rr[(rr > 250) & (rr < 1500)]
+        rmssd = float(np.sqrt(np.mean(np.diff(rr) ** 2))) if len(rr) > 10 else None
+        trends.append({
+            "date": day,
+            "avg_bpm": float(chunk['bpm'].mean()),
+            "min_bpm": int(chunk['bpm'].min()),
+            "rmssd": rmssd,
+            "steps": int(chunk['steps'].sum()),
+        })
+    return trends
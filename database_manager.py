@@ -2,10 +2,250 @@
 import sqlite3
 import datetime
 import os
-from typing import Optional, List, Tuple
+import time
+import threading
+from typing import Callable, Optional, List, Tuple
+from metrics import (timed, DB_QUERY_SECONDS, BEATS_WRITTEN, BEATS_DROPPED, WRITE_BATCH_SIZE,
+                     COMMIT_SECONDS, NOTIFY_TO_COMMIT, QUEUE_DEPTH)
 
 DB_NAME = "whoop.db"
 
+INSERT_MEASUREMENT_SQL = (
+    "INSERT INTO measurements (session_id, timestamp, bpm, rr_intervals, battery, steps) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+# --- MIGRATIONS ---
+# Liste ordonnée (version, description, fonction(cursor)). PRAGMA user_version = dernière appliquée.
+# Ne jamais modifier une migration publiée : en ajouter une nouvelle à la fin.
+# Les migrations 1 à 7 reprennent l'ancien init_db (CREATE ... IF NOT EXISTS) : elles passent
+# aussi sur les bases créées avant le versioning (user_version = 0 mais tables présentes).
+
+def _m001_base(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            start_time TIMESTAMP,
+            end_time TIMESTAMP,
+            device_name TEXT,
+            notes TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS measurements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id INTEGER,
+            timestamp TIMESTAMP,
+            bpm INTEGER,
+            rr_intervals TEXT, -- Stocké en string "800;810;..."
+            battery INTEGER,
+            steps INTEGER DEFAULT 0,
+            FOREIGN KEY(session_id) REFERENCES sessions(id)
+        )
+    ''')
+    # Bases antérieures à la colonne steps
+    columns = [row[1] for row in c.execute('PRAGMA table_info(measurements)')]
+    if 'steps' not in columns:
+        c.execute('ALTER TABLE measurements ADD COLUMN steps INTEGER DEFAULT 0')
+    # Index : lecture (et purge) par session, triée par date
+    c.execute('CREATE INDEX IF NOT EXISTS idx_measurements_session_ts ON measurements(session_id, timestamp)')
+    # High-water mark par session pour la réplication Supabase
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            session_id INTEGER PRIMARY KEY,
+            last_measurement_id INTEGER DEFAULT 0,
+            synced_at TIMESTAMP,
+            FOREIGN KEY(session_id) REFERENCES sessions(id)
+        )
+    ''')
+
+
+def _m002_rollup(c):
+    # Agrégats 1 minute des mesures plus vieilles que la fenêtre de rétention
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS measurements_rollup (
+            session_id INTEGER,
+            minute TIMESTAMP,
+            bpm_min INTEGER,
+            bpm_avg REAL,
+            bpm_max INTEGER,
+            rmssd REAL,
+            steps INTEGER,
+            battery INTEGER,
+            n_beats INTEGER,
+            PRIMARY KEY (session_id, minute),
+            FOREIGN KEY(session_id) REFERENCES sessions(id)
+        )
+    ''')
+    # Vue unifiée : brut récent + rollup ancien (lecture transparente)
+    c.execute('''
+        CREATE VIEW IF NOT EXISTS measurements_timeline AS
+        SELECT session_id, timestamp, bpm, rr_intervals, battery, steps, 1 AS n_beats
+        FROM measurements
+        UNION ALL
+        SELECT session_id, minute AS timestamp, CAST(ROUND(bpm_avg) AS INTEGER) AS bpm,
+               NULL AS rr_intervals, battery, steps, n_beats
+        FROM measurements_rollup
+    ''')
+
+
+def _m003_imported_files(c):
+    # Anti-doublon de csv_importer.py
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS imported_files (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime REAL,
+            sha1 TEXT,
+            session_id INTEGER,
+            rows INTEGER,
+            imported_at TIMESTAMP,
+            FOREIGN KEY(session_id) REFERENCES sessions(id)
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_imported_files_sha1 ON imported_files(sha1)')
+
+
+def _m004_session_summaries(c):
+    # Cache des agrégats par session pour les rapports, cf. session_summary.py
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS session_summaries (
+            session_id INTEGER PRIMARY KEY,
+            fingerprint TEXT,
+            summary_json TEXT,
+            computed_at TIMESTAMP,
+            FOREIGN KEY(session_id) REFERENCES sessions(id)
+        )
+    ''')
+
+
+def _m005_metrics(c):
+    # Dernier instantané par process, cf. metrics.export_to_sqlite
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS metrics (
+            process TEXT,
+            name TEXT,
+            labels TEXT,
+            value REAL,
+            family TEXT,
+            kind TEXT,
+            help TEXT,
+            updated_at TIMESTAMP
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_metrics_process ON metrics(process)')
+
+
+def _m006_gps_track(c):
+    # Trace GPS échantillonnée par gps_tracker.TrackRecorder, hors du handler cardio
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS gps_track (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id INTEGER,
+            timestamp TIMESTAMP,
+            lat REAL,
+            lon REAL,
+            accuracy REAL,
+            FOREIGN KEY(session_id) REFERENCES sessions(id)
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_gps_track_session_ts ON gps_track(session_id, timestamp)')
+
+
+def _m007_route_index(c):
+    # Tracé simplifié (Douglas-Peucker, cf. route_index.py) + index R*Tree des tronçons
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS gps_track_simplified (
+            session_id INTEGER PRIMARY KEY,
+            polyline TEXT, -- JSON [[lat, lon], ...]
+            n_points INTEGER,
+            n_raw INTEGER,
+            tolerance_m REAL,
+            distance_m REAL,
+            min_lat REAL, max_lat REAL, min_lon REAL, max_lon REAL,
+            updated_at TIMESTAMP,
+            FOREIGN KEY(session_id) REFERENCES sessions(id)
+        )
+    ''')
+    try:
+        c.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS gps_track_rtree
+            USING rtree(id, min_lat, max_lat, min_lon, max_lon, +session_id INTEGER)
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ R*Tree indisponible dans ce SQLite ({e}) : recherche par zone désactivée")
+
+
+def _m008_session_features(c):
+    # Indicateurs dérivés des sessions closes, cf. session_features.py
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS session_features (
+            session_id INTEGER PRIMARY KEY,
+            algo_version INTEGER,   -- data_science.ALGORITHM_VERSION au moment du calcul
+            format_version INTEGER, -- session_features.FEATURES_VERSION
+            max_hr INTEGER,
+            end_time TIMESTAMP,
+            features_json TEXT,
+            computed_at TIMESTAMP,
+            FOREIGN KEY(session_id) REFERENCES sessions(id)
+        )
+    ''')
+
+
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "sessions, measurements (+steps), sync_state", _m001_base),
+    (2, "measurements_rollup + vue measurements_timeline", _m002_rollup),
+    (3, "imported_files", _m003_imported_files),
+    (4, "session_summaries", _m004_session_summaries),
+    (5, "metrics", _m005_metrics),
+    (6, "gps_track", _m006_gps_track),
+    (7, "gps_track_simplified + gps_track_rtree", _m007_route_index),
+    (8, "session_features", _m008_session_features),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Bases déjà vérifiées par ce process : les DatabaseManager suivants ne touchent plus au schéma.
+# Clé = chemin + inode : un fichier supprimé puis recréé (benchmarks, tests manuels) est re-migré.
+_SCHEMA_READY = set()
+
+
+def _file_key(db_path: str) -> Optional[tuple]:
+    try:
+        st = os.stat(db_path)
+    except OSError:
+        return None
+    return (os.path.abspath(db_path), st.st_dev, st.st_ino)
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Applique les migrations manquantes, chacune dans sa transaction avec son user_version.
+    BEGIN IMMEDIATE + relecture de la version : deux process qui démarrent ensemble ne migrent qu'une fois.
+    Retourne la version finale.
+    """
+    conn.isolation_level = None  # Transactions pilotées à la main (DDL inclus)
+    version = start = conn.execute('PRAGMA user_version').fetchone()[0]
+    for target, description, apply in MIGRATIONS:
+        if target <= version:
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if target <= version:
+                conn.execute('COMMIT')
+                continue
+            apply(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {int(target)}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        version = target
+    if version != start:
+        print(f"🗄️  Schéma migré v{start} -> v{version}")
+    return version
+
+
 class DatabaseManager:
     def __init__(self, db_path: str = DB_NAME):
         self.db_path = db_path
@@ -15,44 +255,27 @@ class DatabaseManager:
         """Crée une connexion thread-safe"""
         return sqlite3.connect(self.db_path, check_same_thread=False)
 
+    def get_readonly_connection(self):
+        """Connexion en lecture seule (exports/analyses : ne bloque jamais le logger)"""
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+
     def init_db(self):
-        """Initialise le schéma de la base de données"""
+        """
+        Met le schéma à jour via les migrations (cf. MIGRATIONS).
+        Base à jour : une seule lecture de PRAGMA user_version, aucun verrou d'écriture.
+        """
+        key = _file_key(self.db_path)
+        if key in _SCHEMA_READY:
+            return
         conn = self.get_connection()
-        c = conn.cursor()
-        
-        # Table Sessions
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                start_time TIMESTAMP,
-                end_time TIMESTAMP,
-                device_name TEXT,
-                notes TEXT
-            )
-        ''')
-        
-        # Table Measurements (Mesures)
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS measurements (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id INTEGER,
-                timestamp TIMESTAMP,
-                bpm INTEGER,
-                rr_intervals TEXT, -- Stocké en string "800;810;..."
-                battery INTEGER,
-                FOREIGN KEY(session_id) REFERENCES sessions(id)
-            )
-        ''')
-        
-        # Migration : Ajout colonne steps si elle manque
         try:
-            c.execute('ALTER TABLE measurements ADD COLUMN steps INTEGER DEFAULT 0')
-        except:
-            pass # La colonne existe déjà
-        
-        conn.commit()
-        conn.close()
+            if conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+                migrate(conn)
+        finally:
+            conn.close()
+        _SCHEMA_READY.add(_file_key(self.db_path))
 
+    @timed(DB_QUERY_SECONDS)
     def create_session(self, device_name: str = "Whoop 4.0") -> int:
         """Crée une nouvelle session et retourne son ID"""
         conn = self.get_connection()
@@ -66,6 +289,7 @@ class DatabaseManager:
         conn.close()
         return session_id
 
+    @timed(DB_QUERY_SECONDS)
     def end_session(self, session_id: int):
         """Marque la fin d'une session"""
         conn = self.get_connection()
@@ -75,47 +299,50 @@ class DatabaseManager:
         conn.commit()
         conn.close()
 
+    @timed(DB_QUERY_SECONDS)
     def insert_measurement(self, session_id: int, bpm: int, rr_str: str, battery: int, steps: int = 0):
         """Insère une mesure atomique"""
         conn = self.get_connection()
         c = conn.cursor()
         now = datetime.datetime.now()
         
-        c.execute('''
-            INSERT INTO measurements (session_id, timestamp, bpm, rr_intervals, battery, steps)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (session_id, now, bpm, rr_str, battery, steps))
+        c.execute(INSERT_MEASUREMENT_SQL, (session_id, now, bpm, rr_str, battery, steps))
         
         conn.commit()
         conn.close()
 
+    @timed(DB_QUERY_SECONDS)
     def get_all_sessions(self) -> List[Tuple]:
         """Récupère l'historique des sessions pour le menu déroulant"""
         conn = self.get_connection()
         c = conn.cursor()
         # On récupère ID + Start Time + Nb Mesures (pour info)
+        # Les sessions anciennes n'ont plus que leurs agrégats : on compte les battements qu'ils résument
         c.execute('''
-            SELECT s.id, s.start_time, s.end_time, COUNT(m.id) as count
+            SELECT s.id, s.start_time, s.end_time,
+                   (SELECT COUNT(*) FROM measurements m WHERE m.session_id = s.id)
+                   + COALESCE((SELECT SUM(r.n_beats) FROM measurements_rollup r WHERE r.session_id = s.id), 0) as count
             FROM sessions s
-            LEFT JOIN measurements m ON s.id = m.session_id
-            GROUP BY s.id
             ORDER BY s.start_time DESC
         ''')
         rows = c.fetchall()
         conn.close()
         return rows
 
+    @timed(DB_QUERY_SECONDS)
     def get_session_data(self, session_id: int):
         """Récupère toutes les mesures d'une session (Compatible Pandas)"""
         # Note: Pour pandas on utilisera directement pd.read_sql avec une connexion brute
         # Cette méthode est un helper si on veut des raw tuples
         conn = self.get_connection()
         c = conn.cursor()
-        c.execute('SELECT timestamp, bpm, rr_intervals, battery FROM measurements WHERE session_id = ? ORDER BY timestamp ASC', (session_id,))
+        # Vue timeline : les minutes agrégées par la rétention remplacent les battements purgés
+        c.execute('SELECT timestamp, bpm, rr_intervals, battery FROM measurements_timeline WHERE session_id = ? ORDER BY timestamp ASC', (session_id,))
         rows = c.fetchall()
         conn.close()
         return rows
 
+    @timed(DB_QUERY_SECONDS)
     def get_avg_rmssd_7_days(self):
         """Calcule la VFC moyenne (RMSSD) des sessions des 7 derniers jours"""
         conn = self.get_connection()
@@ -131,7 +358,11 @@ class DatabaseManager:
             
             for s in sessions:
                 sid = s[0]
-                rows = conn.execute("SELECT rr_intervals FROM measurements WHERE session_id = ?", (sid,)).fetchall()
+                # Vue timeline : RR du brut récent (les minutes agrégées n'ont plus de RR)
+                rows = conn.execute(
+                    "SELECT rr_intervals FROM measurements_timeline WHERE session_id = ? AND rr_intervals IS NOT NULL",
+                    (sid,)
+                ).fetchall()
                 session_rrs = []
                 for r in rows:
                     if r[0]: session_rrs.extend([int(x) for x in r[0].split(';') if x.strip()])
@@ -141,6 +372,12 @@ class DatabaseManager:
                     sq_diffs = [d*d for d in diffs]
                     rmssd = (sum(sq_diffs)/len(sq_diffs))**0.5
                     total_rmssd.append(rmssd)
+                else:
+                    # Session entièrement agrégée (rétention) : RMSSD minute du rollup
+                    rmssd = conn.execute(
+                        "SELECT AVG(rmssd) FROM measurements_rollup WHERE session_id = ?", (sid,)
+                    ).fetchone()[0]
+                    if rmssd: total_rmssd.append(rmssd)
             
             conn.close()
             if not total_rmssd: return 0
@@ -150,6 +387,7 @@ class DatabaseManager:
             conn.close()
             return 0
 
+    @timed(DB_QUERY_SECONDS)
     def get_sleep_duration_last_24h(self):
         """Calcule la durée totale de sommeil sur les dernières 24h"""
         conn = self.get_connection()
@@ -179,9 +417,10 @@ class DatabaseManager:
                     try: end = datetime.datetime.fromisoformat(end)
                     except: continue
                 
-                # Récup stats rapides
+                # Récup stats rapides (vue timeline : moyenne pondérée par les battements des minutes agrégées)
                 row = conn.execute(
-                    "SELECT AVG(bpm) as avg_bpm, SUM(steps) as total_steps FROM measurements WHERE session_id = ?", 
+                    "SELECT SUM(bpm * n_beats) * 1.0 / SUM(n_beats) as avg_bpm, SUM(steps) as total_steps "
+                    "FROM measurements_timeline WHERE session_id = ?", 
                     (sid,)
                 ).fetchone()
                 
@@ -205,3 +444,162 @@ class DatabaseManager:
             print(f"Sleep calc error: {e}")
             conn.close()
             return "0h 00"
+
+    # --- TRACE GPS ---
+
+    @timed(DB_QUERY_SECONDS)
+    def insert_gps_points(self, rows: List[Tuple]):
+        """Insère un lot de points [(session_id, timestamp, lat, lon, accuracy), ...]"""
+        conn = self.get_connection()
+        conn.executemany(
+            "INSERT INTO gps_track (session_id, timestamp, lat, lon, accuracy) VALUES (?, ?, ?, ?, ?)", rows
+        )
+        conn.commit()
+        conn.close()
+
+    @timed(DB_QUERY_SECONDS)
+    def get_gps_track(self, session_id: int) -> List[Tuple]:
+        """Trace d'une session triée par date : [(timestamp, lat, lon, accuracy), ...]"""
+        conn = self.get_connection()
+        rows = conn.execute(
+            "SELECT timestamp, lat, lon, accuracy FROM gps_track WHERE session_id = ? ORDER BY timestamp ASC",
+            (session_id,)
+        ).fetchall()
+        conn.close()
+        return rows
+
+    # --- SYNC CLOUD (Supabase) ---
+
+    @timed(DB_QUERY_SECONDS)
+    def get_pending_sync_sessions(self) -> List[Tuple]:
+        """Sessions ayant des mesures au-delà de leur high-water mark : [(id, device_name, last_id), ...]"""
+        conn = self.get_connection()
+        rows = conn.execute('''
+            SELECT s.id, s.device_name, COALESCE(st.last_measurement_id, 0) as mark
+            FROM sessions s
+            LEFT JOIN sync_state st ON st.session_id = s.id
+            WHERE EXISTS (
+                SELECT 1 FROM measurements m
+                WHERE m.session_id = s.id AND m.id > COALESCE(st.last_measurement_id, 0)
+            )
+            ORDER BY s.id ASC
+        ''').fetchall()
+        conn.close()
+        return rows
+
+    @timed(DB_QUERY_SECONDS)
+    def get_measurements_after(self, session_id: int, after_id: int, limit: int = 500) -> List[Tuple]:
+        """Mesures d'une session postérieures à un id (id, timestamp, bpm, rr_intervals, battery, steps)"""
+        conn = self.get_connection()
+        rows = conn.execute('''
+            SELECT id, timestamp, bpm, rr_intervals, battery, steps
+            FROM measurements
+            WHERE session_id = ? AND id > ?
+            ORDER BY id ASC
+            LIMIT ?
+        ''', (session_id, after_id, limit)).fetchall()
+        conn.close()
+        return rows
+
+    @timed(DB_QUERY_SECONDS)
+    def set_sync_mark(self, session_id: int, last_measurement_id: int):
+        """Avance le high-water mark de synchronisation d'une session"""
+        conn = self.get_connection()
+        conn.execute('''
+            INSERT INTO sync_state (session_id, last_measurement_id, synced_at) VALUES (?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                last_measurement_id = MAX(last_measurement_id, excluded.last_measurement_id),
+                synced_at = excluded.synced_at
+        ''', (session_id, last_measurement_id, datetime.datetime.now()))
+        conn.commit()
+        conn.close()
+
+
+_INSTANCES = {}
+_INSTANCES_LOCK = threading.Lock()
+
+
+def get_db(db_path: str = DB_NAME) -> DatabaseManager:
+    """DatabaseManager partagé par le process (un par fichier) : à préférer à DatabaseManager() dans les boucles"""
+    key = os.path.abspath(db_path)
+    db = _INSTANCES.get(key)
+    if db is None:
+        with _INSTANCES_LOCK:
+            db = _INSTANCES.get(key)
+            if db is None:
+                db = _INSTANCES[key] = DatabaseManager(db_path)
+    return db
+
+
+class MeasurementWriter:
+    """
+    Écriture groupée des mesures : une connexion persistante, un executemany + un commit
+    tous les `batch_size` battements ou toutes les `flush_interval` secondes.
+    batch_size=1 reproduit insert_measurement (un commit par battement).
+    on_commit(nb_lignes, instant perf_counter) est appelé après chaque commit (benchmarks, métriques).
+    Si la base reste indisponible, au-delà de max_pending lignes en attente les plus anciennes sont perdues.
+    """
+    def __init__(self, db: DatabaseManager, batch_size: int = 1, flush_interval: float = 1.0,
+                 synchronous: Optional[str] = None, on_commit: Optional[Callable[[int, float], None]] = None,
+                 max_pending: int = 100_000):
+        self.db = db
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.on_commit = on_commit
+        self.max_pending = max_pending
+        self.conn = db.get_connection()
+        if synchronous:
+            self.conn.execute(f"PRAGMA synchronous = {synchronous}")
+        self.pending = []
+        self.received = []  # perf_counter de réception de chaque ligne en attente
+        self.last_flush = time.monotonic()
+        self.rows_written = 0
+
+    def add(self, session_id: int, bpm: int, rr_str: str, battery: int, steps: int = 0,
+            timestamp: Optional[datetime.datetime] = None, received: Optional[float] = None):
+        self.pending.append((session_id, timestamp or datetime.datetime.now(), bpm, rr_str, battery, steps))
+        self.received.append(received or time.perf_counter())
+        QUEUE_DEPTH.set(len(self.pending))
+        if len(self.pending) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> int:
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return 0
+        rows, received = self.pending, self.received
+        self.pending, self.received = [], []
+        t0 = time.perf_counter()
+        try:
+            self.conn.executemany(INSERT_MEASUREMENT_SQL, rows)
+            self.conn.commit()
+        except Exception:
+            # On garde les lignes pour le prochain essai (base verrouillée, disque plein...)
+            self.conn.rollback()
+            self.pending, self.received = rows + self.pending, received + self.received
+            overflow = len(self.pending) - self.max_pending
+            if overflow > 0:
+                del self.pending[:overflow], self.received[:overflow]
+                BEATS_DROPPED.inc(overflow, reason="backlog")
+            QUEUE_DEPTH.set(len(self.pending))
+            raise
+        t_commit = time.perf_counter()
+        COMMIT_SECONDS.observe(t_commit - t0)
+        WRITE_BATCH_SIZE.observe(len(rows))
+        BEATS_WRITTEN.inc(len(rows))
+        for t in received:
+            NOTIFY_TO_COMMIT.observe(t_commit - t)
+        QUEUE_DEPTH.set(len(self.pending))
+        self.rows_written += len(rows)
+        if self.on_commit:
+            self.on_commit(len(rows), t_commit)
+        return len(rows)
+
+    def close(self):
+        if self.conn is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,196 @@
+"""
+Générateur de bases whoop.db synthétiques (tests de charge / benchmarks).
+Chaque jour : une nuit de sommeil (cycles ~90 min, FC basse, pas de pas) puis une journée
+(rythme circadien, marches, séance de sport certains jours). RR = 60000/BPM modulé par la
+respiration (RSA ~15 rpm) + bruit. Écriture en bloc, index recréés à la fin.
+Un process par utilisateur (--workers). Une base existante n'est écrasée qu'avec --force.
+"""
+import os
+import time
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+from database_manager import DatabaseManager
+
+INSERT_SQL = ("INSERT INTO measurements (session_id, timestamp, bpm, rr_intervals, battery, steps) "
+              "VALUES (?, ?, ?, ?, ?, ?)")
+
+
+class UserProfile:
+    def __init__(self, rng: np.random.Generator):
+        self.rest_hr = int(rng.integers(48, 62))
+        self.max_hr = int(rng.integers(178, 198))
+        self.workout_prob = float(rng.uniform(0.3, 0.7))
+        self.resp_hz = float(rng.uniform(0.22, 0.28))
+
+
+def plan_sessions(start: datetime.datetime, days: int, profile: UserProfile, rng: np.random.Generator):
+    """Liste des sessions (début, fin, type) : nuit (commencée la veille) puis journée, avec un peu de jitter"""
+    sessions = []
+    for d in range(days):
+        day = start + datetime.timedelta(days=d)
+        bed = day.replace(hour=23, minute=0) - datetime.timedelta(days=1, minutes=float(rng.normal(0, 30)))
+        wake = bed + datetime.timedelta(hours=float(rng.uniform(6.5, 8.5)))
+        sessions.append((bed, wake, 'night'))
+        day_start = wake + datetime.timedelta(minutes=float(rng.uniform(5, 20)))
+        day_end = wake.replace(hour=22, minute=30) + datetime.timedelta(minutes=float(rng.normal(0, 20)))
+        sessions.append((day_start, day_end, 'day'))
+    return sessions
+
+
+def smooth_noise(n: int, rate: float, rng: np.random.Generator, period_s: float = 60.0, scale: float = 1.0):
+    """Bruit basse fréquence : points aléatoires toutes les period_s secondes, interpolés"""
+    knots = max(2, int(n / (period_s * rate)) + 2)
+    x = np.linspace(0, n, knots)
+    return np.interp(np.arange(n), x, rng.normal(0, scale, knots))
+
+
+def generate_session(t0: datetime.datetime, t1: datetime.datetime, kind: str, rate: float,
+                     profile: UserProfile, rng: np.random.Generator, epoch: datetime.datetime):
+    """Colonnes (timestamp, bpm, rr, battery, steps) d'une session, entièrement vectorisées"""
+    n = int((t1 - t0).total_seconds() * rate)
+    if n <= 0:
+        return None
+    t = np.arange(n) / rate                       # secondes depuis le début de session
+    start_h = t0.hour + t0.minute / 60
+    hour = (start_h + t / 3600) % 24
+
+    # Rythme circadien (minimum vers 4h du matin)
+    circadian = 4 * np.cos(2 * np.pi * (hour - 16) / 24)
+    bpm = profile.rest_hr + circadian + smooth_noise(n, rate, rng, 60, 2.5)
+    cadence = np.zeros(n)
+    rsa = np.full(n, 0.05)                        # Amplitude RSA relative
+
+    if kind == 'night':
+        # Cycles de sommeil ~90 min : profond (FC basse) -> léger -> REM (FC plus variable)
+        cycle = np.sin(2 * np.pi * t / 5400)
+        bpm += 2 + 3 * cycle + np.where(cycle > 0.6, smooth_noise(n, rate, rng, 20, 3), 0)
+        rsa[:] = 0.07
+    else:
+        bpm += 14
+        # Marches : ~8 blocs de 5 à 20 min dans la journée
+        for _ in range(8):
+            a = int(rng.uniform(0, n))
+            b = min(n, a + int(rng.uniform(300, 1200) * rate))
+            cadence[a:b] = rng.uniform(95, 115)
+            bpm[a:b] += rng.uniform(15, 30)
+        # Séance de sport en fin de journée (certains jours)
+        if rng.random() < profile.workout_prob:
+            a = int(max(0, (17.5 - start_h) * 3600 + rng.normal(0, 1800)) * rate)
+            dur = int(rng.uniform(30, 90) * 60 * rate)
+            if a + dur < n:
+                ramp = np.minimum(1, np.arange(dur) / (300 * rate))
+                intensity = rng.uniform(0.65, 0.9) * profile.max_hr - profile.rest_hr - 14
+                bpm[a:a + dur] += ramp * intensity + smooth_noise(dur, rate, rng, 30, 6)
+                cadence[a:a + dur] = rng.uniform(150, 175)
+                rsa[a:a + dur] = 0.015
+
+    bpm = np.clip(np.rint(bpm), 38, profile.max_hr).astype(np.int64)
+
+    # RR : 60000/BPM modulé par la respiration + bruit ; deuxième RR si plus d'un battement par notification
+    resp = np.sin(2 * np.pi * profile.resp_hz * t)
+    rr1 = (60000 / bpm) * (1 + rsa * resp) + rng.normal(0, 8, n)
+    rr2 = rr1 + rng.normal(0, 12, n)
+    rr1 = rr1.astype(np.int64).astype(str)
+    two = rng.random(n) < np.clip(bpm / (60 * rate) - 1, 0, 1)
+    rr = np.where(two, np.char.add(np.char.add(rr1, ';'), rr2.astype(np.int64).astype(str)), rr1)
+
+    # Pas : cadence (pas/min) intégrée, arrondie sans perdre les fractions
+    steps = np.diff(np.floor(np.cumsum(cadence / 60 / rate)), prepend=0).astype(np.int64)
+
+    # Batterie : ~22 %/jour, rechargée à 100 % quand elle passe sous 20 %
+    elapsed_days = ((t0 - epoch).total_seconds() + t) / 86400
+    battery = (100 - (elapsed_days * 22) % 80).astype(np.int64)
+
+    base = np.datetime64(t0, 'us')
+    ts = np.char.replace(np.datetime_as_string(base + (t * 1e6).astype('timedelta64[us]'), unit='us'), 'T', ' ')
+    return ts, bpm, rr, battery, steps
+
+
+def generate_user_db(path: str, days: int, rate: float, seed: int, end: datetime.date = None,
+                     force: bool = False) -> int:
+    """Génère une base complète pour un utilisateur. Retourne le nombre de mesures écrites."""
+    if os.path.exists(path):
+        if not force:
+            raise FileExistsError(f"{path} existe déjà (--force pour l'écraser)")
+        os.remove(path)
+    db = DatabaseManager(path)
+    rng = np.random.default_rng(seed)
+    profile = UserProfile(rng)
+
+    end = end or datetime.date.today()
+    start = datetime.datetime.combine(end - datetime.timedelta(days=days), datetime.time.min)
+    # Rien dans le futur : la dernière journée s'arrête avant maintenant
+    now = datetime.datetime.now()
+    plan = [s for s in plan_sessions(start, days, profile, rng) if s[1] <= now]
+
+    conn = db.get_connection()
+    conn.isolation_level = None
+    # Base jetable : pas de journal, pas de fsync, index reconstruits en une passe à la fin
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -200000")
+    indexes = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'measurements' AND sql IS NOT NULL"
+    ).fetchall()
+    for name, _ in indexes:
+        conn.execute(f"DROP INDEX {name}")
+
+    total = 0
+    conn.execute("BEGIN")
+    for sid, (t0, t1, kind) in enumerate(plan, start=1):
+        conn.execute("INSERT INTO sessions (id, start_time, end_time, device_name, notes) VALUES (?, ?, ?, ?, ?)",
+                     (sid, t0, t1, "Whoop 4.0", f"Synthétique ({kind})"))
+        cols = generate_session(t0, t1, kind, rate, profile, rng, start)
+        if cols is None:
+            continue
+        ts, bpm, rr, battery, steps = cols
+        conn.executemany(INSERT_SQL, zip(repeat(sid), ts.tolist(), bpm.tolist(), rr.tolist(),
+                                         battery.tolist(), steps.tolist()))
+        total += len(bpm)
+    conn.execute("COMMIT")
+
+    for _, sql in indexes:
+        conn.execute(sql)
+    conn.close()
+    return total
+
+
+def _generate_timed(path: str, days: int, rate: float, seed: int, force: bool):
+    t0 = time.perf_counter()
+    n = generate_user_db(path, days, rate, seed, force=force)
+    return path, n, time.perf_counter() - t0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère des bases whoop.db synthétiques")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--rate", type=float, default=1.0, help="Mesures par seconde (1.0 = 1 Hz)")
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--out", default="synthetic.db", help="Fichier (suffixe _uN si plusieurs utilisateurs)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None, help="Process en parallèle (défaut: un par cœur)")
+    parser.add_argument("--force", action="store_true", help="Écraser les bases existantes")
+    args = parser.parse_args()
+
+    stem, ext = os.path.splitext(args.out)
+    paths = [args.out if args.users == 1 else f"{stem}_u{u + 1}{ext}" for u in range(args.users)]
+    existing = [p for p in paths if os.path.exists(p)]
+    if existing and not args.force:
+        print(f"❌ Déjà présent(s) : {', '.join(existing)} (--force pour écraser)")
+        raise SystemExit(1)
+
+    t_start = time.perf_counter()
+    total = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(_generate_timed, path, args.days, args.rate, args.seed + u, args.force)
+                   for u, path in enumerate(paths)]
+        for future in futures:
+            path, n, dt = future.result()
+            total += n
+            print(f"🧪 {path} : {n:,} mesures sur {args.days} j en {dt:.1f}s ({n / dt:,.0f} lignes/s)")
+    if len(paths) > 1:
+        dt = time.perf_counter() - t_start
+        print(f"✅ {total:,} mesures, {len(paths)} utilisateurs en {dt:.1f}s ({total / dt:,.0f} lignes/s)")
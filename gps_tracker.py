@@ -1,32 +1,49 @@
 import math
 import time
+import asyncio
+import datetime
 
-HAS_GPS = False
-try:
-    from CoreLocation import CLLocationManager, kCLLocationAccuracyBest, kCLDistanceFilterNone
-    from PyObjCTools import AppHelper
-    from Foundation import NSObject
+# NumPy est importé dans les fonctions vectorisées : le logger sans GPS n'en a pas besoin au démarrage.
+# CoreLocation (PyObjC) n'est chargé qu'à la première création d'un GPSTracker, pas à l'import :
+# route_index, le dashboard et le logger sans GPS (gps.enabled: false) n'en paient pas le coût.
+HAS_GPS = None  # None = pas encore tenté
+GPSHandler = None
+
+
+def load_corelocation() -> bool:
+    """Importe CoreLocation et définit GPSHandler (une seule tentative par process)"""
+    global HAS_GPS, GPSHandler, CLLocationManager, kCLLocationAccuracyBest, kCLDistanceFilterNone
+    if HAS_GPS is not None:
+        return HAS_GPS
+    try:
+        from CoreLocation import CLLocationManager, kCLLocationAccuracyBest, kCLDistanceFilterNone
+        from Foundation import NSObject
+    except ImportError:
+        print("⚠️ Module CoreLocation introuvable. Le GPS sera désactivé.")
+        HAS_GPS = False
+        return False
+
+    class _GPSHandler(NSObject):
+        def init(self):
+            self = super(_GPSHandler, self).init()
+            self.coordinates = None
+            self.accuracy = None
+            self.last_update = time.time()
+            return self
+
+        def locationManager_didUpdateLocations_(self, manager, locations):
+            loc = locations[-1]
+            self.coordinates = (loc.coordinate().latitude, loc.coordinate().longitude)
+            self.accuracy = loc.horizontalAccuracy()
+            self.last_update = time.time()
+
+    GPSHandler = _GPSHandler
     HAS_GPS = True
-except ImportError:
-    print("⚠️ Module CoreLocation introuvable. Le GPS sera désactivé.")
-    # On définit des mocks pour éviter NameError dans la classe
-    NSObject = object
-    CLLocationManager = None
-
-class GPSHandler(NSObject):
-    def init(self):
-        self = super(GPSHandler, self).init()
-        self.coordinates = None
-        self.last_update = time.time()
-        return self
-        
-    def locationManager_didUpdateLocations_(self, manager, locations):
-        loc = locations[-1]
-        self.coordinates = (loc.coordinate().latitude, loc.coordinate().longitude)
-        self.last_update = time.time()
+    return True
+
 
 class GPSTracker:
-    def __init__(self):
+    def __init__(self, enabled: bool = True):
         self.running = False
         self.start_coords = None
         self.total_distance = 0.0
@@ -34,7 +51,7 @@ class GPSTracker:
         self.manager = None
         self.handler = None
 
-        if HAS_GPS:
+        if enabled and load_corelocation():
             try:
                 self.handler = GPSHandler.alloc().init()
                 self.manager = CLLocationManager.alloc().init()
@@ -64,6 +81,13 @@ class GPSTracker:
             return None
         return self.handler.coordinates
             
+    def get_current_fix(self):
+        """Dernier fix (lat, lon, précision m, epoch de réception) ou None"""
+        if not self.handler or not HAS_GPS or not self.handler.coordinates:
+            return None
+        lat, lon = self.handler.coordinates
+        return lat, lon, self.handler.accuracy, self.handler.last_update
+
     def get_distance(self):
         if not self.running or not self.handler or not HAS_GPS:
             return 0.0
@@ -100,3 +124,130 @@ class GPSTracker:
         c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
 
         return R * c
+
+
+# --- CALCULS VECTORISÉS SUR UNE TRACE ---
+EARTH_RADIUS_M = 6371000
+MIN_SEGMENT_M = 5.0      # Déplacement minimal par fenêtre : en dessous, jitter d'un GPS immobile
+WINDOW_S = 10.0          # Points espacés d'au moins WINDOW_S s (à 1 Hz, un pas lent ~ le jitter)
+MAX_ACCURACY_M = 50.0    # Fix moins précis ignorés pour la distance
+MAX_SPEED_MS = 50.0      # Saut aberrant (fix erroné)
+
+
+def haversine_np(lat1, lon1, lat2, lon2):
+    """Même formule que GPSTracker.haversine, sur des tableaux (mètres)"""
+    import numpy as np
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=float)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_M * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def track_segments(lat, lon, ts=None, accuracy=None, window_s: float = WINDOW_S):
+    """
+    Longueur (m) des segments d'une trace, calculée d'un bloc :
+    fix imprécis retirés, un point par fenêtre de window_s secondes (plus le dernier),
+    segments sous MIN_SEGMENT_M (immobile) ou trop rapides (fix erroné) mis à 0.
+    """
+    import numpy as np
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    idx = np.arange(len(lat))
+    if accuracy is not None:
+        acc = np.asarray(accuracy, dtype=float)
+        idx = idx[~(acc > MAX_ACCURACY_M)]  # NaN (précision inconnue) conservé
+    if ts is not None and len(idx):
+        ts = np.asarray(ts, dtype=float)
+        bins = np.floor((ts[idx] - ts[idx[0]]) / window_s)
+        first = np.r_[True, bins[1:] != bins[:-1]]
+        first[-1] = True
+        idx = idx[first]
+    if len(idx) < 2:
+        return np.zeros(0)
+    seg = haversine_np(lat[idx[:-1]], lon[idx[:-1]], lat[idx[1:]], lon[idx[1:]])
+    valid = seg >= MIN_SEGMENT_M
+    if ts is not None:
+        valid &= seg <= MAX_SPEED_MS * np.maximum(np.diff(ts[idx]), 1e-3)
+    return np.where(valid, seg, 0.0)
+
+
+def track_distance(lat, lon, ts=None, accuracy=None) -> float:
+    return float(track_segments(lat, lon, ts, accuracy).sum())
+
+
+def session_distance(db, session_id: int) -> float:
+    """Distance d'une session recalculée depuis la table gps_track"""
+    import numpy as np
+    rows = db.get_gps_track(session_id)
+    if len(rows) < 2:
+        return 0.0
+    ts, lat, lon, acc = zip(*rows)
+    epoch = [datetime.datetime.fromisoformat(str(t)).timestamp() for t in ts]
+    return track_distance(lat, lon, epoch, [np.nan if a is None else a for a in acc])
+
+
+class TrackRecorder:
+    """
+    Échantillonne le GPS dans sa propre tâche asyncio (hors du handler cardio) et écrit la trace
+    dans gps_track par lots. La distance est cumulée par lot avec track_segments ; le logger
+    n'a plus qu'à lire distance_m à chaque battement.
+    """
+    def __init__(self, db, tracker: GPSTracker, session_id: int, interval: float = 1.0, flush_every: int = 5):
+        self.db = db
+        self.tracker = tracker
+        self.session_id = session_id
+        self.interval = interval
+        self.flush_every = flush_every
+        self.pending = []          # (epoch, lat, lon, précision)
+        self.last_point = None     # Ancrage : dernier point compté (raccord entre lots)
+        self.last_fix_time = None
+        self.distance_m = 0.0
+        self.speed_ms = 0.0        # Vitesse moyenne sur le dernier lot
+
+    def poll(self) -> bool:
+        fix = self.tracker.get_current_fix()
+        if not fix or fix[3] == self.last_fix_time:
+            return False  # Pas de GPS ou pas de nouveau fix depuis le dernier passage
+        lat, lon, accuracy, fix_time = fix
+        self.last_fix_time = fix_time
+        self.pending.append((fix_time, lat, lon, accuracy))
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+        return True
+
+    def flush(self) -> int:
+        import numpy as np
+        if not self.pending:
+            return 0
+        points, self.pending = self.pending, []
+        try:
+            self.db.insert_gps_points([
+                (self.session_id, datetime.datetime.fromtimestamp(t), lat, lon, acc) for t, lat, lon, acc in points
+            ])
+        except Exception:
+            self.pending = points + self.pending  # Réessayé au prochain lot
+            raise
+        chain = ([self.last_point] if self.last_point else []) + points
+        arr = np.array([(t, lat, lon, np.nan if acc is None else acc) for t, lat, lon, acc in chain], dtype=float)
+        added = float(track_segments(arr[:, 1], arr[:, 2], arr[:, 0], arr[:, 3]).sum())
+        self.distance_m += added
+        self.speed_ms = added / max(arr[-1, 0] - arr[0, 0], 1.0)
+        # Point d'ancrage : on ne l'avance que si on a bougé, un déplacement lent finit par compter
+        if added > 0 or self.last_point is None:
+            self.last_point = points[-1]
+        return len(points)
+
+    def is_moving(self, min_speed: float = 0.5, max_age: float = 10.0) -> bool:
+        """Déplacement réel d'après le dernier lot (fix récent et vitesse > min_speed m/s)"""
+        return (self.last_fix_time is not None and time.time() - self.last_fix_time <= max_age
+                and self.speed_ms > min_speed)
+
+    async def run(self):
+        if not HAS_GPS:
+            return
+        try:
+            while True:
+                try: self.poll()
+                except Exception as e: print(f"⚠️ Erreur écriture trace GPS : {e}")
+                await asyncio.sleep(self.interval)
+        finally:
+            try: self.flush()
+            except Exception as e: print(f"⚠️ Erreur écriture trace GPS : {e}")
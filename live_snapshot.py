@@ -0,0 +1,206 @@
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+import metrics
+from session_views import compute_session_view
+
+# Instantané partagé par tous les onglets du dashboard (un seul process Streamlit) :
+# un thread de fond recalcule, au plus une fois par intervalle, la liste des sessions, le contexte
+# global (VFC 7 jours, sommeil 24h) et la vue de chaque session live regardée. Les reruns des
+# onglets ne font plus que lire : le coût serveur suit le nombre de sessions live, pas d'onglets.
+# Le thread s'arrête seul quand plus aucun onglet ne lit, et redémarre à la demande.
+# Chaque tour commence par un signal de changement quasi gratuit (PRAGMA data_version sur une connexion
+# gardée ouverte, puis MAX(id) des mesures / sessions) : logger arrêté ou bracelet déconnecté = rien
+# n'est relu. `version` n'avance que sur un vrai changement ; les onglets attendent dessus (wait_for_change).
+
+DEFAULT_INTERVAL = 1.0
+CONTEXT_INTERVAL = 30.0   # VFC 7 jours / sommeil 24h : bougent lentement, requêtes coûteuses
+IDLE_TIMEOUT = 10.0       # Vue live abandonnée (onglet fermé ou autre session) après N s sans lecture
+
+LIVE_REFRESH_SECONDS = metrics.histogram("whoop_live_snapshot_refresh_seconds", "Durée d'un rafraîchissement de l'instantané live")
+LIVE_REFRESH_SKIPPED = metrics.counter("whoop_live_snapshot_skipped_total", "Rafraîchissements évités (base inchangée)")
+LIVE_VIEWS = metrics.gauge("whoop_live_snapshot_views", "Vues live tenues à jour par l'instantané")
+
+
+class LiveSnapshot:
+    def __init__(self, db, interval: float = DEFAULT_INTERVAL):
+        self.db = db
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._compute_lock = threading.Lock()  # Un seul calcul à la fois (thread de fond ou premier lecteur)
+        self._thread = None
+        self._last_read = 0.0
+        self._sessions = None
+        self._context = None
+        self._context_at = 0.0
+        self._views: Dict[Tuple[int, int], dict] = {}      # (session_id, max_hr) -> vue
+        self._watched: Dict[Tuple[int, int], float] = {}   # (session_id, max_hr) -> dernière lecture
+        self._changed = threading.Condition(self._lock)
+        self.version = 0                # Incrémentée à chaque changement réel de la base
+        self._conn = None               # Connexion dédiée au signal de changement
+        self._data_version = None
+        self._signature = None
+
+    # --- LECTURE (reruns Streamlit) ---
+
+    def sessions(self) -> List[Tuple]:
+        """db.get_all_sessions() rafraîchi au plus une fois par intervalle"""
+        self._touch()
+        if self._sessions is None:
+            with self._compute_lock:  # Premier rerun : les autres onglets attendent ce calcul
+                if self._sessions is None:
+                    self._refresh_sessions()
+        return self._sessions
+
+    def context(self) -> dict:
+        """Indicateurs globaux : {'avg_hrv_7d', 'sleep_24h'}"""
+        self._touch()
+        if self._context is None:
+            with self._compute_lock:
+                if self._context is None:
+                    self._refresh_context()
+        return self._context
+
+    def view(self, session_id: int, max_hr: int) -> Optional[dict]:
+        """Dernière vue calculée de la session live (calculée ici seulement au tout premier lecteur)"""
+        key = (session_id, max_hr)
+        with self._lock:
+            self._watched[key] = time.monotonic()
+            view = self._views.get(key)
+        self._touch()
+        if view is None and key not in self._views:
+            with self._compute_lock:
+                if key not in self._views:  # Un autre onglet l'a peut-être calculée pendant l'attente
+                    self._store(key, compute_session_view(self.db, session_id, max_hr))
+            view = self._views.get(key)
+        return view
+
+    def wait_for_change(self, since_version: int, timeout: float) -> bool:
+        """Bloque jusqu'à ce que version != since_version (True) ou jusqu'au timeout (False)"""
+        self._touch()
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while self.version == since_version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    # --- RAFRAÎCHISSEMENT (thread de fond) ---
+
+    def has_changed(self) -> bool:
+        """
+        Signal bon marché : data_version ne bouge que si une autre connexion a commité, et la signature
+        (dernier id de mesure, de session, nombre de sessions closes) écarte les écritures sans effet
+        sur l'affichage (export des métriques, résumés, traces GPS...).
+        """
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db.db_path, check_same_thread=False)
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return False
+        self._data_version = data_version
+        signature = self._conn.execute(
+            "SELECT (SELECT MAX(id) FROM measurements), (SELECT MAX(id) FROM sessions), "
+            "(SELECT COUNT(end_time) FROM sessions)"
+        ).fetchone()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        return True
+
+    def _store(self, key, view):
+        with self._lock:
+            self._views[key] = view
+
+    def _refresh_sessions(self):
+        sessions = self.db.get_all_sessions()
+        self._sessions = sessions
+        return sessions
+
+    def _refresh_context(self):
+        self._context = {
+            "avg_hrv_7d": self.db.get_avg_rmssd_7_days(),
+            "sleep_24h": self.db.get_sleep_duration_last_24h(),
+        }
+        self._context_at = time.monotonic()
+
+    def refresh(self):
+        """
+        Un tour de mise à jour : rien si la base n'a pas changé ; sinon sessions, contexte si périmé,
+        puis chaque vue live encore regardée (ou nouvellement demandée). Retourne True si quelque chose a changé.
+        """
+        now = time.monotonic()
+        with self._compute_lock:
+            changed = self.has_changed()
+            with self._lock:
+                for key, seen in list(self._watched.items()):
+                    if now - seen > IDLE_TIMEOUT:
+                        del self._watched[key]
+                        self._views.pop(key, None)
+                missing = [k for k in self._watched if k not in self._views]
+            if not changed and not missing:
+                LIVE_REFRESH_SKIPPED.inc()
+                return False
+
+            live = {s[0] for s in self._refresh_sessions() if s[2] is None}
+            if now - self._context_at > CONTEXT_INTERVAL:
+                self._refresh_context()
+            with self._lock:
+                for key in list(self._watched):
+                    # Session close entre-temps : le cache des sessions closes prend le relais
+                    if key[0] not in live:
+                        del self._watched[key]
+                        self._views.pop(key, None)
+                keys = list(self._watched) if changed else [k for k in missing if k in self._watched]
+            for session_id, max_hr in keys:
+                try:
+                    self._store((session_id, max_hr), compute_session_view(self.db, session_id, max_hr))
+                except Exception as e:
+                    print(f"⚠️ Instantané live session {session_id} : {e}")
+            LIVE_VIEWS.set(len(self._watched))
+            with self._changed:
+                self.version += 1
+                self._changed.notify_all()
+        return True
+
+    def _run(self):
+        while True:
+            t0 = time.monotonic()
+            with self._lock:
+                if t0 - self._last_read > IDLE_TIMEOUT:
+                    # Plus aucun onglet ouvert : on s'arrête (redémarré par la prochaine lecture)
+                    self._thread = None
+                    if self._conn is not None:
+                        self._conn.close()
+                        self._conn = self._data_version = self._signature = None
+                    return
+            try:
+                with LIVE_REFRESH_SECONDS.time():
+                    self.refresh()
+            except Exception as e:
+                print(f"⚠️ Instantané live : {e}")
+            time.sleep(max(0.0, self.interval - (time.monotonic() - t0)))
+
+    def _touch(self):
+        with self._lock:
+            self._last_read = time.monotonic()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="whoop-live-snapshot", daemon=True)
+                self._thread.start()
+
+
+_SNAPSHOTS = {}
+_SNAPSHOTS_LOCK = threading.Lock()
+
+
+def get_live_snapshot(db, interval: float = DEFAULT_INTERVAL) -> LiveSnapshot:
+    """Instantané du process pour cette base (survit aux reruns, partagé par tous les onglets)"""
+    with _SNAPSHOTS_LOCK:
+        snapshot = _SNAPSHOTS.get(db.db_path)
+        if snapshot is None:
+            snapshot = _SNAPSHOTS[db.db_path] = LiveSnapshot(db, interval)
+        snapshot.interval = interval
+        return snapshot
@@ -0,0 +1,258 @@
+import time
+import bisect
+import datetime
+import threading
+import functools
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Instrumentation légère (compteurs, jauges, histogrammes) exportée au format texte Prometheus.
+# Chaque process (logger, API, dashboard) a son propre registre en mémoire ; le logger recopie
+# périodiquement le sien dans la table SQLite `metrics`, que l'API réexpose sur /metrics.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+# (famille, type, aide, nom de l'échantillon, labels, valeur)
+Sample = Tuple[str, str, str, str, Dict[str, str], float]
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(l, "")) for l in self.labelnames)
+
+    def _labels(self, key: tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, self.kind, self.help, self.name, self._labels(k), v) for k, v in items]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)  # Bucket "le" : valeur <= borne
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Context manager : with HIST.time(method='x'): ..."""
+        return _Timer(self, labels)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = [(k, (list(s[0]), s[1], s[2])) for k, s in self._values.items()]
+        out = []
+        for key, (counts, total, count) in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                out.append((self.name, self.kind, self.help, self.name + "_bucket", dict(labels, le=le), cumulative))
+            out.append((self.name, self.kind, self.help, self.name + "_sum", labels, total))
+            out.append((self.name, self.kind, self.help, self.name + "_count", labels, count))
+        return out
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.t0, **self.labels)
+
+
+# --- REGISTRE ---
+# Création idempotente : Streamlit réexécute les modules, on ne veut pas de doublons
+_REGISTRY: Dict[str, _Metric] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _register(cls, name: str, help: str, labelnames: Sequence[str] = (), **kwargs):
+    with _REGISTRY_LOCK:
+        metric = _REGISTRY.get(name)
+        if metric is None:
+            metric = _REGISTRY[name] = cls(name, help, labelnames, **kwargs)
+        return metric
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    return _register(Counter, name, help, labelnames)
+
+
+def gauge(name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return _register(Gauge, name, help, labelnames)
+
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram, name, help, labelnames, buckets=buckets)
+
+
+def timed(hist: Histogram):
+    """Décorateur : durée de la fonction dans `hist`, label method = nom de la fonction"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - t0, method=func.__name__)
+        return wrapper
+    return decorator
+
+
+def collect(process: Optional[str] = None) -> List[Sample]:
+    """Tous les échantillons du registre local (label process ajouté si fourni)"""
+    with _REGISTRY_LOCK:
+        metrics = list(_REGISTRY.values())
+    samples = []
+    for m in metrics:
+        for family, kind, help, name, labels, value in m.samples():
+            if process:
+                labels = dict(labels, process=process)
+            samples.append((family, kind, help, name, labels, value))
+    return samples
+
+
+# --- FORMAT PROMETHEUS ---
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def render_prometheus(samples: Iterable[Sample]) -> str:
+    """Texte d'exposition Prometheus 0.0.4 (une seule ligne HELP/TYPE par famille)"""
+    families = {}
+    for family, kind, help, name, labels, value in samples:
+        families.setdefault(family, (kind, help, []))[2].append((name, labels, value))
+    lines = []
+    for family in sorted(families):
+        kind, help, rows = families[family]
+        lines.append(f"# HELP {family} {_escape(help)}")
+        lines.append(f"# TYPE {family} {kind}")
+        for name, labels, value in rows:
+            label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_str}}} {_format_value(value)}" if label_str else f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- EXPORT SQLITE (table metrics, cf. DatabaseManager.init_db) ---
+
+def export_to_sqlite(db, process: str) -> int:
+    """Remplace le dernier instantané de `process` dans la table metrics"""
+    EXPORT_TIMESTAMP.set(time.time())
+    samples = collect()
+    now = datetime.datetime.now()
+    rows = [(process, name, _label_key(labels), value, family, kind, help, now)
+            for family, kind, help, name, labels, value in samples]
+    conn = db.get_connection()
+    try:
+        conn.execute("DELETE FROM metrics WHERE process = ?", (process,))
+        conn.executemany(
+            "INSERT INTO metrics (process, name, labels, value, family, kind, help, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def read_sqlite_samples(db, exclude_process: Optional[str] = None) -> List[Sample]:
+    """Échantillons exportés par les autres process (label process ajouté)"""
+    conn = db.get_connection()
+    try:
+        rows = conn.execute(
+            "SELECT process, name, labels, value, family, kind, help FROM metrics WHERE process != ? ORDER BY rowid",
+            (exclude_process or "",)
+        ).fetchall()
+    finally:
+        conn.close()
+    samples = []
+    for process, name, labels, value, family, kind, help in rows:
+        parsed = dict(kv.split("=", 1) for kv in labels.split("\x1f")) if labels else {}
+        parsed["process"] = process
+        samples.append((family, kind, help, name, parsed, value))
+    return samples
+
+
+def _label_key(labels: Dict[str, str]) -> str:
+    # Séparateur ASCII "unit separator" : ne peut pas apparaître dans nos valeurs de labels
+    return "\x1f".join(f"{k}={v}" for k, v in labels.items())
+
+
+# --- MÉTRIQUES PARTAGÉES ---
+# Ingestion (logger)
+BEATS_RECEIVED = counter("whoop_beats_received_total", "Notifications Heart Rate reçues", ["device"])
+BEATS_WRITTEN = counter("whoop_beats_written_total", "Mesures commitées en base")
+BEATS_DROPPED = counter("whoop_beats_dropped_total", "Paquets/mesures perdus", ["reason"])
+WRITE_BATCH_SIZE = histogram("whoop_write_batch_size", "Lignes par commit", buckets=SIZE_BUCKETS)
+COMMIT_SECONDS = histogram("whoop_db_commit_seconds", "Durée executemany + commit (disque lent = valeurs hautes)")
+NOTIFY_TO_COMMIT = histogram("whoop_notify_to_commit_seconds", "Latence notification BLE -> ligne commitée")
+QUEUE_DEPTH = gauge("whoop_write_queue_depth", "Mesures en attente d'écriture")
+DEVICES_CONNECTED = gauge("whoop_devices_connected", "Bracelets connectés")
+RECONNECTS = counter("whoop_reconnects_total", "Reconnexions BLE", ["device"])
+TIME_TO_FIRST_BEAT = histogram("whoop_time_to_first_beat_seconds", "Démarrage ou coupure -> premier battement",
+                               buckets=(0.5, 1, 2, 3, 5, 10, 20, 30, 60, 120))
+EXPORT_TIMESTAMP = gauge("whoop_metrics_export_timestamp_seconds", "Dernier export des métriques (epoch)")
+# Requêtes
+DB_QUERY_SECONDS = histogram("whoop_db_query_seconds", "Durée des méthodes DatabaseManager", ["method"])
+API_REQUEST_SECONDS = histogram("whoop_api_request_seconds", "Latence des requêtes HTTP", ["method", "path", "status"])
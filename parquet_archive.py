@@ -0,0 +1,194 @@
+import os
+import datetime
+import yaml
+from typing import Optional, List
+from database_manager import DatabaseManager, get_db
+
+HAS_PARQUET = False
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+    HAS_PARQUET = True
+except ImportError:
+    pa = None
+
+# Chargement de la config
+try:
+    with open("config.yaml", "r") as f:
+        CONFIG = yaml.safe_load(f) or {}
+except Exception:
+    CONFIG = {}
+
+ARCHIVE_DIR = CONFIG.get('archive', {}).get('path', 'archive')
+
+# Colonnes typées de l'archive (la date est portée par le dossier : archive/date=YYYY-MM-DD/)
+if HAS_PARQUET:
+    SCHEMA = pa.schema([
+        ('session_id', pa.int32()),
+        ('timestamp', pa.timestamp('us')),
+        ('bpm', pa.int16()),
+        ('rr_intervals', pa.list_(pa.int16())),
+        ('battery', pa.int8()),
+        ('steps', pa.int32()),
+    ])
+    PARTITIONING = ds.partitioning(pa.schema([('date', pa.string())]), flavor='hive')
+
+
+def session_file(session_id: int, day: datetime.date, archive_dir: str = ARCHIVE_DIR) -> str:
+    return os.path.join(archive_dir, f"date={day.isoformat()}", f"session_{session_id}.parquet")
+
+
+def parse_rr_list(rr_str) -> List[int]:
+    if not rr_str: return []
+    return [int(x) for x in str(rr_str).split(';') if x.strip()]
+
+
+def export_session(session_id: int, db: Optional[DatabaseManager] = None,
+                   archive_dir: str = ARCHIVE_DIR) -> Optional[str]:
+    """
+    Exporte une session terminée en Parquet (un fichier par session, partitionné par jour).
+    Lecture via une connexion SQLite en lecture seule : aucun verrou d'écriture sur la base live.
+    """
+    if not HAS_PARQUET:
+        print("⚠️ Module pyarrow introuvable. Archive Parquet désactivée.")
+        return None
+
+    db = db or get_db()
+    conn = db.get_readonly_connection()
+    try:
+        start = conn.execute("SELECT start_time FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        rows = conn.execute(
+            "SELECT timestamp, bpm, rr_intervals, battery, steps FROM measurements_timeline "
+            "WHERE session_id = ? ORDER BY timestamp ASC",
+            (session_id,)
+        ).fetchall()
+    finally:
+        conn.close()
+    if not start or not rows:
+        return None
+
+    timestamps, bpm, rr, battery, steps = zip(*rows)
+    table = pa.table({
+        'session_id': pa.array([session_id] * len(rows), pa.int32()),
+        'timestamp': pa.array([datetime.datetime.fromisoformat(str(t)) for t in timestamps], pa.timestamp('us')),
+        'bpm': pa.array(bpm, pa.int16()),
+        'rr_intervals': pa.array([parse_rr_list(r) for r in rr], pa.list_(pa.int16())),
+        'battery': pa.array(battery, pa.int8()),
+        'steps': pa.array([s or 0 for s in steps], pa.int32()),
+    }, schema=SCHEMA)
+
+    day = datetime.datetime.fromisoformat(str(start[0])).date()
+    path = session_file(session_id, day, archive_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Écriture atomique : un lecteur ne voit jamais un fichier à moitié écrit.
+    # Préfixe "_" : ignoré par ds.dataset (ignore_prefixes), même laissé par un crash en cours d'export
+    tmp_path = os.path.join(os.path.dirname(path), f"_session_{session_id}.parquet.tmp")
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+    return path
+
+
+def archive_finished_sessions(db: Optional[DatabaseManager] = None, archive_dir: str = ARCHIVE_DIR) -> int:
+    """Exporte toutes les sessions terminées qui n'ont pas encore leur fichier Parquet"""
+    db = db or get_db()
+    conn = db.get_readonly_connection()
+    try:
+        sessions = conn.execute("SELECT id, start_time FROM sessions WHERE end_time IS NOT NULL").fetchall()
+    finally:
+        conn.close()
+
+    exported = 0
+    for sid, start in sessions:
+        day = datetime.datetime.fromisoformat(str(start)).date()
+        if not os.path.exists(session_file(sid, day, archive_dir)):
+            if export_session(sid, db, archive_dir):
+                exported += 1
+    return exported
+
+
+def read_archive(start: Optional[datetime.date] = None, end: Optional[datetime.date] = None,
+                 columns: Optional[List[str]] = None, session_ids: Optional[List[int]] = None,
+                 archive_dir: str = ARCHIVE_DIR):
+    """
+    Lit l'archive en DataFrame pandas.
+    - start/end (inclus) élaguent les dossiers date=... sans les ouvrir
+    - columns : seules ces colonnes sont décodées (ex: ['timestamp', 'bpm'])
+    - lecture memory-mapped (pas de copie du fichier en RAM)
+    """
+    if not HAS_PARQUET:
+        raise RuntimeError("pyarrow est requis pour lire l'archive Parquet")
+
+    dataset = ds.dataset(archive_dir, format='parquet', partitioning=PARTITIONING,
+                         filesystem=pafs.LocalFileSystem(use_mmap=True))
+    flt = None
+    if start:
+        flt = ds.field('date') >= start.isoformat()
+    if end:
+        cond = ds.field('date') <= end.isoformat()
+        flt = cond if flt is None else flt & cond
+    if session_ids:
+        cond = ds.field('session_id').isin(session_ids)
+        flt = cond if flt is None else flt & cond
+
+    return dataset.to_table(columns=columns, filter=flt).to_pandas()
+
+
+def find_session_file(session_id: int, archive_dir: str = ARCHIVE_DIR,
+                      day: Optional[datetime.date] = None) -> Optional[str]:
+    """
+    Fichier Parquet d'une session archivée, None si absent.
+    Jour connu (start_time de la session) : un seul stat ; sinon un stat par dossier date=..., sans ouvrir aucun fichier.
+    """
+    if day is not None:
+        path = session_file(session_id, day, archive_dir)
+        return path if os.path.exists(path) else None
+    if not os.path.isdir(archive_dir):
+        return None
+    name = f"session_{session_id}.parquet"
+    for entry in os.scandir(archive_dir):
+        if entry.is_dir() and entry.name.startswith("date="):
+            path = os.path.join(entry.path, name)
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def archived_sessions(archive_dir: str = ARCHIVE_DIR) -> List[int]:
+    """Identifiants des sessions présentes dans l'archive (fichiers temporaires d'export ignorés)"""
+    ids = set()
+    if not os.path.isdir(archive_dir):
+        return []
+    for entry in os.scandir(archive_dir):
+        if not (entry.is_dir() and entry.name.startswith("date=")):
+            continue
+        for f in os.scandir(entry.path):
+            name = f.name
+            if name.startswith("session_") and name.endswith(".parquet"):
+                ids.add(int(name[len("session_"):-len(".parquet")]))
+    return sorted(ids)
+
+
+def read_session(session_id: int, columns: Optional[List[str]] = None, archive_dir: str = ARCHIVE_DIR,
+                 day: Optional[datetime.date] = None):
+    """
+    DataFrame d'une session archivée, trié par timestamp, ou None si elle n'est pas (encore) dans l'archive.
+    Lecture du seul fichier de la session (memory-mapped) : coût indépendant de la taille de l'archive.
+    """
+    if not HAS_PARQUET:
+        return None
+    path = find_session_file(session_id, archive_dir, day)
+    if path is None:
+        return None
+    df = pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+    if df.empty:
+        return None
+    if 'timestamp' in df.columns:
+        df = df.sort_values('timestamp', kind='stable', ignore_index=True)
+    return df
+
+
+if __name__ == "__main__":
+    n = archive_finished_sessions()
+    print(f"📦 {n} session(s) archivée(s) dans {ARCHIVE_DIR}/")
@@ -0,0 +1,145 @@
+import io
+import os
+import json
+import time
+import logging
+import datetime
+import contextvars
+from contextlib import contextmanager, nullcontext
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+
+# Profiling opt-in, piloté par variable d'environnement :
+#   WHOOP_PROFILE=1         chronos par section (rerun dashboard, requête API)
+#   WHOOP_PROFILE=cprofile  idem + cProfile de tout le run (top fonctions dans le log, .prof dans profiles/)
+#   WHOOP_PROFILE_LOG=...   fichier de log (défaut profiling.log, rotation 5 x 2 Mo)
+MODE = os.getenv("WHOOP_PROFILE", "").strip().lower()
+ENABLED = MODE not in ("", "0", "false", "off")
+USE_CPROFILE = MODE == "cprofile"
+LOG_PATH = os.getenv("WHOOP_PROFILE_LOG", "profiling.log")
+PROFILE_DIR = "profiles"
+TOP_FUNCTIONS = 25
+
+_current = contextvars.ContextVar("whoop_profile_run", default=None)
+_log = None
+
+
+def _logger() -> logging.Logger:
+    global _log
+    if _log is None:
+        _log = logging.getLogger("whoop.profiling")
+        _log.setLevel(logging.INFO)
+        _log.propagate = False
+        if not _log.handlers:
+            handler = RotatingFileHandler(LOG_PATH, maxBytes=2_000_000, backupCount=5, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _log.addHandler(handler)
+    return _log
+
+
+class ProfileRun:
+    """Un run profilé (rerun Streamlit, requête HTTP) : durées cumulées par section, dans l'ordre d'apparition"""
+    def __init__(self, name: str, cprofile: bool = USE_CPROFILE):
+        self.name = name
+        self.sections = {}
+        self.started_at = datetime.datetime.now()
+        self.t0 = time.perf_counter()
+        self.total = None
+        self.profiler = None
+        self.top = None
+        if cprofile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    @contextmanager
+    def section(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sections[name] = self.sections.get(name, 0.0) + time.perf_counter() - t0
+
+    def finish(self) -> dict:
+        """Clôt le run, l'écrit dans le log rotatif et retourne le détail"""
+        if self.total is not None:
+            return self.as_dict()
+        self.total = time.perf_counter() - self.t0
+        if self.profiler:
+            self.profiler.disable()
+            self._dump_profile()
+        record = self.as_dict()
+        try:
+            _logger().info(json.dumps(record))
+        except OSError as e:
+            print(f"⚠️ Log profiling : {e}")
+        return record
+
+    def as_dict(self) -> dict:
+        record = {
+            "run": self.name,
+            "at": self.started_at.isoformat(timespec="milliseconds"),
+            "total_ms": round((self.total or 0) * 1000, 2),
+            "sections_ms": {k: round(v * 1000, 2) for k, v in self.sections.items()},
+        }
+        covered = sum(self.sections.values())
+        if self.total:
+            record["other_ms"] = round((self.total - covered) * 1000, 2)
+        if self.top:
+            record["top"] = self.top
+        return record
+
+    def _dump_profile(self):
+        import pstats
+        out = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=out).sort_stats("cumulative")
+        stats.print_stats(TOP_FUNCTIONS)
+        self.top = out.getvalue().strip().splitlines()[-TOP_FUNCTIONS:]
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        safe = "".join(c if c.isalnum() else "_" for c in self.name)
+        stats.dump_stats(os.path.join(PROFILE_DIR, f"{safe}_{self.started_at:%Y%m%d_%H%M%S_%f}.prof"))
+
+
+def start_run(name: str) -> Optional[ProfileRun]:
+    """Démarre un run et le rend courant (pour profiling.section). None si le profiling est désactivé."""
+    if not ENABLED:
+        return None
+    run = ProfileRun(name)
+    _current.set(run)
+    return run
+
+
+def finish_run(run: Optional[ProfileRun]) -> Optional[dict]:
+    if run is None:
+        return None
+    if _current.get() is run:
+        _current.set(None)
+    return run.finish()
+
+
+@contextmanager
+def nested_run(name: str):
+    """
+    Run distinct à l'intérieur d'un autre (fragment Streamlit réexécuté seul) : écrit dans le log
+    sous son propre nom, compté comme section du run englobant s'il y en a un, qui redevient courant ensuite.
+    Utilisable en décorateur : @profiling.nested_run("dashboard.kpi")
+    """
+    if not ENABLED:
+        yield None
+        return
+    parent = _current.get()
+    # Un seul cProfile actif à la fois : celui du run englobant couvre déjà ce code
+    run = ProfileRun(name, cprofile=USE_CPROFILE and parent is None)
+    token = _current.set(run)
+    try:
+        with parent.section(name) if parent is not None else nullcontext():
+            yield run
+    finally:
+        _current.reset(token)
+        run.finish()
+
+
+def section(name: str):
+    """with profiling.section('sql_load'): ... — sans effet hors d'un run profilé"""
+    run = _current.get()
+    return run.section(name) if run is not None else nullcontext()
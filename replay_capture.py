@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+from ble_capture import read_capture
+from database_manager import DatabaseManager
+from whoop_logger_v4 import WhoopLoggerV4, HEART_RATE_UUID, BATTERY_LEVEL_UUID
+
+
+async def replay(path: str, logger: WhoopLoggerV4, speed: float = 1.0) -> int:
+    """
+    Rejoue une capture dans les handlers du logger, comme si Bleak les appelait.
+    speed : 1 = temps réel, N = N fois plus vite, 0 = aussi vite que possible.
+    """
+    handlers = {
+        HEART_RATE_UUID: logger.hr_handler,
+        BATTERY_LEVEL_UUID: logger.battery_handler,
+    }
+    t0_capture = None
+    t0_wall = time.monotonic()
+    count = 0
+
+    for ts, char_uuid, payload in read_capture(path):
+        if speed:
+            if t0_capture is None:
+                t0_capture = ts
+            delay = (ts - t0_capture) / speed - (time.monotonic() - t0_wall)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif count % 1000 == 0:
+            await asyncio.sleep(0)  # Laisse tourner les autres tâches de la boucle
+
+        handler = handlers.get(char_uuid)
+        if handler:
+            handler(char_uuid, bytearray(payload))
+            count += 1
+    return count
+
+
+async def main(args):
+    db = DatabaseManager(args.db)
+    # Archive Parquet propre au replay : les ids repartent de 1 et écraseraient les vraies sessions
+    archive_dir = args.archive or os.path.splitext(args.db)[0] + "_archive"
+    logger = WhoopLoggerV4(db=db, archive_dir=archive_dir)
+    logger.start()
+    speed = 0 if args.speed == 'max' else float(args.speed)
+    print(f"⏯️  Replay de {args.capture} (vitesse: {args.speed}) -> {args.db} (archive: {archive_dir}/)")
+    t0 = time.perf_counter()
+    try:
+        count = await replay(args.capture, logger, speed)
+    finally:
+        logger.stop()
+    elapsed = time.perf_counter() - t0
+    print(f"✅ {count} notifications rejouées en {elapsed:.2f}s ({count / elapsed if elapsed else 0:,.0f}/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rejoue une capture BLE dans WhoopLoggerV4 (sans Bluetooth)")
+    parser.add_argument("capture", help="Fichier .bin produit par ble_capture")
+    parser.add_argument("--speed", default="1", help="1 (temps réel), N (accéléré) ou max")
+    parser.add_argument("--db", default="replay.db", help="Base SQLite cible (défaut: replay.db)")
+    parser.add_argument("--archive", help="Dossier de l'archive Parquet (défaut: <base>_archive)")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -2,6 +2,15 @@
 from fpdf import FPDF
 import pandas as pd
 import datetime
+import hashlib
+import json
+import os
+
+# Images des graphiques, une série par session et par contenu (empreinte)
+CHART_CACHE_DIR = os.path.join("report_cache", "charts")
+# À incrémenter si la mise en page ou les graphiques du PDF changent (rapports et images à régénérer)
+REPORT_VERSION = 2
+_PURGED_DIRS = set()
 
 class WhoopReport(FPDF):
     def header(self):
@@ -14,36 +23,208 @@ class WhoopReport(FPDF):
         self.set_font('Arial', 'I', 8)
         self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
 
+def load_archived_frame(session_id, columns=('timestamp', 'bpm', 'steps')):
+    """Mesures pleine résolution d'une session depuis l'archive Parquet (triées), None si non archivée"""
+    from parquet_archive import read_session
+    return read_session(session_id, columns=list(columns))
+
+def report_summary(session_id, db=None):
+    """
+    Résumé pour le rapport : cache SQLite (session_summary) tant que la base a des mesures pour la session,
+    sinon recalculé depuis l'archive Parquet (session purgée de SQLite, base restaurée sans ses mesures).
+    """
+    from session_summary import get_session_summary
+    summary = get_session_summary(session_id, db)
+    if summary is None:
+        df = load_archived_frame(session_id)
+        if df is not None:
+            summary = summary_from_frame(session_id, df)
+    return summary
+
+def summary_from_frame(session_id, df: pd.DataFrame):
+    """Résumé (format session_summary) à partir d'un DataFrame déjà chargé"""
+    from session_summary import MAX_HR, ZONE_LABELS, ZONE_BOUNDS
+    import numpy as np
+
+    start, end = df['timestamp'].iloc[0], df['timestamp'].iloc[-1]
+    duration_s = (end - start).total_seconds()
+    zones = np.digitize(df['bpm'].to_numpy(dtype=float), np.array(ZONE_BOUNDS) * MAX_HR)
+    beats = np.bincount(zones, minlength=len(ZONE_LABELS))
+    sec_per_beat = duration_s / len(df) if len(df) else 0
+    steps = df['steps'].fillna(0) if 'steps' in df.columns else pd.Series(0, index=df.index)
+
+    per_minute = df.assign(steps=steps).groupby(df['timestamp'].dt.floor('min'))
+    agg = per_minute.agg(bpm_avg=('bpm', 'mean'), bpm_min=('bpm', 'min'), bpm_max=('bpm', 'max'), steps=('steps', 'sum'))
+    return {
+        "session_id": session_id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "duration_s": duration_s,
+        "max_bpm": int(df['bpm'].max()),
+        "avg_bpm": float(df['bpm'].mean()),
+        "total_steps": int(steps.sum()) if 'steps' in df.columns else None,
+        "n_beats": len(df),
+        "max_hr": MAX_HR,
+        "zone_seconds": {label: float(b) * sec_per_beat for label, b in zip(ZONE_LABELS, beats)},
+        "series": {
+            "minute": [t.isoformat(sep=' ') for t in agg.index],
+            "bpm_avg": agg['bpm_avg'].round(1).tolist(),
+            "bpm_min": agg['bpm_min'].tolist(),
+            "bpm_max": agg['bpm_max'].tolist(),
+            "steps": agg['steps'].tolist(),
+        },
+    }
+
+def chart_key(summary: dict) -> str:
+    """Clé de cache des images : empreinte SQL si dispo, sinon hash du résumé"""
+    if summary.get('fingerprint'):
+        return summary['fingerprint'][:16]
+    return hashlib.sha1(json.dumps(summary, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def purge_stale_charts(cache_dir: str = CHART_CACHE_DIR) -> int:
+    """Supprime les images d'une autre version du rendu (une fois par process et par dossier)"""
+    if cache_dir in _PURGED_DIRS or not os.path.isdir(cache_dir):
+        return 0
+    _PURGED_DIRS.add(cache_dir)
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if name.endswith(".png") and f"_r{REPORT_VERSION}_" not in name:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+                removed += 1
+            except FileNotFoundError:
+                pass  # Déjà supprimée par un autre worker
+    return removed
+
+def purge_session_charts(session_id, keep_prefix: str, cache_dir: str = CHART_CACHE_DIR) -> int:
+    """Supprime les images d'une session rendues pour un contenu précédent (autre empreinte, même version)"""
+    session_prefix = f"session_{session_id}_r{REPORT_VERSION}_"
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if name.startswith(session_prefix) and not name.startswith(keep_prefix + "_"):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+                removed += 1
+            except FileNotFoundError:
+                pass  # Déjà supprimée par un autre worker
+    return removed
+
+def render_charts(summary: dict, cache_dir: str = CHART_CACHE_DIR) -> dict:
+    """
+    Dessine (ou récupère du cache) les graphiques du rapport à partir du résumé agrégé :
+    courbe FC à la minute, temps par zone et hypnogramme si la session est du sommeil.
+    Taille des séries bornée (1440 points pour 24h) -> temps de rendu borné.
+    """
+    from session_summary import ZONE_LABELS, ZONE_COLORS, ZONE_BOUNDS
+    from data_science import analyze_sleep_architecture, classify_sleep_phases
+
+    purge_stale_charts(cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    prefix = os.path.join(cache_dir, f"session_{summary['session_id']}_r{REPORT_VERSION}_{chart_key(summary)}")
+    series = summary['series']
+    bpm = series['bpm_avg']
+    is_sleep = analyze_sleep_architecture(bpm, summary.get('total_steps') or 0, sample_period_s=60) == "SOMMEIL (Détecté)"
+
+    charts = {'hr': f"{prefix}_hr.png", 'zones': f"{prefix}_zones.png"}
+    if is_sleep:
+        charts['hypnogram'] = f"{prefix}_hypno.png"
+    if all(os.path.exists(p) for p in charts.values()):
+        return charts
+    purge_session_charts(summary['session_id'], os.path.basename(prefix), cache_dir)
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+
+    minutes = pd.to_datetime(series['minute'])
+    max_hr = summary.get('max_hr', 190)
+
+    # 1. Courbe cardiaque (moyenne minute + enveloppe min/max)
+    fig, ax = plt.subplots(figsize=(7.5, 2.8), dpi=120)
+    ax.fill_between(minutes, series['bpm_min'], series['bpm_max'], color='#ff3b30', alpha=0.15, linewidth=0)
+    ax.plot(minutes, bpm, color='#ff3b30', linewidth=1.2)
+    for low, high, color in zip(ZONE_BOUNDS, ZONE_BOUNDS[1:] + [1.01], ZONE_COLORS[1:]):
+        ax.axhspan(low * max_hr, high * max_hr, color=color, alpha=0.08)
+    ax.set_ylabel('BPM')
+    ax.set_title('Fréquence Cardiaque (moyenne par minute)', fontsize=10)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(charts['hr'])
+    plt.close(fig)
+
+    # 2. Temps par zone
+    zone_minutes = [summary['zone_seconds'].get(z, 0) / 60 for z in ZONE_LABELS[1:]]
+    fig, ax = plt.subplots(figsize=(7.5, 2.4), dpi=120)
+    bars = ax.bar(ZONE_LABELS[1:], zone_minutes, color=ZONE_COLORS[1:])
+    for bar, value in zip(bars, zone_minutes):
+        ax.text(bar.get_x() + bar.get_width() / 2, bar.get_height(), f"{value:.1f}m", ha='center', va='bottom', fontsize=8)
+    ax.set_ylabel('Minutes')
+    ax.set_title("Temps passé par Zone d'Effort", fontsize=10)
+    ax.grid(axis='y', alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(charts['zones'])
+    plt.close(fig)
+
+    # 3. Hypnogramme (phases estimées sur la série à la minute)
+    if is_sleep:
+        order = ['Awake', 'REM', 'Light', 'Deep']
+        phases = classify_sleep_phases(bpm)
+        levels = [order.index(p) for p in phases]
+        fig, ax = plt.subplots(figsize=(7.5, 1.8), dpi=120)
+        ax.step(minutes[:len(levels)], levels, where='post', color='#60a5fa', linewidth=1.2)
+        ax.set_yticks(range(len(order)), order)
+        ax.invert_yaxis()
+        ax.set_title('Architecture du Sommeil (Hypnogramme)', fontsize=10)
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+        fig.tight_layout()
+        fig.savefig(charts['hypnogram'])
+        plt.close(fig)
+
+    return charts
+
 def generate_pdf_report(session_id, df: pd.DataFrame, file_name="report.pdf"):
+    return generate_pdf_report_from_summary(summary_from_frame(session_id, df), file_name)
+
+def generate_pdf_report_from_summary(summary: dict, file_name="report.pdf"):
+    """Rapport PDF à partir d'un résumé de session (cf. session_summary.get_session_summary)"""
     pdf = WhoopReport()
     pdf.add_page()
     pdf.set_font('Arial', '', 12)
     
     # 1. Infos Session
-    start_time = df['timestamp'].iloc[0].strftime("%Y-%m-%d %H:%M:%S")
-    end_time = df['timestamp'].iloc[-1].strftime("%H:%M:%S")
-    duration = str(df['timestamp'].iloc[-1] - df['timestamp'].iloc[0])
+    start = datetime.datetime.fromisoformat(summary['start'])
+    start_time = start.strftime("%Y-%m-%d %H:%M:%S")
+    duration = str(datetime.timedelta(seconds=summary['duration_s']))
     
     pdf.set_fill_color(240, 240, 240)
-    pdf.cell(0, 10, f"Session #{session_id} - {start_time}", 0, 1, 'L', 1)
+    pdf.cell(0, 10, f"Session #{summary['session_id']} - {start_time}", 0, 1, 'L', 1)
     pdf.ln(5)
     
     pdf.cell(0, 8, f"Durée: {duration}", 0, 1)
-    pdf.cell(0, 8, f"Max BPM: {df['bpm'].max()}", 0, 1)
-    pdf.cell(0, 8, f"Moyenne BPM: {int(df['bpm'].mean())}", 0, 1)
+    pdf.cell(0, 8, f"Max BPM: {summary['max_bpm']}", 0, 1)
+    pdf.cell(0, 8, f"Moyenne BPM: {int(summary['avg_bpm'])}", 0, 1)
     
-    if 'steps' in df.columns:
-        pdf.cell(0, 8, f"Pas Totaux: {int(df['steps'].sum())}", 0, 1)
+    if summary.get('total_steps') is not None:
+        pdf.cell(0, 8, f"Pas Totaux: {int(summary['total_steps'])}", 0, 1)
 
     pdf.ln(10)
     
-    # 2. Analyse Zones (Simulation simple)
-    # (Un vrai chart serait mieux, on fera texte pour l'instant)
+    # 2. Graphiques (rendus depuis les agrégats, en cache par session)
+    charts = render_charts(summary)
+    pdf.image(charts['hr'], w=190)
+    pdf.ln(2)
+
     pdf.set_font('Arial', 'B', 12)
     pdf.cell(0, 10, "Résumé des Zones d'Effort", 0, 1)
     pdf.set_font('Arial', '', 11)
-    
-    # On pourrait réutiliser la logique des zones ici
+    pdf.image(charts['zones'], w=190)
+    pdf.ln(2)
+
+    if 'hypnogram' in charts:
+        pdf.image(charts['hypnogram'], w=190)
+        pdf.ln(2)
     
     pdf.multi_cell(0, 8, "Ce rapport certifie l'activité physique enregistrée par le système Whoop Clone V4.")
     
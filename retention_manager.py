@@ -0,0 +1,133 @@
+import datetime
+import yaml
+from typing import Optional
+from database_manager import DatabaseManager, get_db
+
+# Chargement de la config
+try:
+    with open("config.yaml", "r") as f:
+        CONFIG = yaml.safe_load(f) or {}
+except Exception:
+    CONFIG = {}
+
+# Nombre de jours pendant lesquels on garde un point par battement
+RAW_RETENTION_DAYS = CONFIG.get('retention', {}).get('raw_days', 30)
+# retention.require_sync (explicite, à activer avec sync_manager) : le brut pas encore répliqué
+# (sync_state) n'est jamais purgé, même hors ligne plus longtemps que la fenêtre brute
+REQUIRE_SYNC = bool(CONFIG.get('retention', {}).get('require_sync', False))
+
+
+def rmssd_from_rr_concat(rr_concat: Optional[str]) -> Optional[float]:
+    """RMSSD d'une minute à partir des RR concaténés "800;810;..." (filtre anti-bruit du dashboard)"""
+    if not rr_concat:
+        return None
+    rr = []
+    for x in rr_concat.split(';'):
+        x = x.strip()
+        if x:
+            v = int(x)
+            if 250 < v < 1500: rr.append(v)
+    if len(rr) < 2:
+        return None
+    diffs = [rr[i + 1] - rr[i] for i in range(len(rr) - 1)]
+    return round((sum(d * d for d in diffs) / len(diffs)) ** 0.5, 2)
+
+
+def rollup_cutoff(raw_days: int = RAW_RETENTION_DAYS, now: Optional[datetime.datetime] = None) -> datetime.datetime:
+    """Limite brut/rollup, alignée sur la minute pour ne jamais couper une minute en deux"""
+    now = now or datetime.datetime.now()
+    return (now - datetime.timedelta(days=raw_days)).replace(second=0, microsecond=0)
+
+
+def rollup_session(conn, session_id: int, cutoff: datetime.datetime, synced_up_to: Optional[int] = None) -> int:
+    """
+    Agrège en minutes les mesures d'une session antérieures au cutoff puis purge le brut.
+    synced_up_to : id de la dernière mesure répliquée, rien au-delà n'est touché (None = pas de synchro).
+    Doit être appelée dans une transaction. Retourne le nombre de lignes brutes supprimées.
+    """
+    max_id = synced_up_to if synced_up_to is not None else -1
+    rows = conn.execute('''
+        SELECT strftime('%Y-%m-%d %H:%M:00', timestamp) AS minute,
+               MIN(bpm), AVG(bpm), MAX(bpm),
+               GROUP_CONCAT(rr_intervals, ';'),
+               SUM(COALESCE(steps, 0)),
+               MIN(battery),
+               COUNT(*)
+        FROM (
+            SELECT timestamp, bpm, rr_intervals, steps, battery FROM measurements
+            WHERE session_id = ? AND timestamp < ? AND (? < 0 OR id <= ?)
+            ORDER BY timestamp ASC
+        )
+        GROUP BY minute
+    ''', (session_id, cutoff, max_id, max_id)).fetchall()
+    if not rows:
+        return 0
+
+    # Si une minute a déjà été agrégée (rétention interrompue), on fusionne les compteurs
+    conn.executemany('''
+        INSERT INTO measurements_rollup
+            (session_id, minute, bpm_min, bpm_avg, bpm_max, rmssd, steps, battery, n_beats)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(session_id, minute) DO UPDATE SET
+            bpm_min = MIN(bpm_min, excluded.bpm_min),
+            bpm_avg = (bpm_avg * n_beats + excluded.bpm_avg * excluded.n_beats) / (n_beats + excluded.n_beats),
+            bpm_max = MAX(bpm_max, excluded.bpm_max),
+            rmssd = COALESCE(excluded.rmssd, rmssd),
+            steps = steps + excluded.steps,
+            battery = MIN(battery, excluded.battery),
+            n_beats = n_beats + excluded.n_beats
+    ''', [
+        (session_id, minute, bpm_min, bpm_avg, bpm_max, rmssd_from_rr_concat(rr), steps, battery, n)
+        for minute, bpm_min, bpm_avg, bpm_max, rr, steps, battery, n in rows
+    ])
+
+    cur = conn.execute(
+        'DELETE FROM measurements WHERE session_id = ? AND timestamp < ? AND (? < 0 OR id <= ?)',
+        (session_id, cutoff, max_id, max_id)
+    )
+    return cur.rowcount
+
+
+def apply_retention(db: Optional[DatabaseManager] = None, raw_days: int = RAW_RETENTION_DAYS,
+                    require_sync: bool = REQUIRE_SYNC) -> int:
+    """
+    Bascule dans measurements_rollup tout ce qui dépasse la fenêtre brute.
+    require_sync : ne purge que ce que la synchro a déjà envoyé (high-water mark de sync_state).
+    Une transaction par session : un arrêt brutal laisse la base cohérente.
+    """
+    db = db or get_db()
+    cutoff = rollup_cutoff(raw_days)
+    conn = db.get_connection()
+    pruned = 0
+    try:
+        # Une session qui a commencé après le cutoff n'a rien à agréger : on passe par sessions
+        # (petite table) plutôt que de scanner measurements par date
+        sessions = conn.execute('''
+            SELECT s.id, COALESCE(st.last_measurement_id, 0) FROM sessions s
+            LEFT JOIN sync_state st ON st.session_id = s.id
+            WHERE s.start_time < ?
+              AND EXISTS (SELECT 1 FROM measurements m WHERE m.session_id = s.id AND m.timestamp < ?)
+        ''', (cutoff, cutoff)).fetchall()
+        for sid, mark in sessions:
+            with conn:
+                pruned += rollup_session(conn, sid, cutoff, mark if require_sync else None)
+        if require_sync:
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM measurements m LEFT JOIN sync_state st ON st.session_id = m.session_id "
+                "WHERE m.timestamp < ? AND m.id > COALESCE(st.last_measurement_id, 0)", (cutoff,)
+            ).fetchone()[0]
+            if pending:
+                # Du brut plus vieux que la fenêtre n'est toujours pas synchronisé : la marque n'avance plus
+                last_sync = conn.execute("SELECT MAX(synced_at) FROM sync_state").fetchone()[0]
+                print(f"⚠️  Rétention : {pending} mesures brutes de plus de {raw_days} j gardées faute de synchro "
+                      f"(dernière synchro : {last_sync or 'jamais'}). sync_manager tourne-t-il ?")
+    finally:
+        conn.close()
+
+    if pruned:
+        print(f"🗜️  Rétention : {pruned} mesures brutes (> {raw_days} j) agrégées par minute")
+    return pruned
+
+
+if __name__ == "__main__":
+    apply_retention()
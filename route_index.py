@@ -0,0 +1,168 @@
+import json
+import argparse
+import datetime
+from typing import List, Optional, Tuple
+import numpy as np
+from database_manager import DatabaseManager
+from gps_tracker import EARTH_RADIUS_M, haversine_np, track_distance
+
+# Simplification des traces GPS (Douglas-Peucker) + index spatial R*Tree.
+# Une trace de 1h à 1 Hz (3600 points) tient en quelques dizaines de sommets à 5 m de tolérance.
+# L'index porte sur des tronçons de CHUNK_POINTS sommets du tracé simplifié : une boîte par tronçon
+# plutôt qu'une par session, pour qu'une boucle autour d'un quartier ne "couvre" pas tout le quartier.
+DEFAULT_TOLERANCE_M = 5.0
+CHUNK_POINTS = 8
+
+
+def _project(lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Projection équirectangulaire locale en mètres (erreur négligeable à l'échelle d'une session)"""
+    lat0 = np.radians(np.mean(lat))
+    x = np.radians(lon) * EARTH_RADIUS_M * np.cos(lat0)
+    y = np.radians(lat) * EARTH_RADIUS_M
+    return x, y
+
+
+def douglas_peucker(lat, lon, tolerance_m: float = DEFAULT_TOLERANCE_M) -> np.ndarray:
+    """
+    Indices des points conservés (premier et dernier inclus).
+    Version itérative (pas de récursion profonde) ; l'écart de chaque tronçon est calculé d'un coup en NumPy.
+    """
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    n = len(lat)
+    if n <= 2:
+        return np.arange(n)
+    x, y = _project(lat, lon)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        dx, dy = x[b] - x[a], y[b] - y[a]
+        px, py = x[a + 1:b] - x[a], y[a + 1:b] - y[a]
+        length = np.hypot(dx, dy)
+        if length == 0:
+            dist = np.hypot(px, py)  # Boucle fermée : distance au point de départ
+        else:
+            dist = np.abs(dx * py - dy * px) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance_m:
+            mid = a + 1 + i
+            keep[mid] = True
+            stack.append((a, mid))
+            stack.append((mid, b))
+    return np.flatnonzero(keep)
+
+
+def simplify_session(db: DatabaseManager, session_id: int, tolerance_m: float = DEFAULT_TOLERANCE_M) -> Optional[dict]:
+    """Simplifie la trace d'une session et (ré)indexe ses tronçons. None si moins de 2 points."""
+    rows = db.get_gps_track(session_id)
+    if len(rows) < 2:
+        return None
+    ts, lat, lon, acc = zip(*rows)
+    epoch = [datetime.datetime.fromisoformat(str(t)).timestamp() for t in ts]
+    lat, lon = np.array(lat, dtype=float), np.array(lon, dtype=float)
+    idx = douglas_peucker(lat, lon, tolerance_m)
+    s_lat, s_lon = lat[idx], lon[idx]
+    polyline = [[round(a, 6), round(o, 6)] for a, o in zip(s_lat, s_lon)]
+
+    chunks = []
+    for start in range(0, len(idx) - 1, CHUNK_POINTS - 1):
+        c_lat, c_lon = s_lat[start:start + CHUNK_POINTS], s_lon[start:start + CHUNK_POINTS]
+        chunks.append((session_id, float(c_lat.min()), float(c_lat.max()), float(c_lon.min()), float(c_lon.max())))
+
+    summary = {
+        "session_id": session_id,
+        "n_raw": len(lat),
+        "n_points": len(idx),
+        "tolerance_m": tolerance_m,
+        "distance_m": track_distance(lat, lon, epoch, [np.nan if a is None else a for a in acc]),
+    }
+    conn = db.get_connection()
+    try:
+        conn.execute('''
+            INSERT OR REPLACE INTO gps_track_simplified
+                (session_id, polyline, n_points, n_raw, tolerance_m, distance_m, min_lat, max_lat, min_lon, max_lon, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (session_id, json.dumps(polyline), summary["n_points"], summary["n_raw"], tolerance_m, summary["distance_m"],
+              float(lat.min()), float(lat.max()), float(lon.min()), float(lon.max()), datetime.datetime.now()))
+        conn.execute("DELETE FROM gps_track_rtree WHERE session_id = ?", (session_id,))
+        conn.executemany(
+            "INSERT INTO gps_track_rtree (session_id, min_lat, max_lat, min_lon, max_lon) VALUES (?, ?, ?, ?, ?)",
+            chunks
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return summary
+
+
+def get_route(db: DatabaseManager, session_id: int) -> List[Tuple[float, float]]:
+    """Tracé simplifié [(lat, lon), ...] pour l'affichage carte ([] si aucun)"""
+    conn = db.get_connection()
+    row = conn.execute("SELECT polyline FROM gps_track_simplified WHERE session_id = ?", (session_id,)).fetchone()
+    conn.close()
+    return [tuple(p) for p in json.loads(row[0])] if row else []
+
+
+def sessions_in_area(db: DatabaseManager, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[int]:
+    """Sessions dont un tronçon du tracé croise la zone (requête R*Tree, sans lire les points)"""
+    conn = db.get_connection()
+    rows = conn.execute('''
+        SELECT DISTINCT session_id FROM gps_track_rtree
+        WHERE max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?
+        ORDER BY session_id
+    ''', (min_lat, max_lat, min_lon, max_lon)).fetchall()
+    conn.close()
+    return [r[0] for r in rows]
+
+
+def sessions_near(db: DatabaseManager, lat: float, lon: float, radius_m: float) -> List[int]:
+    """Sessions passées à moins de radius_m d'un point : boîte R*Tree puis contrôle haversine des sommets"""
+    dlat = np.degrees(radius_m / EARTH_RADIUS_M)
+    dlon = dlat / max(np.cos(np.radians(lat)), 1e-6)
+    found = []
+    for sid in sessions_in_area(db, lat - dlat, lon - dlon, lat + dlat, lon + dlon):
+        route = np.array(get_route(db, sid))
+        if len(route) and haversine_np(lat, lon, route[:, 0], route[:, 1]).min() <= radius_m:
+            found.append(sid)
+    return found
+
+
+def pending_sessions(db: DatabaseManager) -> List[int]:
+    """Sessions terminées avec une trace mais pas encore simplifiées"""
+    conn = db.get_connection()
+    rows = conn.execute('''
+        SELECT s.id FROM sessions s
+        WHERE s.end_time IS NOT NULL
+          AND EXISTS (SELECT 1 FROM gps_track g WHERE g.session_id = s.id)
+          AND NOT EXISTS (SELECT 1 FROM gps_track_simplified t WHERE t.session_id = s.id)
+        ORDER BY s.id
+    ''').fetchall()
+    conn.close()
+    return [r[0] for r in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simplification et index spatial des traces GPS")
+    parser.add_argument("--db", default="whoop.db")
+    parser.add_argument("--rebuild", action="store_true", help="Resimplifie toutes les sessions avec trace")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE_M, help="Tolérance Douglas-Peucker (m)")
+    parser.add_argument("--area", help="min_lat,min_lon,max_lat,max_lon : sessions passées dans la zone")
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    if args.area:
+        print(sessions_in_area(db, *[float(v) for v in args.area.split(",")]))
+    else:
+        if args.rebuild:
+            conn = db.get_connection()
+            todo = [r[0] for r in conn.execute("SELECT DISTINCT session_id FROM gps_track ORDER BY session_id")]
+            conn.close()
+        else:
+            todo = pending_sessions(db)
+        for sid in todo:
+            s = simplify_session(db, sid, args.tolerance)
+            if s:
+                print(f"🗺️  Session #{sid} : {s['n_raw']} -> {s['n_points']} points, {s['distance_m'] / 1000:.2f} km")
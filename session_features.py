@@ -0,0 +1,132 @@
+import json
+import argparse
+import datetime
+from typing import List, Optional
+import pandas as pd
+import data_science
+from database_manager import DatabaseManager, get_db
+from session_summary import MAX_HR, ZONE_LABELS, ZONE_BOUNDS
+from session_views import compute_metrics, load_session_frame
+
+# Indicateurs dérivés des sessions closes, persistés dans la table session_features :
+# RMSSD, respiration, strain, body battery, temps par zone, phases de sommeil et séries à la minute.
+# Calculés une fois à la clôture (logger) et réutilisés après chaque redémarrage du dashboard / de l'API.
+# Recalcul uniquement si data_science.ALGORITHM_VERSION, FEATURES_VERSION ou la FC max changent.
+
+# À incrémenter si le contenu stocké change (nouvel indicateur, autre sous-échantillonnage)
+FEATURES_VERSION = 1
+# Écart maximal compté entre deux mesures pour le temps par zone (trous de connexion exclus)
+MAX_GAP_S = 60.0
+
+
+def compute_features(db: DatabaseManager, session_id: int, max_hr: int = MAX_HR) -> Optional[dict]:
+    """Indicateurs complets d'une session (lecture des mesures brutes). None si la session est vide."""
+    df = load_session_frame(db, session_id)
+    if df.empty:
+        return None
+    features = compute_metrics(df, max_hr)
+
+    # Temps par zone : durée jusqu'à la mesure suivante (les lignes du rollup valent leur minute)
+    dt = df['timestamp'].diff().shift(-1).dt.total_seconds().clip(upper=MAX_GAP_S).fillna(0)
+    edges = [0] + [b * max_hr for b in ZONE_BOUNDS] + [float("inf")]
+    zones = pd.cut(df['bpm'], bins=edges, labels=ZONE_LABELS, right=False)
+    zone_seconds = dt.groupby(zones, observed=False).sum()
+
+    # Séries à la minute (graphique et hypnogramme) : phase de sommeil majoritaire de chaque minute
+    by_minute = df.set_index('timestamp').resample('1min')
+    series = pd.DataFrame({
+        "bpm_avg": by_minute['bpm'].mean().round(1),
+        "bpm_min": by_minute['bpm'].min(),
+        "bpm_max": by_minute['bpm'].max(),
+        "steps": by_minute['steps'].sum(),
+    }).dropna(subset=["bpm_avg"])
+    if 'sleep_phase' in df.columns:
+        series["sleep_phase"] = by_minute['sleep_phase'].agg(lambda p: p.mode().iat[0] if len(p) else None)
+
+    features.update({
+        "session_id": session_id,
+        "start": df['timestamp'].iloc[0].isoformat(),
+        "end": df['timestamp'].iloc[-1].isoformat(),
+        "n_rows": len(df),
+        "max_hr": max_hr,
+        "zone_seconds": {label: float(zone_seconds.get(label, 0.0)) for label in ZONE_LABELS},
+        "series": {
+            "minute": [t.strftime('%Y-%m-%d %H:%M:00') for t in series.index],
+            "bpm_avg": series["bpm_avg"].tolist(),
+            "bpm_min": series["bpm_min"].astype(int).tolist(),
+            "bpm_max": series["bpm_max"].astype(int).tolist(),
+            "steps": series["steps"].astype(int).tolist(),
+            "sleep_phase": series["sleep_phase"].tolist() if "sleep_phase" in series else None,
+        },
+    })
+    return features
+
+
+def get_session_features(session_id: int, db: Optional[DatabaseManager] = None, max_hr: int = MAX_HR) -> Optional[dict]:
+    """
+    Indicateurs persistés d'une session close, (re)calculés si absents ou d'une autre version.
+    None si la session n'existe pas, n'est pas close ou est vide.
+    """
+    db = db or get_db()
+    conn = db.get_connection()
+    try:
+        sess = conn.execute("SELECT end_time FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if not sess or sess[0] is None:
+            return None
+        row = conn.execute(
+            "SELECT features_json FROM session_features "
+            "WHERE session_id = ? AND algo_version = ? AND format_version = ? AND max_hr = ? AND end_time = ?",
+            (session_id, data_science.ALGORITHM_VERSION, FEATURES_VERSION, max_hr, sess[0])
+        ).fetchone()
+        if row:
+            return json.loads(row[0])
+    finally:
+        conn.close()
+
+    features = compute_features(db, session_id, max_hr)
+    if features is None:
+        return None
+    features["algo_version"] = data_science.ALGORITHM_VERSION
+    conn = db.get_connection()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO session_features "
+            "(session_id, algo_version, format_version, max_hr, end_time, features_json, computed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (session_id, data_science.ALGORITHM_VERSION, FEATURES_VERSION, max_hr, sess[0],
+             json.dumps(features), datetime.datetime.now())
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return features
+
+
+def outdated_sessions(db: DatabaseManager, max_hr: int = MAX_HR) -> List[int]:
+    """Sessions closes sans indicateurs à jour (nouvelle version des algorithmes, FC max modifiée...)"""
+    conn = db.get_connection()
+    rows = conn.execute('''
+        SELECT s.id FROM sessions s
+        LEFT JOIN session_features f ON f.session_id = s.id
+        WHERE s.end_time IS NOT NULL
+          AND (f.session_id IS NULL OR f.algo_version != ? OR f.format_version != ? OR f.max_hr != ?
+               OR f.end_time != s.end_time)
+        ORDER BY s.id
+    ''', (data_science.ALGORITHM_VERSION, FEATURES_VERSION, max_hr)).fetchall()
+    conn.close()
+    return [r[0] for r in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indicateurs persistés des sessions closes (session_features)")
+    parser.add_argument("--db", default="whoop.db")
+    parser.add_argument("--max-hr", type=int, default=MAX_HR)
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    todo = outdated_sessions(db, args.max_hr)
+    print(f"🧮 {len(todo)} session(s) à calculer (algorithmes v{data_science.ALGORITHM_VERSION})")
+    for sid in todo:
+        f = get_session_features(sid, db, args.max_hr)
+        if f:
+            print(f"  Session #{sid} : RMSSD {f['hrv_rmssd']:.1f} ms, strain {f['strain_score']:.1f}, {len(f['series']['minute'])} min")
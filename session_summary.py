@@ -0,0 +1,129 @@
+import json
+import hashlib
+import datetime
+import yaml
+from typing import Optional
+from database_manager import DatabaseManager, get_db
+
+# Chargement de la config
+try:
+    with open("config.yaml", "r") as f:
+        CONFIG = yaml.safe_load(f) or {}
+except Exception:
+    CONFIG = {}
+
+MAX_HR = CONFIG.get('user', {}).get('max_hr', 190)
+
+# Mêmes zones que whoop_viz.ZONES_CONFIG (pourcentages de MAX_HR)
+ZONE_LABELS = ['Hors Zone', 'Zone 1', 'Zone 2', 'Zone 3', 'Zone 4', 'Zone 5']
+ZONE_BOUNDS = [0.50, 0.60, 0.70, 0.80, 0.90]
+ZONE_COLORS = ['#3a3a3c', '#8e8e93', '#007aff', '#34c759', '#ff9500', '#ff3b30']
+
+# À incrémenter si le contenu du résumé change (invalide le cache)
+SUMMARY_VERSION = 1
+
+
+def session_fingerprint(conn, session_id: int) -> Optional[str]:
+    """
+    Empreinte bon marché du contenu d'une session (index seuls, pas de lecture des lignes).
+    Elle change dès qu'une mesure est ajoutée, agrégée par la rétention ou que la session est close.
+    """
+    sess = conn.execute("SELECT start_time, end_time FROM sessions WHERE id = ?", (session_id,)).fetchone()
+    if not sess:
+        return None
+    raw = conn.execute(
+        "SELECT COUNT(*), MAX(timestamp) FROM measurements WHERE session_id = ?", (session_id,)
+    ).fetchone()
+    rolled = conn.execute(
+        "SELECT COUNT(*), MAX(minute) FROM measurements_rollup WHERE session_id = ?", (session_id,)
+    ).fetchone()
+    key = f"v{SUMMARY_VERSION}|{MAX_HR}|{session_id}|{sess[0]}|{sess[1]}|{raw[0]}|{raw[1]}|{rolled[0]}|{rolled[1]}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def compute_summary(conn, session_id: int, max_hr: int = MAX_HR) -> Optional[dict]:
+    """
+    Résumé d'une session calculé par SQLite (agrégats + série à la minute).
+    Aucune ligne brute ne remonte en Python : coût borné même pour une session de 24h.
+    """
+    stats = conn.execute('''
+        SELECT MIN(timestamp), MAX(timestamp), MAX(bpm),
+               SUM(bpm * n_beats) * 1.0 / SUM(n_beats), SUM(COALESCE(steps, 0)), SUM(n_beats), COUNT(*)
+        FROM measurements_timeline WHERE session_id = ?
+    ''', (session_id,)).fetchone()
+    if not stats or not stats[6]:
+        return None
+    first_ts, last_ts, max_bpm, avg_bpm, total_steps, n_beats, _ = stats
+
+    series = conn.execute('''
+        SELECT strftime('%Y-%m-%d %H:%M:00', timestamp) AS minute,
+               SUM(bpm * n_beats) * 1.0 / SUM(n_beats), MIN(bpm), MAX(bpm), SUM(COALESCE(steps, 0))
+        FROM measurements_timeline WHERE session_id = ?
+        GROUP BY minute ORDER BY minute
+    ''', (session_id,)).fetchall()
+
+    # Temps par zone : battements par zone, pondérés par la durée moyenne d'un battement
+    edges = [b * max_hr for b in ZONE_BOUNDS]
+    case = "CASE " + " ".join(f"WHEN bpm < {e} THEN {i}" for i, e in enumerate(edges)) + f" ELSE {len(edges)} END"
+    zone_rows = conn.execute(
+        f"SELECT {case} AS z, SUM(n_beats) FROM measurements_timeline WHERE session_id = ? GROUP BY z",
+        (session_id,)
+    ).fetchall()
+
+    start = datetime.datetime.fromisoformat(str(first_ts))
+    end = datetime.datetime.fromisoformat(str(last_ts))
+    duration_s = (end - start).total_seconds()
+    sec_per_beat = duration_s / n_beats if n_beats else 0
+    zone_seconds = {label: 0.0 for label in ZONE_LABELS}
+    for z, beats in zone_rows:
+        zone_seconds[ZONE_LABELS[z]] = beats * sec_per_beat
+
+    return {
+        "session_id": session_id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "duration_s": duration_s,
+        "max_bpm": max_bpm,
+        "avg_bpm": avg_bpm,
+        "total_steps": total_steps or 0,
+        "n_beats": n_beats,
+        "max_hr": max_hr,
+        "zone_seconds": zone_seconds,
+        "series": {
+            "minute": [r[0] for r in series],
+            "bpm_avg": [round(r[1], 1) for r in series],
+            "bpm_min": [r[2] for r in series],
+            "bpm_max": [r[3] for r in series],
+            "steps": [r[4] for r in series],
+        },
+    }
+
+
+def get_session_summary(session_id: int, db: Optional[DatabaseManager] = None) -> Optional[dict]:
+    """Résumé depuis le cache session_summaries, recalculé seulement si l'empreinte a changé"""
+    db = db or get_db()
+    conn = db.get_connection()
+    try:
+        fingerprint = session_fingerprint(conn, session_id)
+        if fingerprint is None:
+            return None
+        row = conn.execute(
+            "SELECT summary_json FROM session_summaries WHERE session_id = ? AND fingerprint = ?",
+            (session_id, fingerprint)
+        ).fetchone()
+        if row:
+            summary = json.loads(row[0])
+        else:
+            summary = compute_summary(conn, session_id)
+            if summary is None:
+                return None
+            summary["fingerprint"] = fingerprint
+            conn.execute(
+                "INSERT OR REPLACE INTO session_summaries (session_id, fingerprint, summary_json, computed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (session_id, fingerprint, json.dumps(summary), datetime.datetime.now())
+            )
+            conn.commit()
+        return summary
+    finally:
+        conn.close()
@@ -0,0 +1,201 @@
+import threading
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+import pandas as pd
+import metrics
+import profiling
+
+# Vue calculée d'une session pour le dashboard (DataFrame + indicateurs + graphiques Altair).
+# Une session close (sessions.end_time renseigné) ne change plus : sa vue est gardée en mémoire
+# (LRU, clé = id + end_time + FC max) et revoir l'historique ne relance ni SQL, ni FFT, ni Altair.
+# Au premier affichage après un redémarrage, elle est reconstruite depuis session_features (séries
+# à la minute). La session live (end_time NULL) est recalculée à pleine résolution à chaque rerun.
+# Note : la rétention peut agréger plus tard le brut d'une session close ; les indicateurs persistés
+# gardent alors les valeurs calculées sur le brut (VFC comprise), plus précises.
+
+DEFAULT_MAX_ENTRIES = 8  # ~10 Mo par journée à 1 Hz
+
+VIEW_CACHE_REQUESTS = metrics.counter("whoop_session_view_cache_total", "Vues de session demandées", ["result"])
+
+
+def parse_rr(rr_str):
+    if not rr_str: return []
+    try: return [int(x) for x in str(rr_str).split(';') if x.strip() and 250 < int(x) < 1500]
+    except: return []
+
+
+def calc_rmssd(rr_list):
+    if len(rr_list) < 2: return 0
+    diffs = np.diff(rr_list)
+    return np.sqrt(np.mean(diffs ** 2))
+
+
+def load_session_frame(db, session_id: int) -> pd.DataFrame:
+    conn = db.get_connection()
+    df = pd.read_sql_query(
+        "SELECT timestamp, bpm, rr_intervals, battery, steps FROM measurements_timeline WHERE session_id = ? ORDER BY timestamp ASC",
+        conn,
+        params=(session_id,),
+        parse_dates=['timestamp']
+    )
+    conn.close()
+    return df
+
+
+def compute_metrics(df: pd.DataFrame, max_hr: int) -> dict:
+    """
+    Indicateurs d'une session à partir de ses mesures (ajoute sleep_phase et strain_pts à df).
+    Partagé par la vue live et par session_features (indicateurs persistés des sessions closes).
+    """
+    from data_science import calculate_respiratory_rate, calculate_body_battery, analyze_sleep_architecture, classify_sleep_phases
+
+    # Pour les pas, on gère le cas où la colonne serait NaN (anciennes sessions)
+    if 'steps' not in df.columns: df['steps'] = 0
+    total_steps = df['steps'].fillna(0).sum()
+    bpm_list = df['bpm'].tolist()
+
+    # VFC
+    with profiling.section("rr_parse"):
+        all_rr = []
+        for r in df['rr_intervals'].apply(parse_rr): all_rr.extend(r)
+        hrv_rmssd = calc_rmssd(all_rr)
+
+    # Body Battery : liste constante de RMSSD pour simplifier dans cette version
+    with profiling.section("body_battery"):
+        body_battery = calculate_body_battery(bpm_list, [hrv_rmssd] * len(df))
+
+    with profiling.section("fft_respiration"):
+        respiratory_rate = calculate_respiratory_rate(all_rr)
+
+    with profiling.section("sleep_analysis"):
+        sleep_status = analyze_sleep_architecture(bpm_list, total_steps)
+        phases = classify_sleep_phases(bpm_list) if sleep_status == "SOMMEIL (Détecté)" else None
+    if phases is not None and len(phases) == len(df):
+        df['sleep_phase'] = phases
+
+    # Strain (Approximation logarithmique 0-21) : on suppose que chaque point de la série est 1 sec
+    with profiling.section("strain"):
+        df['strain_pts'] = pd.cut(df['bpm'],
+            bins=[0, max_hr*0.5, max_hr*0.6, max_hr*0.7, max_hr*0.8, max_hr*0.9, 300],
+            labels=[0, 1, 2, 4, 8, 12], include_lowest=True).astype(float)
+        strain_score = min(21 * (1 - np.exp(-df['strain_pts'].sum() / 6000)), 21.0)
+
+    return {
+        "current_bpm": int(df['bpm'].iloc[-1]),
+        "current_batt": int(df['battery'].iloc[-1]),
+        "total_steps": int(total_steps),
+        # En mouvement : plus de ~20 pas/min en moyenne
+        "is_moving": bool(total_steps > (len(df) / 60 * 20)),
+        "hrv_rmssd": float(hrv_rmssd),
+        "body_battery": float(body_battery),
+        "respiratory_rate": float(respiratory_rate) if respiratory_rate else None,
+        "sleep_status": sleep_status,
+        "strain_score": float(strain_score),
+    }
+
+
+def compute_session_view(db, session_id: int, max_hr: int) -> Optional[dict]:
+    """
+    Vue pleine résolution (session live) : None si la session est vide.
+    Le DataFrame retourné peut être partagé par le cache : ne pas le modifier.
+    """
+    with profiling.section("sql_load"):
+        df = load_session_frame(db, session_id)
+    if df.empty:
+        return None
+    view = compute_metrics(df, max_hr)
+    with profiling.section("altair"):
+        view["hr_chart"], view["hypno_chart"] = build_charts(df, max_hr)
+    view.update(session_id=session_id, df=df, n_rows=len(df))
+    return view
+
+
+def view_from_features(features: dict, max_hr: int) -> dict:
+    """Vue d'une session close depuis ses indicateurs persistés (séries à la minute, sans relire les mesures)"""
+    series = features["series"]
+    df = pd.DataFrame({
+        "timestamp": pd.to_datetime(series["minute"]),
+        "bpm": series["bpm_avg"],
+        "steps": series["steps"],
+    })
+    if series.get("sleep_phase"):
+        df["sleep_phase"] = series["sleep_phase"]
+    view = {k: features[k] for k in ("current_bpm", "current_batt", "total_steps", "is_moving", "hrv_rmssd",
+                                     "body_battery", "respiratory_rate", "sleep_status", "strain_score")}
+    with profiling.section("altair"):
+        view["hr_chart"], view["hypno_chart"] = build_charts(df, max_hr)
+    view.update(session_id=features["session_id"], df=df, n_rows=len(df))
+    return view
+
+
+def build_charts(df: pd.DataFrame, max_hr: int):
+    """Courbe cardiaque + hypnogramme (None hors sommeil). Altair chargé au premier graphique."""
+    import altair as alt
+    hr_chart = alt.Chart(df).mark_area(
+        line={'color':'#ff3b30'},
+        color=alt.Gradient(gradient='linear', stops=[alt.GradientStop(color='#ff3b30', offset=0), alt.GradientStop(color='transparent', offset=1)], x1=1, x2=1, y1=1, y2=0)
+    ).encode(
+        x=alt.X('timestamp', axis=alt.Axis(format='%H:%M:%S', title='Heure')),
+        y=alt.Y('bpm', scale=alt.Scale(domain=[40, max_hr]), title='BPM'),
+        tooltip=['timestamp', 'bpm', 'steps']
+    ).properties(height=400)
+
+    hypno_chart = None
+    if 'sleep_phase' in df.columns:
+        # Couleurs : Deep (Bleu Foncé), Light (Bleu clair), REM (Violet), Awake (Rose/Rouge)
+        phase_colors = alt.Scale(domain=['Deep', 'Light', 'REM', 'Awake'],
+                                 range=['#1e3a8a', '#60a5fa', '#a855f7', '#f43f5e'])
+        hypno_chart = alt.Chart(df).mark_rect().encode(
+            x='timestamp',
+            y=alt.Y('sleep_phase', title='Phase'),
+            color=alt.Color('sleep_phase', scale=phase_colors, legend=None),
+            tooltip=['timestamp', 'sleep_phase', 'bpm']
+        ).properties(height=150, title="Architecture du Sommeil (Hypnogramme)")
+    return hr_chart, hypno_chart
+
+
+class SessionViewCache:
+    """LRU des vues de sessions closes, partagé par tous les onglets du process Streamlit"""
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._views = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db, session_id: int, end_time, max_hr: int) -> Optional[dict]:
+        if end_time is None:
+            VIEW_CACHE_REQUESTS.inc(result="live")
+            return compute_session_view(db, session_id, max_hr)
+
+        key = (session_id, str(end_time), max_hr)
+        with self._lock:
+            view = self._views.get(key)
+            if view is not None:
+                self._views.move_to_end(key)
+        if view is not None:
+            VIEW_CACHE_REQUESTS.inc(result="hit")
+            return view
+
+        VIEW_CACHE_REQUESTS.inc(result="miss")
+        # Session close : indicateurs persistés (calculés une fois à la clôture) plutôt que les mesures brutes
+        from session_features import get_session_features
+        features = get_session_features(session_id, db, max_hr)
+        view = view_from_features(features, max_hr) if features else None
+        if view is not None and self.max_entries > 0:
+            with self._lock:
+                self._views[key] = view
+                self._views.move_to_end(key)
+                while len(self._views) > self.max_entries:
+                    self._views.popitem(last=False)
+        return view
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+
+    def __len__(self):
+        return len(self._views)
+
+
+# Cache du process : survit aux reruns Streamlit (le module n'est importé qu'une fois)
+VIEW_CACHE = SessionViewCache()
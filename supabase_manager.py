@@ -100,6 +100,23 @@ class SupabaseManager:
             print(f"Erreur insert measurement: {e}")
             raise
 
+    def upsert_measurements(self, rows: List[dict]) -> int:
+        """
+        Envoie un lot de mesures en une seule requête (upsert idempotent).
+        La clé de conflit (device, created_at) est un index unique côté Supabase :
+        un lot renvoyé après une coupure réseau n'est donc jamais dupliqué.
+        """
+        if not rows:
+            return 0
+        try:
+            self.supabase.table('measurements')\
+                .upsert(rows, on_conflict='device,created_at', ignore_duplicates=True)\
+                .execute()
+            return len(rows)
+        except Exception as e:
+            print(f"Erreur upsert measurements: {e}")
+            raise
+
     def get_all_sessions(self) -> List[Tuple]:
         """Récupère toutes les sessions distinctes avec leurs stats"""
         try:
@@ -1,4 +1,4 @@
--- SCRIPT COMPLET v6.0 (Avec Session ID)
+-- SCRIPT COMPLET v7.0 (Avec Session ID + Synchro idempotente)
 -- Copiez tout ce bloc et lancez-le dans Supabase SQL Editor.
 
 -- 1. Création de la table (si elle n'existe pas déjà)
@@ -24,7 +24,10 @@ alter table public.measurements add column if not exists session_id text;
 create index if not exists idx_measurements_session_id on public.measurements(session_id);
 create index if not exists idx_measurements_created_at on public.measurements(created_at);
 
--- 6. Sécurité (Lecture/Ecriture pour tous)
+-- 6. Clé d'idempotence pour la synchro locale -> cloud (sync_manager.py)
+create unique index if not exists uq_measurements_device_created_at on public.measurements(device, created_at);
+
+-- 7. Sécurité (Lecture/Ecriture pour tous)
 alter table public.measurements enable row level security;
 drop policy if exists "Allow Anon Insert" on public.measurements;
 drop policy if exists "Allow Anon Read" on public.measurements;
@@ -0,0 +1,125 @@
+import time
+import socket
+import datetime
+import yaml
+from typing import List, Tuple, Optional
+from database_manager import DatabaseManager, get_db
+
+# Chargement de la config
+try:
+    with open("config.yaml", "r") as f:
+        CONFIG = yaml.safe_load(f) or {}
+except Exception:
+    CONFIG = {}
+
+SYNC_CONFIG = CONFIG.get('sync', {})
+SYNC_INTERVAL = SYNC_CONFIG.get('interval', 2.0)   # Secondes entre deux passes quand tout est à jour
+BATCH_SIZE = SYNC_CONFIG.get('batch_size', 500)    # Mesures par requête Supabase
+
+
+def local_to_cloud_session_id(session_id: int) -> str:
+    """Les sessions SQLite sont des entiers, celles de Supabase des chaînes"""
+    return f"local_{session_id}"
+
+
+def rr_to_rmssd(rr_str: Optional[str]) -> Optional[float]:
+    """RMSSD des RR d'une mesure (colonne hrv côté Supabase), None si pas assez de RR"""
+    if not rr_str:
+        return None
+    try:
+        rr = [int(x) for x in rr_str.split(';') if x.strip()]
+    except ValueError:
+        return None
+    if len(rr) < 2:
+        return None
+    diffs = [rr[i + 1] - rr[i] for i in range(len(rr) - 1)]
+    return round((sum(d * d for d in diffs) / len(diffs)) ** 0.5, 1)
+
+
+def to_utc_iso(ts) -> str:
+    """Timestamp SQLite (heure locale naïve) -> ISO 8601 avec fuseau pour timestamptz"""
+    if isinstance(ts, str):
+        ts = datetime.datetime.fromisoformat(ts)
+    return ts.astimezone(datetime.timezone.utc).isoformat()
+
+
+class SyncWorker:
+    """
+    Réplique les mesures locales (DatabaseManager) vers Supabase.
+    - High-water mark par session (table sync_state) : rien n'est renvoyé deux fois.
+    - Lots envoyés en un seul upsert idempotent, clé (device, created_at).
+    - Processus séparé : le logger n'écrit qu'en local et ne fait aucun appel réseau.
+    """
+    def __init__(self, db: Optional[DatabaseManager] = None, cloud=None,
+                 batch_size: int = BATCH_SIZE, interval: float = SYNC_INTERVAL,
+                 host_id: Optional[str] = None):
+        self.db = db or get_db()
+        if cloud is None:
+            from supabase_manager import SupabaseManager
+            cloud = SupabaseManager()
+        self.cloud = cloud
+        self.batch_size = batch_size
+        self.interval = interval
+        # Identifie la machine : deux PC qui loggent le même bracelet ne se marchent pas dessus
+        self.host_id = host_id or SYNC_CONFIG.get('host_id') or socket.gethostname()
+
+    def device_key(self, device_name: Optional[str]) -> str:
+        return f"{device_name or 'Whoop'}@{self.host_id}"
+
+    def build_rows(self, session_id: int, device_name: str, measurements: List[Tuple]) -> List[dict]:
+        """Convertit les tuples SQLite au format de la table Supabase"""
+        device = self.device_key(device_name)
+        cloud_sid = local_to_cloud_session_id(session_id)
+        rows = []
+        for _, ts, bpm, rr_str, battery, steps in measurements:
+            rows.append({
+                "created_at": to_utc_iso(ts),
+                "bpm": bpm,
+                "hrv": rr_to_rmssd(rr_str),
+                "steps": steps or 0,
+                "device": device,
+                "session_id": cloud_sid,
+            })
+        return rows
+
+    def sync_session(self, session_id: int, device_name: str, mark: int) -> int:
+        """Vide le backlog d'une session lot par lot. Retourne le nombre de mesures envoyées."""
+        sent = 0
+        while True:
+            batch = self.db.get_measurements_after(session_id, mark, self.batch_size)
+            if not batch:
+                break
+            self.cloud.upsert_measurements(self.build_rows(session_id, device_name, batch))
+            # Le mark n'avance qu'après l'acquittement du lot : un crash = renvoi (idempotent)
+            mark = batch[-1][0]
+            self.db.set_sync_mark(session_id, mark)
+            sent += len(batch)
+            if len(batch) < self.batch_size:
+                break
+        return sent
+
+    def sync_once(self) -> int:
+        """Une passe complète sur toutes les sessions en retard"""
+        total = 0
+        for session_id, device_name, mark in self.db.get_pending_sync_sessions():
+            total += self.sync_session(session_id, device_name, mark)
+        return total
+
+    def run_forever(self):
+        print(f"☁️  Synchro locale -> Supabase active (lot: {self.batch_size}, intervalle: {self.interval}s)")
+        while True:
+            try:
+                sent = self.sync_once()
+                if sent:
+                    print(f"☁️  {sent} mesures synchronisées")
+            except Exception as e:
+                # Hors ligne : on réessaiera à la prochaine passe depuis le même mark
+                print(f"⚠️ Synchro en attente : {e}")
+            time.sleep(self.interval)
+
+
+if __name__ == "__main__":
+    try:
+        SyncWorker().run_forever()
+    except KeyboardInterrupt:
+        pass
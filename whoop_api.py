@@ -1,11 +1,43 @@
 
-from fastapi import FastAPI
-from database_manager import DatabaseManager
-import uvicorn
-import pandas as pd
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from database_manager import get_db
+import metrics
+import profiling
 
 app = FastAPI(title="Whoop Pro API", version="1.0.0")
-db = DatabaseManager()
+db = get_db()
+
+@app.middleware("http")
+async def measure_latency(request: Request, call_next):
+    """Latence de chaque requête (histogramme whoop_api_request_seconds)"""
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route déclarée plutôt que l'URL brute : pas d'explosion de labels
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        metrics.API_REQUEST_SECONDS.observe(time.perf_counter() - t0, method=request.method, path=path, status=status)
+
+if profiling.ENABLED:
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        """WHOOP_PROFILE : sections de la requête dans le log rotatif et l'en-tête Server-Timing"""
+        run = profiling.start_run(f"api {request.method} {request.url.path}")
+        try:
+            with run.section("handler"):
+                response = await call_next(request)
+        finally:
+            record = profiling.finish_run(run)
+        response.headers["Server-Timing"] = ", ".join(
+            f"{name};dur={ms}" for name, ms in dict(record["sections_ms"], total=record["total_ms"]).items()
+        )
+        return response
 
 @app.get("/")
 def read_root():
@@ -15,30 +47,52 @@ def read_root():
 def get_current_metrics():
     """Retourne les dernières métriques connues (BPM, Batterie, Pas)"""
     # On récupère la dernière session active
-    sessions = db.get_all_sessions()
+    with profiling.section("sessions"):
+        sessions = db.get_all_sessions()
     if not sessions: return {"error": "No session"}
     
     last_session_id = sessions[0][0]
     
-    # On lit la dernière ligne
-    conn = db.get_connection()
-    df = pd.read_sql_query(
-        "SELECT * FROM measurements WHERE session_id = ? ORDER BY timestamp DESC LIMIT 1",
-        conn,
-        params=(last_session_id,)
-    )
-    conn.close()
+    # On lit la dernière ligne (sqlite3 direct : pas besoin de pandas pour une ligne)
+    with profiling.section("last_row"):
+        conn = db.get_connection()
+        row = conn.execute(
+            "SELECT bpm, battery, steps, timestamp FROM measurements WHERE session_id = ? ORDER BY timestamp DESC LIMIT 1",
+            (last_session_id,)
+        ).fetchone()
+        conn.close()
     
-    if df.empty: return {"status": "Waiting for data"}
+    if row is None: return {"status": "Waiting for data"}
     
-    row = df.iloc[0]
+    bpm, battery, steps, timestamp = row
     return {
-        "bpm": int(row['bpm']),
-        "battery": int(row['battery']),
-        "steps": int(row['steps']) if 'steps' in row else 0,
-        "timestamp": str(row['timestamp'])
+        "bpm": int(bpm),
+        "battery": int(battery or 0),
+        "steps": int(steps or 0),
+        "timestamp": str(timestamp)
     }
 
+@app.get("/sessions/{session_id}/features")
+def get_features(session_id: int):
+    """Indicateurs persistés d'une session close (calculés à la clôture, cf. session_features.py)"""
+    from session_features import get_session_features
+    with profiling.section("features"):
+        features = get_session_features(session_id, db)
+    if features is None:
+        return {"error": "Session inconnue, vide ou en cours"}
+    return features
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Métriques au format Prometheus : celles de l'API + le dernier export du logger (table metrics)"""
+    samples = metrics.collect(process="api")
+    try:
+        samples += metrics.read_sqlite_samples(db, exclude_process="api")
+    except Exception as e:
+        print(f"⚠️ Lecture métriques SQLite : {e}")
+    return PlainTextResponse(metrics.render_prometheus(samples), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
+    import uvicorn
     # Écoute sur 0.0.0.0 pour être accessible sur le réseau local (Wifi)
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -4,6 +4,7 @@ import sys
 from bleak import BleakScanner, BleakClient
 from bleak.backends.device import BLEDevice
 from bleak.backends.scanner import AdvertisementData
+from hr_parser import parse_hr_measurement
 
 # UUID Standard pour le service de fréquence cardiaque (Heart Rate Service)
 # UUID complet: 0000180d-0000-1000-8000-00805f9b34fb mais on écoute la caractéristique Heart Rate Measurement
@@ -14,22 +15,8 @@ def notification_handler(sender, data: bytearray):
     Callback déclenché à chaque réception de notification de fréquence cardiaque.
     Décode les données selon le standard BLE Heart Rate Measurement.
     """
-    # Le premier octet contient les flags
-    flags = data[0]
-    
-    # Vérification du format de la valeur de fréquence cardiaque (Bit 0)
-    # 0 = UINT8 (1 octet), 1 = UINT16 (2 octets)
-    hr_format_uint16 = flags & 0x01
-    
-    if hr_format_uint16:
-        # Format UINT16: On lit les octets 1 et 2 (Little Endian)
-        hr_value = int.from_bytes(data[1:3], byteorder='little')
-        # info_offset sert si on voulait lire d'autres données après (Energy Expended, RR-Intervals...)
-        # info_offset = 3 
-    else:
-        # Format UINT8: On lit l'octet 1
-        hr_value = data[1]
-        # info_offset = 2
+    # Décodage partagé (flags, BPM uint8/uint16, énergie, RR-Intervals) : voir hr_parser.py
+    hr_value = parse_hr_measurement(data).bpm
 
     # Affichage joli dans la console
     print(f"❤️ BPM: {hr_value}")
@@ -1,11 +1,15 @@
 
+import time
 import streamlit as st
 import pandas as pd
-import time
-import numpy as np
-import altair as alt
 import yaml # Import YAML
-from database_manager import DatabaseManager
+from database_manager import get_db
+from session_views import VIEW_CACHE, DEFAULT_MAX_ENTRIES
+from live_snapshot import get_live_snapshot
+import profiling
+
+# Profiling opt-in (WHOOP_PROFILE=1 ou cprofile) : un run par rerun Streamlit
+prof = profiling.start_run("dashboard")
 
 # Chargement Config
 try:
@@ -30,18 +34,17 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- INIT DB ---
-db = DatabaseManager()
+db = get_db()
 
-# --- FONCTIONS UTILITAIRES ---
-def parse_rr(rr_str):
-    if not rr_str: return []
-    try: return [int(x) for x in str(rr_str).split(';') if x.strip() and 250 < int(x) < 1500]
-    except: return []
-
-def calc_rmssd(rr_list):
-    if len(rr_list) < 2: return 0
-    diffs = np.diff(rr_list)
-    return np.sqrt(np.mean(diffs ** 2))
+# --- VUES DE SESSION (calculs + graphiques, en cache LRU pour les sessions closes) ---
+VIEW_CACHE.max_entries = CONFIG.get('app', {}).get('view_cache_size', DEFAULT_MAX_ENTRIES)
+# Instantané live partagé par tous les onglets : un seul thread interroge la base, les reruns lisent
+REFRESH_RATE = CONFIG.get('app', {}).get('refresh_rate', 1)
+# Base inchangée (logger arrêté, bracelet déconnecté) : attente doublée à chaque tour, jusqu'à ce plafond
+MAX_REFRESH_WAIT = CONFIG.get('app', {}).get('max_refresh_wait', 8)
+live = get_live_snapshot(db, REFRESH_RATE)
+# Version de l'instantané affichée par ce rerun (relue avant toute donnée)
+rendered_version = live.version
 
 # --- SIDEBAR (HISTORIQUE) ---
 with st.sidebar:
@@ -51,7 +54,8 @@ with st.sidebar:
     st.subheader("🗄️ Historique Sessions")
     
     # Récupération des sessions valides
-    sessions = db.get_all_sessions() # [(id, start, end, count), ...]
+    with profiling.section("sessions"):
+        sessions = live.sessions() # [(id, start, end, count), ...]
     
     if not sessions:
         st.warning("Aucune session trouvée.")
@@ -60,6 +64,7 @@ with st.sidebar:
     else:
         # Création d'un dict pour le selectbox : "Session #12 (2023-12-07 19:00)" -> ID
         options = {f"Session #{s[0]} ({str(s[1])[:16]}) - {s[3]} pts": s[0] for s in sessions}
+        end_times = {s[0]: s[2] for s in sessions}
         
         # Par défaut, on sélectionne la plus récente (la première de la liste triée DESC)
         selected_label = st.selectbox("Choisir une session :", options.keys())
@@ -121,153 +126,211 @@ with st.sidebar:
     st.divider()
     if selected_session_id:
         if st.button("📄 Générer Rapport PDF"):
-            # On doit re-récupérer le DF complet ici ou le passer via session_state
-            # Pour faire simple on recharge vite fait
-            conn = db.get_connection()
-            pdf_df = pd.read_sql_query("SELECT timestamp, bpm, steps FROM measurements WHERE session_id = ? ORDER BY timestamp ASC", conn, params=(selected_session_id,), parse_dates=['timestamp'])
-            conn.close()
+            # Résumé agrégé en cache (pas de relecture des mesures brutes), archive Parquet si purgée de la base
+            from report_generator import generate_pdf_report_from_summary, report_summary
+            summary = report_summary(selected_session_id, db)
             
-            if not pdf_df.empty:
-                from report_generator import generate_pdf_report
-                pdf_file = generate_pdf_report(selected_session_id, pdf_df, f"report_session_{selected_session_id}.pdf")
+            if summary:
+                pdf_file = generate_pdf_report_from_summary(summary, f"report_session_{selected_session_id}.pdf")
                 
                 with open(pdf_file, "rb") as f:
                     st.download_button("⬇️ Télécharger PDF", f, file_name=pdf_file)
                 st.success("Rapport généré !")
 
 # --- MAIN DASHBOARD ---
-if selected_session_id:
-    # Lecture SQL vers Pandas
-    conn = db.get_connection()
-    df = pd.read_sql_query(
-        "SELECT timestamp, bpm, rr_intervals, battery, steps FROM measurements WHERE session_id = ? ORDER BY timestamp ASC",
-        conn,
-        params=(selected_session_id,),
-        parse_dates=['timestamp']
-    )
-    conn.close()
-
-    if df.empty:
+# Zones live (KPI, graphiques) dans des emplacements st.empty() du rerun complet, remplacés par un seul
+# fragment minuteur (live_tick) et seulement quand l'instantané live a changé (live.version) : onglet ouvert
+# sur une base inchangée = rien de renvoyé, et vérifications de plus en plus espacées (MAX_REFRESH_WAIT).
+# Graphiques au plus toutes les CHART_REFRESH s. La barre latérale (sessions, START/STOP, PDF) n'est
+# reconstruite que sur une vraie interaction, ou quand la liste des sessions change.
+# Streamlit < 1.37 (pas de st.fragment écrivant hors de son corps) : rerun complet gouverné par l'instantané (fin du script).
+# Profiling : chaque exécution de fragment est un run à part (dashboard.tick, dashboard.kpi, dashboard.charts).
+CHART_REFRESH = CONFIG.get('app', {}).get('chart_refresh', 5)
+fragment = getattr(st, "fragment", None)
+# Mode Live ou aucune session (START en attente) : on guette l'apparition / la clôture des sessions
+watch = auto_refresh or not sessions
+# Sessions vues par la barre latérale de ce rerun complet (cf. live_tick)
+st.session_state.sidebar_sessions = [(s[0], s[2]) for s in sessions]
+
+
+def session_view(session_id, end_time):
+    # Session close : vue en cache (aucun recalcul) ; session live : dernier instantané partagé
+    if end_time is None:
+        return live.view(session_id, MAX_HR)
+    return VIEW_CACHE.get(db, session_id, end_time, MAX_HR)
+
+
+@profiling.nested_run("dashboard.kpi")
+def kpi_panel(session_id, end_time):
+    view = session_view(session_id, end_time)
+    if view is None:
         st.info("Session vide ou en cours d'initialisation...")
-    else:
-        # --- PRE-CALCULS ---
-        current_bpm = df['bpm'].iloc[-1]
-        current_batt = df['battery'].iloc[-1]
-        
-        # Pour les pas, on gère le cas où la colonne serait NaN (anciennes sessions)
-        if 'steps' not in df.columns: df['steps'] = 0
-        total_steps = df['steps'].fillna(0).sum()
-        
-        from data_science import calculate_respiratory_rate, calculate_recovery_score, analyze_sleep_architecture, detect_stress_event, calculate_body_battery
-        
-        # VFC
-        all_rr = []
-        for r in df['rr_intervals'].apply(parse_rr): all_rr.extend(r)
-        
-        hrv_rmssd = calc_rmssd(all_rr)
-        
-        # Recovery
-        avg_hrv_7d = db.get_avg_rmssd_7_days()
-        recovery_score = calculate_recovery_score(hrv_rmssd, avg_hrv_7d)
-        
-        # Recup dernières valeurs pour Stress
-        is_moving = total_steps > (len(df)/60 * 20) 
-        stress_detected = detect_stress_event(hrv_rmssd, avg_hrv_7d, current_bpm, is_moving)
-        
-        if stress_detected:
-            st.toast("⚠️ STRESS DÉTECTÉ : Prenez 5 min pour respirer !", icon="🧘")
-            
-        # Body Battery
-        # On passe une liste constante de RMSSD pour simplifier dans cette version
-        body_battery = calculate_body_battery(df['bpm'].tolist(), [hrv_rmssd]*len(df))
-        
-        # Sommeil 24h
-        sleep_duration_24h = db.get_sleep_duration_last_24h()
-        
-        rec_color = "#34c759" if recovery_score > 66 else ("#fbbf24" if recovery_score > 33 else "#ff3b30")
-        
-        # Calcul RPM (Data Science)
-        respiratory_rate = calculate_respiratory_rate(all_rr)
-        rpm_display = f"{respiratory_rate}" if respiratory_rate else "--"
-        
-        # Analyse Sommeil
-        from data_science import classify_sleep_phases
-        sleep_status = analyze_sleep_architecture(df['bpm'].tolist(), total_steps)
+        return
 
-        if sleep_status == "SOMMEIL (Détecté)":
-            st.info("😴 Session identifiée comme SOMMEIL (BPM bas & Mouvements faibles)")
-            
-            # Hypnogramme
-            phases = classify_sleep_phases(df['bpm'].tolist())
-            # On crée un petit DF pour le graph
-            # On aligne phases avec timestamp (approx si windowing, mais classify retourne list complete)
-            if len(phases) == len(df):
-                df['sleep_phase'] = phases
-                
-                # Couleurs : Deep (Bleu Foncé), Light (Bleu clair), REM (Violet), Awake (Rose/Rouge)
-                phase_colors = alt.Scale(domain=['Deep', 'Light', 'REM', 'Awake'],
-                                        range=['#1e3a8a', '#60a5fa', '#a855f7', '#f43f5e'])
-                
-                hypno_chart = alt.Chart(df).mark_rect().encode(
-                    x='timestamp',
-                    y=alt.Y('sleep_phase', title='Phase'),
-                    color=alt.Color('sleep_phase', scale=phase_colors, legend=None),
-                    tooltip=['timestamp', 'sleep_phase', 'bpm']
-                ).properties(height=150, title="Architecture du Sommeil (Hypnogramme)")
-                
-                st.altair_chart(hypno_chart, use_container_width=True)
+    # --- PRE-CALCULS ---
+    current_bpm = view['current_bpm']
+    current_batt = view['current_batt']
+    total_steps = view['total_steps']
+    hrv_rmssd = view['hrv_rmssd']
+    body_battery = view['body_battery']
+    strain_score = view['strain_score']
+    respiratory_rate = view['respiratory_rate']
+    
+    from data_science import calculate_recovery_score, detect_stress_event
+    
+    # Recovery (dépend des 7 derniers jours, pas seulement de la session : contexte de l'instantané)
+    with profiling.section("hrv_7d"):
+        avg_hrv_7d = live.context()['avg_hrv_7d']
+    recovery_score = calculate_recovery_score(hrv_rmssd, avg_hrv_7d)
+    
+    # Recup dernières valeurs pour Stress (toast à l'apparition seulement, pas à chaque rafraîchissement)
+    stress_detected = detect_stress_event(hrv_rmssd, avg_hrv_7d, current_bpm, view['is_moving'])
+    
+    if stress_detected and not st.session_state.get('stress_shown'):
+        st.toast("⚠️ STRESS DÉTECTÉ : Prenez 5 min pour respirer !", icon="🧘")
+    st.session_state.stress_shown = stress_detected
+    
+    # Sommeil 24h
+    with profiling.section("sleep_24h"):
+        sleep_duration_24h = live.context()['sleep_24h']
+    
+    rec_color = "#34c759" if recovery_score > 66 else ("#fbbf24" if recovery_score > 33 else "#ff3b30")
+    
+    # Calcul RPM (Data Science)
+    rpm_display = f"{respiratory_rate}" if respiratory_rate else "--"
 
-        # Strain (Approximation logarithmique 0-21)
-        # On suppose que chaque point de la série est 1 sec
-        df['strain_pts'] = pd.cut(df['bpm'], 
-            bins=[0, MAX_HR*0.5, MAX_HR*0.6, MAX_HR*0.7, MAX_HR*0.8, MAX_HR*0.9, 300], 
-            labels=[0, 1, 2, 4, 8, 12], include_lowest=True).astype(float)
-        
-        strain_score = min(21 * (1 - np.exp(-df['strain_pts'].sum() / 6000)), 21.0)
-        
-        # --- UI KPIS (Ligne 1 : Principaux) ---
-        c1, c2, c3 = st.columns(3)
-        c1.markdown(f"<div class='metric-box'><div class='big-num' style='color:#fff'>{current_bpm}</div><div class='label'>BPM</div></div>", unsafe_allow_html=True)
-        
-        s_col = "#34c759" if strain_score < 10 else "#ff3b30"
-        c2.markdown(f"<div class='metric-box'><div class='big-num' style='color:{s_col}'>{strain_score:.1f}</div><div class='label'>STRAIN</div></div>", unsafe_allow_html=True)
-        
-        c3.markdown(f"<div class='metric-box'><div class='big-num' style='color:{rec_color}'>{recovery_score}%</div><div class='label'>RÉCUPÉRATION</div><div style='font-size:0.8em; color:#888'>Sommeil: {sleep_duration_24h}</div></div>", unsafe_allow_html=True)
-        
-        st.markdown("<br>", unsafe_allow_html=True)
+    # --- UI KPIS (Ligne 1 : Principaux) ---
+    c1, c2, c3 = st.columns(3)
+    c1.markdown(f"<div class='metric-box'><div class='big-num' style='color:#fff'>{current_bpm}</div><div class='label'>BPM</div></div>", unsafe_allow_html=True)
+    
+    s_col = "#34c759" if strain_score < 10 else "#ff3b30"
+    c2.markdown(f"<div class='metric-box'><div class='big-num' style='color:{s_col}'>{strain_score:.1f}</div><div class='label'>STRAIN</div></div>", unsafe_allow_html=True)
+    
+    c3.markdown(f"<div class='metric-box'><div class='big-num' style='color:{rec_color}'>{recovery_score}%</div><div class='label'>RÉCUPÉRATION</div><div style='font-size:0.8em; color:#888'>Sommeil: {sleep_duration_24h}</div></div>", unsafe_allow_html=True)
+    
+    st.markdown("<br>", unsafe_allow_html=True)
 
-        # Body Battery Bar
-        st.markdown(f"**🔋 Body Battery : {int(body_battery)}%**")
-        st.progress(int(body_battery)/100)
-        st.markdown("<br>", unsafe_allow_html=True)
+    # Body Battery Bar
+    st.markdown(f"**🔋 Body Battery : {int(body_battery)}%**")
+    st.progress(int(body_battery)/100)
+    st.markdown("<br>", unsafe_allow_html=True)
 
-        # --- UI KPIS (Ligne 2 : Secondaires) ---
-        c4, c5, c6 = st.columns(3)
-        
-        batt_col = "#34c759" if current_batt > 20 else "#ff3b30"
-        c4.markdown(f"<div class='metric-box'><div class='big-num' style='color:{batt_col}'>{current_batt}%</div><div class='label'>BATTERIE</div></div>", unsafe_allow_html=True)
+    # --- UI KPIS (Ligne 2 : Secondaires) ---
+    c4, c5, c6 = st.columns(3)
+    
+    batt_col = "#34c759" if current_batt > 20 else "#ff3b30"
+    c4.markdown(f"<div class='metric-box'><div class='big-num' style='color:{batt_col}'>{current_batt}%</div><div class='label'>BATTERIE</div></div>", unsafe_allow_html=True)
 
-        c5.markdown(f"<div class='metric-box'><div class='big-num' style='color:#3b82f6'>{int(total_steps)}</div><div class='label'>PAS (Est.)</div></div>", unsafe_allow_html=True)
-        
-        c6.markdown(f"<div class='metric-box'><div class='big-num' style='color:#a855f7'>{rpm_display}</div><div class='label'>RESPIRATION (RPM)</div></div>", unsafe_allow_html=True)
-        
-        st.markdown("<br>", unsafe_allow_html=True)
+    c5.markdown(f"<div class='metric-box'><div class='big-num' style='color:#3b82f6'>{int(total_steps)}</div><div class='label'>PAS (Est.)</div></div>", unsafe_allow_html=True)
+    
+    c6.markdown(f"<div class='metric-box'><div class='big-num' style='color:#a855f7'>{rpm_display}</div><div class='label'>RESPIRATION (RPM)</div></div>", unsafe_allow_html=True)
+    
+    st.markdown("<br>", unsafe_allow_html=True)
+
+
+@profiling.nested_run("dashboard.charts")
+def chart_panel(session_id, end_time):
+    view = session_view(session_id, end_time)
+    if view is None:
+        return
+
+    # Analyse Sommeil
+    if view['sleep_status'] == "SOMMEIL (Détecté)":
+        st.info("😴 Session identifiée comme SOMMEIL (BPM bas & Mouvements faibles)")
         
-        # --- GRAPHIQUE ---
-        st.subheader("📈 Courbe Cardiaque")
-        chart = alt.Chart(df).mark_area(
-            line={'color':'#ff3b30'},
-            color=alt.Gradient(gradient='linear', stops=[alt.GradientStop(color='#ff3b30', offset=0), alt.GradientStop(color='transparent', offset=1)], x1=1, x2=1, y1=1, y2=0)
-        ).encode(
-            x=alt.X('timestamp', axis=alt.Axis(format='%H:%M:%S', title='Heure')),
-            y=alt.Y('bpm', scale=alt.Scale(domain=[40, MAX_HR]), title='BPM'),
-            tooltip=['timestamp', 'bpm', 'steps']
-        ).properties(height=400)
-        st.altair_chart(chart, use_container_width=True)
+        # Hypnogramme
+        if view['hypno_chart'] is not None:
+            with profiling.section("altair"):
+                st.altair_chart(view['hypno_chart'], use_container_width=True)
+
+    # --- GRAPHIQUE ---
+    st.subheader("📈 Courbe Cardiaque")
+    with profiling.section("altair"):
+        st.altair_chart(view['hr_chart'], use_container_width=True)
+
+
+@profiling.nested_run("dashboard.tick")
+def live_tick(session_id, end_time, live_mode, kpi_slot, chart_slot):
+    state = st.session_state
+    now = time.monotonic()
+    if now < state.next_check:
+        return  # Base inchangée depuis un moment : on espace les vérifications
+    version = live.version  # Lue avant les données : un changement pendant le rendu sera vu au tour suivant
+
+    # Liste rafraîchie par l'instantané seulement si la base a changé (signal data_version) :
+    # nouvelle session (START), session close -> rerun complet (barre latérale, bascule en live)
+    if [(s[0], s[2]) for s in live.sessions()] != state.get('sidebar_sessions'):
+        st.rerun()
+
+    if version == state.checked_version:
+        state.idle_wait = min(state.idle_wait * 2, MAX_REFRESH_WAIT)
+    else:
+        state.idle_wait = REFRESH_RATE
+    state.checked_version = version
+    state.next_check = now + state.idle_wait - REFRESH_RATE
+    if session_id is None or (not live_mode and state.kpi_version is not None):
+        return  # Session close / Mode Live coupé : rendue une fois, au rerun complet
+
+    if state.kpi_version != version:
+        with kpi_slot.container():
+            kpi_panel(session_id, end_time)
+        state.kpi_version = version
+    if state.chart_version != version and now - state.chart_at >= CHART_REFRESH:
+        with chart_slot.container():
+            chart_panel(session_id, end_time)
+        state.chart_version, state.chart_at = version, now
+
+
+kpi_slot = chart_slot = None
+if selected_session_id:
+    end_time = end_times.get(selected_session_id)
+    # Emplacements remplis par live_tick (dès son exécution dans ce rerun complet : Streamlit exige qu'un
+    # fragment écrive au moins une fois dans un conteneur extérieur pendant le rerun complet)
+    kpi_slot, chart_slot = st.empty(), st.empty()
+
+    # --- PARCOURS GPS (tracé simplifié, disponible à la clôture : hors fragments) ---
+    from route_index import get_route
+    route = get_route(db, selected_session_id)
+    if route:
+        st.subheader("🗺️ Parcours")
+        st.map(pd.DataFrame(route, columns=['lat', 'lon']), size=3)
 
 else:
+    end_time = None
     st.title("👈 Sélectionnez une session dans la barre latérale")
 
-if auto_refresh:
-    time.sleep(1)
+# Rerun complet : tout est à rendre, le minuteur repart de zéro
+st.session_state.update(kpi_version=None, chart_version=None, chart_at=0.0,
+                        checked_version=None, idle_wait=REFRESH_RATE, next_check=0.0)
+if fragment and watch:
+    live_mode = bool(selected_session_id) and auto_refresh and end_time is None
+    fragment(run_every=REFRESH_RATE)(live_tick)(selected_session_id, end_time, live_mode, kpi_slot, chart_slot)
+elif selected_session_id:
+    with kpi_slot.container():
+        kpi_panel(selected_session_id, end_time)
+    with chart_slot.container():
+        chart_panel(selected_session_id, end_time)
+
+# --- DEBUG PROFILING ---
+if prof:
+    record = profiling.finish_run(prof)
+    history = st.session_state.setdefault('profile_history', [])
+    history.append(record)
+    del history[:-30]
+    with st.expander(f"🐞 Profiling : {record['total_ms']:.0f} ms ce rerun"):
+        sections = dict(record['sections_ms'], autres=record.get('other_ms', 0))
+        st.bar_chart(pd.Series(sections, name="ms"))
+        hist_df = pd.DataFrame([dict(total=r['total_ms'], **r['sections_ms']) for r in history])
+        st.caption(f"Moyenne sur {len(history)} reruns (ms) — détail complet dans {profiling.LOG_PATH}")
+        st.dataframe(hist_df.mean().round(1).rename("ms moyen"))
+        if record.get('top'):
+            st.code("\n".join(record['top']))
+
+if watch and not fragment:
+    # Sans fragments : rerun dès que la base change (signal de l'instantané live), sinon au bout d'une attente qui s'allonge
+    wait = st.session_state.get('refresh_wait', REFRESH_RATE)
+    if live.wait_for_change(rendered_version, timeout=wait):
+        st.session_state.refresh_wait = REFRESH_RATE
+    else:
+        st.session_state.refresh_wait = min(wait * 2, MAX_REFRESH_WAIT)
     st.rerun()
@@ -6,6 +6,7 @@ import datetime
 from bleak import BleakScanner, BleakClient
 from bleak.backends.device import BLEDevice
 from bleak.backends.scanner import AdvertisementData
+from hr_parser import parse_hr_measurement
 
 # UUID Standard pour le service de fréquence cardiaque (Heart Rate Service)
 HEART_RATE_MEASUREMENT_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
@@ -49,14 +50,8 @@ class WhoopLogger:
         Callback appelé par Bleak à chaque notification.
         Parse les données et les enregistre dans le CSV.
         """
-        # Parsing standard BLE Heart Rate (identique au script précédent)
-        flags = data[0]
-        hr_format_uint16 = flags & 0x01
-        
-        if hr_format_uint16:
-            hr_value = int.from_bytes(data[1:3], byteorder='little')
-        else:
-            hr_value = data[1]
+        # Parsing standard BLE Heart Rate (décodeur partagé)
+        hr_value = parse_hr_measurement(data).bpm
 
         # Récupération du timestamp actuel précis
         current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] # Millisecondes
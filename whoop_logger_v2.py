@@ -5,6 +5,7 @@ import datetime
 from bleak import BleakScanner, BleakClient
 from bleak.backends.device import BLEDevice
 from bleak.backends.scanner import AdvertisementData
+from hr_parser import parse_hr_measurement
 
 # UUID Standard pour le service de fréquence cardiaque
 HEART_RATE_MEASUREMENT_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
@@ -38,36 +39,11 @@ class WhoopLoggerV2:
 
     def notification_handler(self, sender, data: bytearray):
         """Décodage complet (BPM + HRV)"""
-        flags = data[0]
-        
-        # Analyse des bits pour savoir ce que contient le paquet
-        hr_format_uint16 = (flags & 0x01) > 0
-        rr_present = (flags & 0x10) > 0
-        
-        offset = 1
-        
-        # 1. Lecture BPM
-        if hr_format_uint16:
-            hr_value = int.from_bytes(data[offset:offset+2], byteorder='little')
-            offset += 2
-        else:
-            hr_value = data[offset]
-            offset += 1
-            
-        # S'il y a des données "Energy Expended", on les saute (2 octets)
-        if (flags & 0x08) > 0:
-            offset += 2
-            
-        # 2. Lecture RR-Intervals (La pépite !)
-        rr_intervals = []
-        if rr_present:
-            while offset + 1 < len(data): # +1 pour éviter débordement
-                rr_val_raw = int.from_bytes(data[offset:offset+2], byteorder='little')
-                # Conversion standard BLE : raw * 1000 / 1024 pour avoir des ms
-                rr_ms = int(rr_val_raw * 1000 / 1024)
-                if rr_ms > 0: # On ignore les 0 parasites
-                    rr_intervals.append(rr_ms)
-                offset += 2
+        # 1 & 2. BPM + RR-Intervals (La pépite !) via le décodeur partagé
+        # (RR convertis en ms : raw * 1000 / 1024, les 0 parasites sont ignorés)
+        measurement = parse_hr_measurement(data)
+        hr_value = measurement.bpm
+        rr_intervals = list(measurement.rr_ms)
 
         # 3. Filtrage intelligent (Anti-Bruit)
         # On n'enregistre que si on a un pouls valide OU des données RR valides
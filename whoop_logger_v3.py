@@ -4,6 +4,8 @@ import csv
 import datetime
 import os
 from bleak import BleakScanner, BleakClient
+from hr_parser import parse_hr_measurement
+from ble_capture import open_capture
 
 # UUIDs Standards
 HEART_RATE_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
@@ -45,29 +47,10 @@ class WhoopLoggerV4:
 
     def hr_handler(self, sender, data: bytearray):
         """Gestionnaire principal (activé à chaque battement)"""
-        flags = data[0]
-        hr_fmt_16 = (flags & 0x01) > 0
-        rr_present = (flags & 0x10) > 0
-        offset = 1
-        
-        # Lecture BPM
-        if hr_fmt_16:
-            hr_val = int.from_bytes(data[offset:offset+2], byteorder='little')
-            offset += 2
-        else:
-            hr_val = data[offset]
-            offset += 1
-            
-        if (flags & 0x08) > 0: offset += 2
-            
-        # Lecture RR
-        rr_intervals = []
-        if rr_present:
-            while offset + 1 < len(data):
-                val = int.from_bytes(data[offset:offset+2], byteorder='little')
-                ms = int(val * 1000 / 1024)
-                if ms > 0: rr_intervals.append(ms)
-                offset += 2
+        # Lecture BPM + RR (décodeur partagé)
+        measurement = parse_hr_measurement(data)
+        hr_val = measurement.bpm
+        rr_intervals = measurement.rr_ms
 
         # Enregistrement (Si BPM valide)
         if hr_val > 0:
@@ -88,6 +71,11 @@ async def run():
     logger = WhoopLoggerV4()
     logger.start()
     
+    # Capture brute optionnelle (rejouable avec replay_capture.py)
+    capture = open_capture(None)
+    hr_cb = capture.wrap(HEART_RATE_UUID, logger.hr_handler) if capture else logger.hr_handler
+    battery_cb = capture.wrap(BATTERY_LEVEL_UUID, logger.battery_handler) if capture else logger.battery_handler
+    
     print("🔍 Recherche du Whoop...")
     target = None
     stop_event = asyncio.Event()
@@ -106,6 +94,7 @@ async def run():
 
     if not target:
         print("❌ Introuvable.")
+        if capture: capture.close()
         return
 
     print(f"🔗 Connexion à {target.name}...")
@@ -124,18 +113,19 @@ async def run():
 
                 # 2. Abonnement aux mises à jour batterie (Notification)
                 try:
-                    await client.start_notify(BATTERY_LEVEL_UUID, logger.battery_handler)
+                    await client.start_notify(BATTERY_LEVEL_UUID, battery_cb)
                 except:
                     print("⚠️ Notifications batterie non supportées, seule la valeur initiale sera utilisée.")
 
                 # 3. Abonnement cardiaque (Le flux principal)
-                await client.start_notify(HEART_RATE_UUID, logger.hr_handler)
+                await client.start_notify(HEART_RATE_UUID, hr_cb)
                 
                 while True: await asyncio.sleep(1)
     except Exception as e:
         print(f"Erreur: {e}")
     finally:
         logger.stop()
+        if capture: capture.close()
 
 if __name__ == "__main__":
     try: asyncio.run(run())
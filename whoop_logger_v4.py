@@ -1,11 +1,19 @@
 
 import asyncio
 import sys
+import os
+import json
+import time
 import datetime
 import yaml # Ajout YAML
 from bleak import BleakScanner, BleakClient
-from database_manager import DatabaseManager
-from gps_tracker import GPSTracker # Ajout GPS
+from hr_parser import parse_hr_measurement
+from ble_capture import open_capture
+from database_manager import DatabaseManager, MeasurementWriter, get_db
+from gps_tracker import GPSTracker, TrackRecorder # Ajout GPS
+import metrics
+# retention_manager, parquet_archive (pyarrow + pandas, ~0.4 s) et route_index ne servent qu'à l'arrêt :
+# importés dans stop() / run_multi() pour que le logger soit connecté au plus vite après un redémarrage
 
 # Chargement de la config
 try:
@@ -15,18 +23,89 @@ except Exception as e:
     print(f"⚠️ Erreur lecture config.yaml: {e}")
     CONFIG = {"device": {"name_filter": "whoop"}, "user": {"height": 175}}
 
+# GPS désactivable (config.yaml -> gps: {enabled: false}) : évite aussi le chargement de PyObjC
+GPS_ENABLED = (CONFIG.get('gps', {}) or {}).get('enabled', True)
+
+# Export des métriques vers SQLite (config.yaml -> metrics: {sqlite: true, interval: 15})
+METRICS_CONFIG = CONFIG.get('metrics', {}) or {}
+
 # UUIDs Standards
 HEART_RATE_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
 BATTERY_LEVEL_UUID = "00002a19-0000-1000-8000-00805f9b34fb"
 
+# Reconnexion : attente doublée à chaque échec, entre BACKOFF_MIN et BACKOFF_MAX secondes
+BACKOFF_MIN = 1.0
+BACKOFF_MAX = 30.0
+# Après N échecs de connexion directe à l'adresse en cache, on revient au scan par nom
+REDISCOVER_AFTER = 3
+CONNECT_TIMEOUT = 10.0
+
+# Dernier bracelet connecté (adresse + services GATT utiles) : connexion directe au démarrage
+DEVICE_CACHE = (CONFIG.get('device', {}) or {}).get('cache_file', 'device_cache.json')
+
+
+def load_cached_device() -> dict:
+    try:
+        with open(DEVICE_CACHE, "r") as f:
+            cached = json.load(f)
+        return cached if cached.get('address') else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cached_device(address: str, name: str, services: list):
+    try:
+        with open(DEVICE_CACHE + ".tmp", "w") as f:
+            json.dump({"address": address, "name": name, "services": services,
+                       "updated_at": datetime.datetime.now().isoformat(timespec="seconds")}, f, indent=1)
+        os.replace(DEVICE_CACHE + ".tmp", DEVICE_CACHE)
+    except OSError as e:
+        print(f"⚠️ Cache bracelet : {e}")
+
+
+async def find_device(timeout: float = 10.0):
+    """Premier bracelet dont le nom contient device.name_filter (None si rien en `timeout` s)"""
+    name_filter = CONFIG['device']['name_filter'].lower()
+    print(f"🔍 Recherche du Whoop (Filtre: '{name_filter}')...")
+    target = None
+    found = asyncio.Event()
+
+    def detection_callback(dev, adv):
+        nonlocal target
+        if dev.name and name_filter in dev.name.lower():
+            target = dev
+            found.set()
+
+    scanner = BleakScanner(detection_callback)
+    await scanner.start()
+    try: await asyncio.wait_for(found.wait(), timeout=timeout)
+    except asyncio.TimeoutError: pass
+    await scanner.stop()
+    return target
+
 class WhoopLoggerV4:
-    def __init__(self):
+    def __init__(self, db: DatabaseManager = None, writer: MeasurementWriter = None,
+                 gps: GPSTracker = None, device_name: str = "Whoop 4.0", archive_dir: str = None):
         # Initialisation DB
-        self.db = DatabaseManager()
-        self.gps = GPSTracker() # GPS
+        self.db = db or get_db()
+        # Dossier de l'archive Parquet (None = archive.path de config.yaml)
+        self.archive_dir = archive_dir
+        # writer / gps fournis = partagés entre plusieurs bracelets (mode multi) : on ne les ferme pas
+        self.owns_writer = writer is None
+        self.owns_gps = gps is None
+        # Écriture groupée (config.yaml -> storage: {batch_size, flush_interval}). 1 = commit par battement
+        storage = CONFIG.get('storage', {}) or {}
+        self.writer = writer or MeasurementWriter(
+            self.db,
+            batch_size=storage.get('batch_size', 1),
+            flush_interval=storage.get('flush_interval', 1.0),
+        )
+        self.gps = gps or GPSTracker(enabled=GPS_ENABLED) # GPS
         self.current_battery = 0
         self.session_id = None
-        self.last_gps_coords = None
+        self.device_name = device_name
+        self.track = None               # TrackRecorder (GPS échantillonné hors du handler)
+        self.steps_distance_m = 0.0     # Distance GPS déjà convertie en pas
         
         # Longueur de foulée (Estimation : Taille * 0.415)
         user_height_cm = CONFIG.get('user', {}).get('height', 175)
@@ -35,18 +114,64 @@ class WhoopLoggerV4:
     def start(self):
         # Création d'une nouvelle session en DB
         try:
-            self.session_id = self.db.create_session(device_name="Whoop 4.0")
-            print(f"🗄️  Session créée en base de données (ID: {self.session_id})")
-            self.gps.start()
+            self.session_id = self.db.create_session(device_name=self.device_name)
+            print(f"🗄️  Session créée en base de données (ID: {self.session_id}, {self.device_name})")
+            if self.owns_gps:
+                self.gps.start()
+                # Bracelet unique : la trace GPS appartient à cette session (en mode multi, le GPS du PC ne dit rien des bracelets)
+                gps_cfg = CONFIG.get('gps', {}) or {}
+                self.track = TrackRecorder(self.db, self.gps, self.session_id,
+                                           interval=gps_cfg.get('interval', 1.0), flush_every=gps_cfg.get('batch_size', 5))
         except Exception as e:
             print(f"❌ Erreur DB : {e}")
             sys.exit(1)
 
-    def stop(self):
+    def stop(self, maintenance: bool = True):
+        """maintenance=False : pas de rétention ni d'export métriques (fait une seule fois par run_multi)"""
+        try:
+            if self.owns_writer: self.writer.close()
+            else: self.writer.flush()
+        except Exception as e: print(f"⚠️ Erreur flush DB : {e}")
+        if self.track:
+            try: self.track.flush()
+            except Exception as e: print(f"⚠️ Erreur écriture trace GPS : {e}")
         if self.session_id:
+            from retention_manager import apply_retention
+            from parquet_archive import export_session, ARCHIVE_DIR
+            from route_index import simplify_session
+            from session_features import get_session_features
             self.db.end_session(self.session_id)
             print(f"🏁 Session {self.session_id} clôturée.")
-            self.gps.stop()
+            if self.owns_gps: self.gps.stop()
+            # Tracé simplifié + index spatial (recherche de sessions par zone, carte)
+            if self.track and self.track.last_point:
+                try: simplify_session(self.db, self.session_id)
+                except Exception as e: print(f"⚠️ Erreur simplification trace : {e}")
+            # Indicateurs dérivés persistés (dashboard / API rapides dès le premier affichage)
+            try: get_session_features(self.session_id, self.db)
+            except Exception as e: print(f"⚠️ Erreur calcul indicateurs : {e}")
+            # Archive Parquet de la session complète (avant que la rétention n'agrège le brut)
+            try: export_session(self.session_id, self.db, self.archive_dir or ARCHIVE_DIR)
+            except Exception as e: print(f"⚠️ Erreur archive Parquet : {e}")
+            # Rétention : agrégation des vieilles mesures (hors du chemin d'enregistrement)
+            if maintenance:
+                try: apply_retention(self.db)
+                except Exception as e: print(f"⚠️ Erreur rétention : {e}")
+        if maintenance:
+            self.export_metrics()
+
+    def export_metrics(self):
+        """Dernier instantané des métriques dans la table SQLite (réexposé par whoop_api /metrics)"""
+        if not METRICS_CONFIG.get('sqlite', True):
+            return
+        try: metrics.export_to_sqlite(self.db, "logger")
+        except Exception as e: print(f"⚠️ Erreur export métriques : {e}")
+
+    async def metrics_loop(self):
+        interval = METRICS_CONFIG.get('interval', 15)
+        while True:
+            await asyncio.sleep(interval)
+            self.export_metrics()
 
     def battery_handler(self, sender, data: bytearray):
         """Met à jour la variable batterie"""
@@ -56,49 +181,27 @@ class WhoopLoggerV4:
 
     def hr_handler(self, sender, data: bytearray):
         """Gestionnaire principal (activé à chaque battement)"""
-        flags = data[0]
-        hr_fmt_16 = (flags & 0x01) > 0
-        rr_present = (flags & 0x10) > 0
-        offset = 1
-        
-        # Lecture BPM
-        if hr_fmt_16:
-            hr_val = int.from_bytes(data[offset:offset+2], byteorder='little')
-            offset += 2
-        else:
-            hr_val = data[offset]
-            offset += 1
-            
-        if (flags & 0x08) > 0: offset += 2
-            
-        # Lecture RR
-        rr_intervals = []
-        if rr_present:
-            while offset + 1 < len(data):
-                val = int.from_bytes(data[offset:offset+2], byteorder='little')
-                ms = int(val * 1000 / 1024)
-                if ms > 0: rr_intervals.append(ms)
-                offset += 2
+        received = time.perf_counter()
+        metrics.BEATS_RECEIVED.inc(device=self.device_name)
+        # Lecture BPM + RR (décodeur partagé)
+        try:
+            measurement = parse_hr_measurement(data)
+        except (ValueError, IndexError):
+            metrics.BEATS_DROPPED.inc(reason="parse")
+            return
+        hr_val = measurement.bpm
+        rr_intervals = measurement.rr_ms
 
         # Estimation Pas V3 (Hybride : GPS + Cardio)
         steps_increment = 0
         
-        # 1. Essai GPS (Prioritaire pour la distance réelle)
-        current_loc = self.gps.get_current_location()
-        gps_distance = 0
-        if self.last_gps_coords and current_loc:
-            gps_distance = self.gps.calculate_distance(self.last_gps_coords, current_loc)
-        
-        # Mise à jour coordonnées (si valide)
-        if current_loc: self.last_gps_coords = current_loc
-        
-        # Si on a parcouru une distance significative (> 5m pour filtrer le jitter GPS)
-        # On ne veut pas compter des pas si on est assis dans un train (vitesse trop grande ?)
-        # Ici on fait simple : Distance / Foulée
-        if gps_distance > 5.0:
-            gps_steps = int(gps_distance / self.stride_length_m)
-            steps_increment = gps_steps
-            # print(f"📍 GPS Mouvement: {gps_distance:.1f}m -> {gps_steps} pas")
+        # 1. GPS (Prioritaire pour la distance réelle) : distance cumulée par la tâche TrackRecorder,
+        # ici une simple soustraction. Le reste (< 1 foulée) est gardé pour le battement suivant.
+        track = self.track
+        if track and track.is_moving():
+            gps_distance = track.distance_m - self.steps_distance_m
+            steps_increment = int(gps_distance / self.stride_length_m)
+            self.steps_distance_m += steps_increment * self.stride_length_m
         else:
             # 2. Fallback Cardio (Tapis de course / Intérieur)
             # On augmente le seuil pour éviter les faux positifs assis
@@ -116,69 +219,252 @@ class WhoopLoggerV4:
                  if steps_per_sec > 0.5 and steps_increment == 0: steps_increment = 1
 
         # Enregistrement en DB
-        if hr_val > 0 and self.session_id:
+        if hr_val <= 0:
+            metrics.BEATS_DROPPED.inc(reason="no_bpm")
+        elif self.session_id:
             rr_str = ";".join(map(str, rr_intervals))
             
             try:
-                self.db.insert_measurement(
+                self.writer.add(
                     session_id=self.session_id,
                     bpm=hr_val,
                     rr_str=rr_str,
                     battery=self.current_battery,
-                    steps=steps_increment
+                    steps=steps_increment,
+                    received=received
                 )
             except Exception as e:
                 print(f"⚠️ Erreur insert DB: {e}")
 
-async def run():
-    logger = WhoopLoggerV4()
-    logger.start()
-    
-    print(f"🔍 Recherche du Whoop (Filtre: '{CONFIG['device']['name_filter']}')...")
-    target = None
+async def _wait_any(*events: asyncio.Event):
+    """Attend qu'au moins un des événements soit levé"""
+    tasks = [asyncio.create_task(e.wait()) for e in events]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for t in tasks: t.cancel()
+
+
+class DeviceLink:
+    """
+    Connexion d'un bracelet avec son état de reconnexion.
+    À chaque déconnexion on se reconnecte (backoff exponentiel) en gardant la même session.
+    """
+    def __init__(self, target, logger: WhoopLoggerV4, hr_cb=None, battery_cb=None, services=None,
+                 rediscover=None, remember: bool = False, started_at: float = None):
+        self.target = target            # BLEDevice ou adresse (connexion directe)
+        self.logger = logger
+        self._hr_cb = hr_cb or logger.hr_handler
+        self.battery_cb = battery_cb or logger.battery_handler
+        self.services = services        # UUIDs de services à découvrir (None = tous)
+        self.rediscover = rediscover    # coroutine -> nouveau target si l'adresse ne répond plus
+        self.remember = remember        # mémorise adresse + services après connexion
+        self.status = "idle"
+        self.reconnects = 0
+        self.failures = 0
+        self.backoff = BACKOFF_MIN
+        self.last_error = None
+        # Début de l'attente du prochain battement (démarrage ou coupure) -> temps jusqu'au 1er battement
+        self.waiting_since = started_at
+
+    def hr_cb(self, sender, data: bytearray):
+        if self.waiting_since is not None:
+            delay = time.monotonic() - self.waiting_since
+            self.waiting_since = None
+            metrics.TIME_TO_FIRST_BEAT.observe(delay)
+            print(f"⏱️  {self.name} : premier battement après {delay:.1f}s")
+        return self._hr_cb(sender, data)
+
+    def remember_device(self, client: BleakClient):
+        # Seuls les services qui portent nos caractéristiques : découverte GATT minimale au prochain démarrage
+        wanted = {HEART_RATE_UUID, BATTERY_LEVEL_UUID}
+        services = [svc.uuid for svc in client.services
+                    if any(char.uuid in wanted for char in svc.characteristics)]
+        name = getattr(self.target, 'name', None) or load_cached_device().get('name')
+        save_cached_device(client.address, name, services)
+
+    @property
+    def name(self) -> str:
+        return self.logger.device_name
+
+    async def subscribe(self, client: BleakClient):
+        # Batterie
+        try:
+            await client.start_notify(BATTERY_LEVEL_UUID, self.battery_cb)
+            # Lecture initiale forcée
+            batt = await client.read_gatt_char(BATTERY_LEVEL_UUID)
+            self.logger.current_battery = int(batt[0])
+        except Exception: pass
+        # Heart Rate
+        await client.start_notify(HEART_RATE_UUID, self.hr_cb)
+
+    async def run(self, stop_event: asyncio.Event):
+        if self.waiting_since is None:
+            self.waiting_since = time.monotonic()
+        while not stop_event.is_set():
+            disconnected = asyncio.Event()
+            self.status = "connecting"
+            try:
+                async with BleakClient(self.target, disconnected_callback=lambda _: disconnected.set(),
+                                       services=self.services, timeout=CONNECT_TIMEOUT) as client:
+                    await self.subscribe(client)
+                    self.status = "connected"
+                    self.backoff = BACKOFF_MIN
+                    self.failures = 0
+                    metrics.DEVICES_CONNECTED.inc()
+                    print(f"✅ {self.name} connecté (session {self.logger.session_id})")
+                    if self.remember:
+                        self.remember_device(client)
+                    try:
+                        await _wait_any(disconnected, stop_event)
+                    finally:
+                        metrics.DEVICES_CONNECTED.dec()
+                        if self.waiting_since is None:
+                            self.waiting_since = time.monotonic()
+            except Exception as e:
+                self.last_error = str(e)
+                self.failures += 1
+                print(f"⚠️ {self.name} : {e}")
+            if stop_event.is_set():
+                break
+            if self.rediscover and self.failures >= REDISCOVER_AFTER:
+                # Adresse en cache obsolète (bracelet changé, adresse privée renouvelée...) : scan par nom
+                target = await self.rediscover()
+                if target is not None:
+                    self.target, self.services, self.failures = target, None, 0
+                    continue
+            self.status = "reconnecting"
+            self.reconnects += 1
+            metrics.RECONNECTS.inc(device=self.name)
+            print(f"🔄 {self.name} déconnecté, nouvel essai dans {self.backoff:.0f}s")
+            try: await asyncio.wait_for(stop_event.wait(), timeout=self.backoff)
+            except asyncio.TimeoutError: pass
+            self.backoff = min(self.backoff * 2, BACKOFF_MAX)
+        self.status = "stopped"
+
+
+async def flush_loop(writer: MeasurementWriter):
+    """
+    Le writer ne flushe qu'à l'ajout d'une mesure : bracelet silencieux, déconnecté ou en backoff de
+    reconnexion = lot en attente non commité. On force l'intervalle ici (dashboard, synchro, crash).
+    """
+    while True:
+        await asyncio.sleep(writer.flush_interval)
+        try: writer.flush()
+        except Exception as e: print(f"⚠️ Erreur flush DB : {e}")
+
+
+async def run_multi():
+    """
+    Mode équipe : tous les bracelets correspondant au filtre, sur une seule boucle asyncio.
+    Une session par bracelet, un seul MeasurementWriter (une connexion SQLite) partagé,
+    un re-scan périodique pour les bracelets arrivés en retard.
+    """
+    device_cfg = CONFIG.get('device', {}) or {}
+    name_filter = device_cfg.get('name_filter', 'whoop').lower()
+    scan_timeout = device_cfg.get('scan_timeout', 10.0)
+    rescan_interval = device_cfg.get('rescan_interval', 60.0)
+    max_devices = device_cfg.get('max_devices', 12)
+    storage = CONFIG.get('storage', {}) or {}
+
+    db = get_db()
+    writer = MeasurementWriter(db, batch_size=storage.get('batch_size', 1),
+                               flush_interval=storage.get('flush_interval', 1.0))
+    gps = GPSTracker(enabled=GPS_ENABLED)
+    gps.start()
     stop_event = asyncio.Event()
+    links = {}  # adresse -> (DeviceLink, tâche)
+    captures = []  # Capture brute optionnelle : un fichier par bracelet (rejouable avec replay_capture.py)
 
-    def detection_callback(dev, adv):
-        nonlocal target
-        # Utilisation du nom défini dans la config
-        target_name_filter = CONFIG['device']['name_filter'].lower()
-        if dev.name and target_name_filter in dev.name.lower():
-            target = dev
-            stop_event.set()
+    async def discover():
+        print(f"🔍 Recherche des bracelets (Filtre: '{name_filter}', max {max_devices})...")
+        devices = await BleakScanner.discover(timeout=scan_timeout)
+        for dev in devices:
+            if len(links) >= max_devices: break
+            if not dev.name or name_filter not in dev.name.lower() or dev.address in links: continue
+            logger = WhoopLoggerV4(db=db, writer=writer, gps=gps, device_name=f"{dev.name} [{dev.address}]")
+            logger.start()
+            capture = open_capture(CONFIG, label=dev.address)
+            if capture:
+                captures.append(capture)
+                link = DeviceLink(dev, logger, capture.wrap(HEART_RATE_UUID, logger.hr_handler),
+                                  capture.wrap(BATTERY_LEVEL_UUID, logger.battery_handler))
+            else:
+                link = DeviceLink(dev, logger)
+            links[dev.address] = (link, asyncio.create_task(link.run(stop_event)))
+        print(f"📡 {len(links)} bracelet(s) suivi(s)")
 
-    scanner = BleakScanner(detection_callback)
-    await scanner.start()
-    try: await asyncio.wait_for(stop_event.wait(), timeout=10.0)
-    except asyncio.TimeoutError: pass
-    await scanner.stop()
+    background = [asyncio.create_task(flush_loop(writer))]
+    if METRICS_CONFIG.get('sqlite', True):
+        async def metrics_loop():
+            while True:
+                await asyncio.sleep(METRICS_CONFIG.get('interval', 15))
+                try: metrics.export_to_sqlite(db, "logger")
+                except Exception as e: print(f"⚠️ Erreur export métriques : {e}")
+        background.append(asyncio.create_task(metrics_loop()))
+    try:
+        while True:
+            if len(links) < max_devices:
+                await discover()
+            await asyncio.sleep(rescan_interval)
+    finally:
+        stop_event.set()
+        for t in background: t.cancel()
+        await asyncio.gather(*(task for _, task in links.values()), return_exceptions=True)
+        for link, _ in links.values():
+            link.logger.stop(maintenance=False)
+        for capture in captures: capture.close()
+        writer.close()
+        gps.stop()
+        from retention_manager import apply_retention
+        try: apply_retention(db)
+        except Exception as e: print(f"⚠️ Erreur rétention : {e}")
+        try: metrics.export_to_sqlite(db, "logger")
+        except Exception as e: print(f"⚠️ Erreur export métriques : {e}")
 
-    if not target:
-        print("❌ Introuvable.")
-        return
+async def run():
+    started_at = time.monotonic()
+    logger = WhoopLoggerV4()
+    logger.start()
+    
+    # Capture brute optionnelle (rejouable avec replay_capture.py)
+    capture = open_capture(CONFIG)
+    hr_cb = capture.wrap(HEART_RATE_UUID, logger.hr_handler) if capture else logger.hr_handler
+    battery_cb = capture.wrap(BATTERY_LEVEL_UUID, logger.battery_handler) if capture else logger.battery_handler
+    
+    # Connexion directe au dernier bracelet connu (pas de scan de 10 s), sinon scan par nom
+    cached = load_cached_device()
+    if cached:
+        target = cached['address']
+        print(f"⚡ Connexion directe à {cached.get('name') or target} ({target})")
+    else:
+        target = await find_device()
+        if not target:
+            print("❌ Introuvable.")
+            logger.stop()
+            if capture: capture.close()
+            return
+        print(f"🔗 Connexion à {target.name}...")
 
-    print(f"🔗 Connexion à {target.name}...")
+    link = DeviceLink(target, logger, hr_cb, battery_cb, services=cached.get('services'),
+                      rediscover=find_device, remember=True, started_at=started_at)
+    stop_event = asyncio.Event()
+    background = [asyncio.create_task(logger.metrics_loop()), asyncio.create_task(flush_loop(logger.writer))]
+    if logger.track:
+        background.append(asyncio.create_task(logger.track.run()))
     try:
-        async with BleakClient(target) as client:
-            if client.is_connected:
-                print("✅ Connecté ! Enregistrement SQL actif.")
-                
-                # Batterie
-                try:
-                    await client.start_notify(BATTERY_LEVEL_UUID, logger.battery_handler)
-                    # Lecture initiale forcée
-                    batt = await client.read_gatt_char(BATTERY_LEVEL_UUID)
-                    logger.current_battery = int(batt[0])
-                except: pass
-
-                # Heart Rate
-                await client.start_notify(HEART_RATE_UUID, logger.hr_handler)
-                
-                while True: await asyncio.sleep(1)
+        # Reconnexion automatique (backoff exponentiel) dans la même session
+        await link.run(stop_event)
     except Exception as e:
         print(f"Erreur: {e}")
     finally:
+        stop_event.set()
+        for t in background: t.cancel()
         logger.stop()
+        if capture: capture.close()
 
 if __name__ == "__main__":
-    try: asyncio.run(run())
+    # --multi (ou device.multi dans config.yaml) : plusieurs bracelets dans ce process
+    multi = "--multi" in sys.argv or (CONFIG.get('device', {}) or {}).get('multi', False)
+    try: asyncio.run(run_multi() if multi else run())
     except KeyboardInterrupt: pass
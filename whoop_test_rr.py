@@ -4,6 +4,7 @@ import sys
 from bleak import BleakScanner, BleakClient
 from bleak.backends.device import BLEDevice
 from bleak.backends.scanner import AdvertisementData
+from hr_parser import parse_hr_measurement, RR_PRESENT
 
 # UUID Standard Heart Rate
 HEART_RATE_MEASUREMENT_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
@@ -12,43 +13,13 @@ def rr_notification_handler(sender, data: bytearray):
     """
     Callback avancé pour analyser les flags et extraire les RR-Intervals.
     """
-    flags = data[0]
-    
-    # Analyse des bits
-    hr_format_uint16 = (flags & 0x01) > 0       # Bit 0
-    energy_present = (flags & 0x08) > 0         # Bit 3
-    rr_present = (flags & 0x10) > 0             # Bit 4 (0x10 = 16)
-    
-    # Calcul de l'offset pour sauter les données déjà connues
-    offset = 1 # On a lu le flag
-    
-    # Lecture de la HR
-    if hr_format_uint16:
-        hr_val = int.from_bytes(data[offset:offset+2], byteorder='little')
-        offset += 2
-    else:
-        hr_val = data[offset]
-        offset += 1
-        
-    # Skip Energy Expended si présent
-    if energy_present:
-        offset += 2
+    # Décodage partagé : flags, HR (uint8/uint16), Energy Expended, RR (1/1024 s -> ms)
+    measurement = parse_hr_measurement(data)
+    hr_val = measurement.bpm
         
-    # Vérification RR-Intervals
-    if rr_present:
-        rr_intervals = []
-        # On lit tant qu'il reste des données
-        while offset < len(data):
-            # Les RR-Intervals sont toujours uint16 (résolution 1/1024 seconde)
-            if offset + 2 <= len(data):
-                rr_val = int.from_bytes(data[offset:offset+2], byteorder='little')
-                # Conversion en millisecondes pour affichage (val * 1000 / 1024)
-                rr_ms = int(rr_val * 1000 / 1024)
-                rr_intervals.append(rr_ms)
-                offset += 2
-            else:
-                break
-                
+    # Vérification RR-Intervals (Bit 4)
+    if measurement.flags & RR_PRESENT:
+        rr_intervals = list(measurement.rr_ms)
         print(f"❤️ BPM: {hr_val} | ✅ RR-Intervals détectés : {rr_intervals} ms")
     else:
         print(f"❤️ BPM: {hr_val} | ❌ Pas de RR-Intervals (Bit 4 = 0)")
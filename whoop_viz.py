@@ -2,9 +2,11 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+import numpy as np
 import glob
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 # ==========================================
 # CONFIGURATION
@@ -27,65 +29,180 @@ def get_latest_csv():
         return None
     return max(list_of_files, key=os.path.getctime)
 
-def calculate_zones(df):
-    """Calcule la zone pour chaque point et le temps passé par zone."""
-    
-    def get_zone(bpm):
-        pct = bpm / MAX_HR
-        if pct < 0.50: return 'Hors Zone'
-        if pct < 0.60: return 'Zone 1'
-        if pct < 0.70: return 'Zone 2'
-        if pct < 0.80: return 'Zone 3'
-        if pct < 0.90: return 'Zone 4'
-        return 'Zone 5'
-
-    # Attribution de la zone pour chaque ligne
-    df['Zone'] = df['BPM'].apply(get_zone)
-    
-    # Calcul du temps écoulé entre chaque point
-    # On calcule la différence avec le point SUIVANT pour savoir combien de temps
-    # on est resté à cette valeur de BPM.
-    df['Duration_Sec'] = df['Timestamp'].diff().shift(-1).dt.total_seconds()
-    
-    # Pour la dernière ligne, on assume la médiane des intervalles précédents ou 1s par défaut
-    median_interval = df['Duration_Sec'].median()
-    if pd.isna(median_interval): median_interval = 1.0
-    df.fillna({'Duration_Sec': median_interval}, inplace=True)
-    
-    return df
+def load_session_file(filename):
+    """CSV des anciens loggers, ou fichier de session de l'archive Parquet (colonnes utiles seules)"""
+    if filename.endswith('.parquet'):
+        df = pd.read_parquet(filename, columns=['timestamp', 'bpm'], memory_map=True)
+        return df.rename(columns={'timestamp': 'Timestamp', 'bpm': 'BPM'})
+    return pd.read_csv(filename, skipinitialspace=True)
+
+def load_archived_session(session_id, archive_dir=None):
+    """Session de l'archive Parquet par ID (un seul fichier lu, trié par timestamp), None si non archivée"""
+    from parquet_archive import read_session, ARCHIVE_DIR
+    df = read_session(session_id, columns=['timestamp', 'bpm'], archive_dir=archive_dir or ARCHIVE_DIR)
+    if df is None:
+        return None
+    return df.rename(columns={'timestamp': 'Timestamp', 'bpm': 'BPM'})
+
+# Bornes des zones en BPM (np.digitize) : index 0 = Hors Zone, 1..5 = Zone 1..5
+ZONE_LABELS = ['Hors Zone'] + list(ZONES_CONFIG.keys())
+ZONE_EDGES = np.array([low for low, _, _ in ZONES_CONFIG.values()]) * MAX_HR
+
+CHUNK_ROWS = 200_000        # Lignes lues par bloc pour les gros fichiers
+PLOT_RESOLUTION = '5s'      # Pas de la courbe affichée (moyenne par tranche)
+
+def zone_index(bpm):
+    """Index de zone vectorisé pour un tableau de BPM"""
+    return np.digitize(np.asarray(bpm, dtype=float), ZONE_EDGES)
+
+def iter_session_chunks(filename, chunksize=CHUNK_ROWS):
+    """
+    Blocs (Timestamp, BPM) d'un CSV ou d'un fichier Parquet, sans tout charger en mémoire.
+    Un entier est un ID de session de l'archive (cf. load_archived_session).
+    Les blocs doivent se suivre dans le temps : les écarts entre points comptent comme temps en zone.
+    """
+    if isinstance(filename, int):
+        df = load_archived_session(filename)
+        if df is not None:
+            yield df
+    elif filename.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(filename, memory_map=True).iter_batches(batch_size=chunksize, columns=['timestamp', 'bpm']):
+            yield batch.to_pandas().rename(columns={'timestamp': 'Timestamp', 'bpm': 'BPM'})
+    else:
+        for chunk in pd.read_csv(filename, skipinitialspace=True, usecols=['Timestamp', 'BPM'], chunksize=chunksize):
+            chunk['Timestamp'] = pd.to_datetime(chunk['Timestamp'])
+            yield chunk
+
+def summarize_file(filename, with_series=True, chunksize=CHUNK_ROWS):
+    """
+    Stats + temps par zone d'un fichier, bloc par bloc.
+    La durée d'un point est l'écart avec le point suivant, y compris à cheval sur deux blocs.
+    """
+    zone_seconds = np.zeros(len(ZONE_LABELS))
+    n_points, bpm_sum = 0, 0.0
+    t_min = t_max = None
+    prev_ts, prev_zone = None, None
+    last_intervals = None
+    series = []
+
+    for chunk in iter_session_chunks(filename, chunksize):
+        chunk = chunk.dropna(subset=['Timestamp', 'BPM'])
+        if chunk.empty: continue
+        ts = chunk['Timestamp'].to_numpy()
+        bpm = chunk['BPM'].to_numpy()
+        zones = zone_index(bpm)
+
+        # Point en attente du bloc précédent
+        if prev_ts is not None:
+            zone_seconds[prev_zone] += (ts[0] - prev_ts) / np.timedelta64(1, 's')
+
+        intervals = np.diff(ts) / np.timedelta64(1, 's')
+        np.add.at(zone_seconds, zones[:-1], intervals)
+        if len(intervals): last_intervals = intervals
+        prev_ts, prev_zone = ts[-1], zones[-1]
+
+        n_points += len(bpm)
+        bpm_sum += float(bpm.sum())
+        t_min = ts[0] if t_min is None else min(t_min, ts[0])
+        t_max = ts[-1] if t_max is None else max(t_max, ts[-1])
+        if with_series:
+            series.append(chunk.groupby(chunk['Timestamp'].dt.floor(PLOT_RESOLUTION))['BPM'].mean())
+
+    if n_points == 0:
+        return None
+
+    # Dernier point : médiane des intervalles ou 1s par défaut
+    median_interval = float(np.median(last_intervals)) if last_intervals is not None else 1.0
+    zone_seconds[prev_zone] += median_interval
+
+    summary = {
+        'file': filename if not isinstance(filename, int) else f"session_{filename}",
+        'points': n_points,
+        'start': pd.Timestamp(t_min),
+        'duration': pd.Timestamp(t_max) - pd.Timestamp(t_min),
+        'avg_bpm': bpm_sum / n_points,
+        'zone_seconds': dict(zip(ZONE_LABELS, zone_seconds.tolist())),
+    }
+    if with_series:
+        merged = pd.concat(series)
+        summary['series'] = merged.groupby(level=0).mean()
+    return summary
+
+def zone_stats_frame(zone_seconds):
+    """Table Zone / Duration_Sec / Minutes (toutes les zones, même à 0)"""
+    all_zones = list(ZONES_CONFIG.keys())
+    zone_stats = pd.DataFrame({'Zone': all_zones, 'Duration_Sec': [zone_seconds.get(z, 0.0) for z in all_zones]})
+    zone_stats['Minutes'] = zone_stats['Duration_Sec'] / 60
+    return zone_stats
+
+def _summarize_for_batch(filename):
+    try:
+        return summarize_file(filename, with_series=False)
+    except Exception as e:
+        print(f"❌ {filename} : {e}")
+        return None
+
+def analyze_directory(directory, output="zone_times.csv", workers=None):
+    """
+    Mode batch : analyse tous les fichiers d'un dossier et de ses sous-dossiers en parallèle
+    (archive Parquet comprise : un fichier par session dans date=YYYY-MM-DD/) et écrit un tableau combiné
+    """
+    files = sorted(glob.glob(os.path.join(directory, '**', '*.csv'), recursive=True)
+                   + glob.glob(os.path.join(directory, '**', '*.parquet'), recursive=True))
+    if not files:
+        print(f"⚠️  Aucun fichier dans {directory}")
+        return None
+
+    print(f"📂 Analyse de {len(files)} fichiers ({directory})...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        summaries = [s for s in pool.map(_summarize_for_batch, files) if s]
+
+    if not summaries:
+        print(f"⚠️  Aucun fichier exploitable dans {directory}")
+        return None
+
+    rows = []
+    for s in summaries:
+        row = {'file': os.path.relpath(s['file'], directory), 'start': s['start'],
+               'duration_min': s['duration'].total_seconds() / 60, 'avg_bpm': round(s['avg_bpm'], 1)}
+        for zone in ZONE_LABELS:
+            row[f"{zone} (min)"] = round(s['zone_seconds'][zone] / 60, 2)
+        rows.append(row)
+
+    table = pd.DataFrame(rows).sort_values('start')
+    total = table.drop(columns=['file', 'start']).sum(numeric_only=True)
+    total['avg_bpm'] = round(table['avg_bpm'].mean(), 1)
+    table = pd.concat([table, pd.DataFrame([{'file': 'TOTAL', **total.to_dict()}])], ignore_index=True)
+    table.to_csv(output, index=False)
+
+    print(f"\n📊 Temps total par Zone ({len(summaries)} sessions) :")
+    for zone in ZONES_CONFIG:
+        print(f"   {zone}: {total[f'{zone} (min)']:.1f} min")
+    print(f"💾 Tableau combiné : {output}")
+    return table
 
 def analyze_session(filename):
     print(f"📊 Analyse du fichier : {filename}")
-    
+    if not isinstance(filename, int) and os.path.isdir(filename):
+        print("⚠️  Dossier : utiliser --batch (un résultat par fichier) ou --session ID pour une session archivée.")
+        return
+
     try:
-        # Chargement des données
-        df = pd.read_csv(filename, skipinitialspace=True)
-        
-        if 'Timestamp' not in df.columns or 'BPM' not in df.columns:
-            print("❌ Erreur: Colonnes manquantes.")
+        # Lecture par blocs : stats et zones sans charger tout le fichier
+        summary = summarize_file(filename)
+        if summary is None:
+            print("❌ Erreur: Fichier vide ou session non archivée.")
             return
 
-        df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-        
-        # 1. Calcul des Zones
-        df = calculate_zones(df)
-
         # 2. Stats globales
-        duration = df['Timestamp'].max() - df['Timestamp'].min()
         print("\n📈 Statistiques de la session :")
-        print(f"   ⏱️  Durée : {duration}")
-        print(f"   💓 Moyenne : {df['BPM'].mean():.1f} BPM")
+        print(f"   ⏱️  Durée : {summary['duration']}")
+        print(f"   💓 Moyenne : {summary['avg_bpm']:.1f} BPM")
         print(f"   🔥 Max HR configurée : {MAX_HR} BPM")
 
         # 3. Stats par Zone
-        # Group by Zone et somme des durées
-        zone_stats = df.groupby('Zone')['Duration_Sec'].sum().reset_index()
-        
-        # On s'ure que toutes les zones sont présentes même si temps = 0
-        all_zones = list(ZONES_CONFIG.keys())
-        zone_stats = zone_stats.set_index('Zone').reindex(all_zones).fillna(0).reset_index()
-        
-        zone_stats['Minutes'] = zone_stats['Duration_Sec'] / 60
+        zone_stats = zone_stats_frame(summary['zone_seconds'])
         
         print("\n📊 Temps passé par Zone :")
         for _, row in zone_stats.iterrows():
@@ -93,6 +210,8 @@ def analyze_session(filename):
             minutes = row['Minutes']
             print(f"   {z_name}: {minutes:.1f} min")
 
+        series = summary['series']
+
         # 4. Visualisation (Dashboard)
         plt.style.use('dark_background') # Style plus "Sport/Tech"
         fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10), gridspec_kw={'height_ratios': [2, 1]})
@@ -101,12 +220,9 @@ def analyze_session(filename):
         # --- Graph 1 : Courbe BPM ---
         # On peut colorer la ligne par segments, mais c'est complexe en plot standard.
         # On va faire simple : Ligne blanche + background coloré par zone
-        ax1.plot(df['Timestamp'], df['BPM'], color='white', linewidth=2, label='BPM')
+        ax1.plot(series.index, series.values, color='white', linewidth=2, label='BPM')
         
         # Colorer le fond selon les zones
-        start_time = df['Timestamp'].min()
-        end_time = df['Timestamp'].max()
-        
         for z_name, (low, high, color) in ZONES_CONFIG.items():
             ax1.axhspan(low*MAX_HR, high*MAX_HR, color=color, alpha=0.2, label=z_name)
             
@@ -144,6 +260,16 @@ def analyze_session(filename):
         print(f"❌ Erreur lors de l'analyse : {e}")
 
 if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == '--batch':
+        # python whoop_viz.py --batch data/ [zone_times.csv]
+        analyze_directory(sys.argv[2], *sys.argv[3:4])
+        sys.exit(0)
+
+    if len(sys.argv) > 2 and sys.argv[1] == '--session':
+        # python whoop_viz.py --session 42 : session de l'archive Parquet
+        analyze_session(int(sys.argv[2]))
+        sys.exit(0)
+
     if len(sys.argv) > 1:
         target_file = sys.argv[1]
     else: